@@ -125,6 +125,7 @@ space = 'SPACE YOU ARE SEARCHING' (e.g., space = 'Smart Cloud' -- used for alert
 """
 
 from bigdataloader2 import *
+from services.util.hr_snapshot import get_hr_snapshot
 import s2cloudapi.s3api as s3
 from sas_jarvis import (
     Configuration,
@@ -217,11 +218,8 @@ def _load_logo_b64() -> str:
 
 def knox_id(users):
     """Fetching Knox ID for approvers - Jarvis uses Knox ID but Confluence returns NTID"""
-    params = {'data_type': 'pageradm_employee_ghr',
-            'MLR': 'L',
-            'nt_id': users}
     custom_columns = ['mysingle_id', 'nt_id']
-    df = getData(params=params, custom_columns=custom_columns)
+    df = get_hr_snapshot().lookup('nt_id', users, columns=custom_columns)
 
     # Set 'nt_id' as the index for efficient lookups
     df.set_index('nt_id', inplace=True)
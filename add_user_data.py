@@ -1,12 +1,11 @@
 # ------------------------------------------------------------
 # 4. MERGE HR DATA (EMAIL FIRST, THEN NT_ID FALLBACK, DROP NON-MATCHES)
 # ------------------------------------------------------------
-params_hr = {"data_type": "pageradm_employee_ghr", "MLR": "L"}
-user_data = getData(
-params=params_hr,
-custom_columns=["cost_center_name", "dept_name", "smtp", "title", "nt_id", "mysingle_id"],
-custom_operators={"smtp": "notnull"},
-)
+hr_primary = get_hr_snapshot().primary
+user_data = hr_primary.loc[
+    hr_primary["smtp"].notna(),
+    ["cost_center_name", "dept_name", "smtp", "title", "nt_id", "mysingle_id"],
+].copy()
 
 # Make nt_id safe and unique
 user_data["smtp"] = user_data["smtp"].astype(str).str.strip().str.lower()
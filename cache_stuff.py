@@ -21,6 +21,32 @@ from services.v0.admins.atlassianadmins import ADMIN_USERS
 
 router = APIRouter()
 
+
+@router.on_event("startup")
+async def _start_cache_invalidation_listener() -> None:
+    from services.util.cache_invalidation import start_invalidation_listener
+    
+    await start_invalidation_listener()
+
+
+@router.on_event("shutdown")
+async def _stop_cache_invalidation_listener() -> None:
+    from services.util.cache_invalidation import stop_invalidation_listener
+    
+    await stop_invalidation_listener()
+
+
+def _ack_summary(result) -> dict:
+    """Worker acknowledgement fields of a broadcast clear for the response."""
+    if result is None:
+        return {}
+    return {
+        "workers": result["workers"],
+        "acknowledged": result["acknowledged"],
+        "failed": [ack["worker"] for ack in result["acks"] if not ack.get("ok")]
+    }
+
+
 def verify_cache_key(request: Request):
     """Verify the user is an admin."""
     current_user = request.headers.get("x-knox-id", None)
@@ -42,6 +68,8 @@ async def clear_restricted_users_cache_endpoint(
     
     This endpoint forces a fresh query from HR data and API calls, bypassing the cached results.
     The cache automatically expires after 1 hour, but this allows manual invalidation for testing.
+    The clear is broadcast to every worker; the response says how many
+    acknowledged.
     
     Security:
         Requires X-Knox-ID header with valid admin key.
@@ -51,7 +79,8 @@ async def clear_restricted_users_cache_endpoint(
     """
     from services.util.cache_utils import clear_restricted_users_cache
     
-    success = await clear_restricted_users_cache()
+    result = await clear_restricted_users_cache()
+    success = result is not None
     status_code = 200 if success else 500
     message = ("Restricted users cache cleared successfully" 
                if success else "Failed to clear restricted users cache")
@@ -60,7 +89,8 @@ async def clear_restricted_users_cache_endpoint(
         status_code=status_code,
         content={
             "status": "success" if success else "error",
-            "message": message
+            "message": message,
+            **_ack_summary(result)
         }
     )
 
@@ -73,6 +103,8 @@ async def clear_all_caches_endpoint(
     Clear all caches in the application.
     
     Use with caution as this affects all cached data, not just restricted users.
+    The clear is broadcast to every worker; the response says how many
+    acknowledged.
     
     Security:
         Requires X-Cache-Key header with valid API key.
@@ -82,7 +114,8 @@ async def clear_all_caches_endpoint(
     """
     from services.util.cache_utils import clear_all_caches
     
-    success = await clear_all_caches()
+    result = await clear_all_caches()
+    success = result is not None
     status_code = 200 if success else 500
     message = ("All caches cleared successfully" 
                if success else "Failed to clear all caches")
@@ -91,7 +124,61 @@ async def clear_all_caches_endpoint(
         status_code=status_code,
         content={
             "status": "success" if success else "error",
-            "message": message
+            "message": message,
+            **_ack_summary(result)
+        }
+    )
+
+
+@router.post("/clear/{namespace}", status_code=200)
+async def clear_cache_namespace_endpoint(
+    namespace: str,
+    api_key: str = Depends(verify_cache_key)
+) -> JSONResponse:
+    """
+    Clear a single cache namespace, leaving everything else cached.
+    
+    Namespaces are hierarchical: "username" clears both "username:jira" and
+    "username:confluence". "license" rebuilds the license dataset.
+    
+    Security:
+        Requires X-Knox-ID header with valid admin key.
+        
+    Returns:
+        JSONResponse: Number of entries cleared and worker acknowledgements
+    """
+    from services.util.cache_namespaces import is_known_namespace, known_namespaces
+    from services.util.cache_utils import clear_cache_namespace
+    
+    if not is_known_namespace(namespace):
+        return JSONResponse(
+            status_code=404,
+            content={
+                "status": "error",
+                "message": f"Unknown cache namespace: {namespace}",
+                "namespaces": known_namespaces()
+            }
+        )
+    
+    result = await clear_cache_namespace(namespace)
+    if result is None:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "message": f"Failed to clear cache namespace {namespace}"
+            }
+        )
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "success",
+            "message": f"Cache namespace {namespace} cleared successfully",
+            # shared: entries removed from Redis once; local: entries each
+            # worker dropped from its own memory (L1 copies included)
+            "cleared_shared": result["shared_cleared"],
+            "cleared_local": sum(ack.get("cleared", 0) for ack in result["acks"]),
+            **_ack_summary(result)
         }
     )
 
@@ -107,7 +194,8 @@ async def get_cache_stats(
         Requires X-Cache-Key header with valid API key.
         
     Returns:
-        JSONResponse: Cache statistics including hit rate, miss rate, etc.
+        JSONResponse: Per-cache hits, misses, hit ratio, sets, evictions,
+            expiries, size and get/set latency histograms
     """
     from services.util.cache_utils import cache_stats
     
@@ -133,6 +221,7 @@ async def get_cache_stats(
 
 @router.get("/keys", status_code=200)
 async def get_cache_keys(
+    prefix: str = "",
     api_key: str = Depends(verify_cache_key)
 ) -> JSONResponse:
     """
@@ -140,15 +229,18 @@ async def get_cache_keys(
     
     Useful for debugging and understanding what is cached.
     
+    Args:
+        prefix: Only list keys starting with this prefix
+    
     Security:
         Requires X-Cache-Key header with valid API key.
         
     Returns:
-        JSONResponse: List of cache keys
+        JSONResponse: List of cache keys with their cache, size and remaining TTL
     """
     from services.util.cache_utils import get_cache_keys
     
-    keys = await get_cache_keys()
+    keys = await get_cache_keys(prefix)
     
     if keys:
         return JSONResponse(
@@ -189,59 +281,99 @@ from aiocache import caches
 from aiocache.serializers import PickleSerializer
 from typing import List, Optional
 
+from services.util.cache_instrumentation import (
+    collect_stats,
+    instrumented_alias,
+    list_keys,
+    registered_caches,
+)
+from services.util.cache_invalidation import broadcast_invalidation
+from services.util.cache_namespaces import RESTRICTED_USERS_NAMESPACE
 
-async def clear_all_caches() -> bool:
+
+async def clear_all_caches() -> Optional[dict]:
     """
-    Clear all cached data from the default cache.
+    Clear all cached data on every worker: the default cache and every
+    registered namespace.
     
     Returns:
-        bool: True if cache was cleared successfully, False otherwise
+        Optional[dict]: Workers reached and acknowledgements (see
+            broadcast_invalidation), or None if the clear failed
     """
     try:
-        await caches.get('default').clear()
-        print("All caches cleared successfully")
-        return True
+        result = await broadcast_invalidation()
+        print(f"All caches cleared ({result['acknowledged']}/{result['workers']} workers)")
+        return result
     except Exception as e:
         print(f"Error clearing all caches: {e}")
-        return False
+        return None
 
 
-async def clear_restricted_users_cache() -> bool:
+async def clear_restricted_users_cache() -> Optional[dict]:
     """
     Clear specifically the restricted users cache (both Jira and Confluence).
     
     This forces a re-query from HR data and fresh API calls, bypassing the cached results.
-    We clear the SimpleMemoryCache instance used by the restricted users functions.
+    Only the restricted users namespace is dropped, on every worker; the
+    license dataset and username lookups stay cached.
     
     Returns:
-        bool: True if cache was cleared successfully, False otherwise
+        Optional[dict]: Workers reached and acknowledgements, or None if the
+            clear failed
     """
     try:
-        # Clear the default cache that holds the restricted users data
-        await caches.get('default').clear()
+        result = await broadcast_invalidation(RESTRICTED_USERS_NAMESPACE)
         
-        print("Restricted users cache cleared successfully")
-        return True
-    except ImportError as e:
-        print(f"Import error when clearing restricted users cache: {e}")
-        return False
+        print(
+            "Restricted users cache cleared "
+            f"({result['acknowledged']}/{result['workers']} workers)"
+        )
+        return result
     except Exception as e:
         print(f"Error clearing restricted users cache: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
 
 
-async def get_cache_keys() -> Optional[List[str]]:
+async def clear_cache_namespace(namespace: str) -> Optional[dict]:
     """
-    Get all keys currently in the cache (for debugging purposes).
+    Clear one cache namespace and its child namespaces (e.g. "username"
+    covers "username:jira" and "username:confluence") on every worker.
     
     Returns:
-        Optional[List[str]]: List of cache keys, or None if error occurs
+        Optional[dict]: Entries cleared from the shared cache, workers reached
+            and acknowledgements, or None if an error occurs
+    """
+    try:
+        result = await broadcast_invalidation(namespace)
+        print(
+            f"Cache namespace {namespace} cleared "
+            f"({result['acknowledged']}/{result['workers']} workers)"
+        )
+        return result
+    except Exception as e:
+        print(f"Error clearing cache namespace {namespace}: {e}")
+        return None
+
+
+async def get_cache_keys(pattern: str = "") -> Optional[List[dict]]:
+    """
+    Get the keys currently in every instrumented cache (for debugging purposes).
+
+    Args:
+        pattern: only keys starting with this prefix
+
+    Returns:
+        Optional[List[dict]]: cache name, key, size in bytes and remaining TTL
+            per key, or None if error occurs
     """
     try:
-        cache = caches.get('default')
-        keys = await cache.keys('*')
+        instrumented_alias('default')
+        keys = []
+        for name, plugin in registered_caches().items():
+            for row in await list_keys(plugin.cache, pattern):
+                keys.append({"cache": name, **row})
         return keys
     except Exception as e:
         print(f"Error getting cache keys: {e}")
@@ -251,14 +383,1475 @@ async def get_cache_keys() -> Optional[List[str]]:
 async def cache_stats() -> Optional[dict]:
     """
     Get statistics about the current cache state.
-    
+
     Returns:
-        Optional[dict]: Cache statistics, or None if error occurs
+        Optional[dict]: Hits, misses, sets, evictions, expiries, size and
+            get/set latency histograms per instrumented cache, or None if
+            error occurs
     """
     try:
-        cache = caches.get('default')
-        stats = await cache.stats()
-        return stats
+        instrumented_alias('default')
+        return {
+            "caches": {
+                name: await collect_stats(plugin)
+                for name, plugin in registered_caches().items()
+            }
+        }
     except Exception as e:
         print(f"Error getting cache stats: {e}")
         return None
+
+
+
+
+---------------
+
+
+# services/util/cache_instrumentation.py
+"""
+Instrumentation for the aiocache caches used by the API service.
+
+aiocache backends have no stats() or keys(), so each cache we care about gets
+an InstrumentationPlugin that counts hits / misses / sets / evictions /
+expiries and records get/set latency. Key listings (size and remaining TTL per key) are
+read from the backend itself: the dict behind SimpleMemoryCache, SCAN/PTTL
+on RedisCache.
+"""
+
+import asyncio
+import bisect
+import logging
+import pickle
+import time
+from typing import Any, Dict, List, Optional
+
+import aiocache
+from aiocache import SimpleMemoryCache, caches
+from aiocache.base import SENTINEL, BaseCache
+from aiocache.plugins import BasePlugin
+
+try:
+    from aiocache import RedisCache
+    from redis.exceptions import RedisError
+except ImportError:  # redis extra not installed
+    RedisCache = None
+    RedisError = Exception
+
+logger = logging.getLogger(__name__)
+
+# The plugin and the key listings read aiocache internals (the memory
+# backend's _cache / _handlers, BaseCache._get_ttl) that may change in any
+# release, so aiocache is pinned to the version they were tested against.
+AIOCACHE_VERSION = "0.12.3"
+if aiocache.__version__ != AIOCACHE_VERSION:
+    raise ImportError(
+        f"{__name__} requires aiocache=={AIOCACHE_VERSION}, found {aiocache.__version__}"
+    )
+
+# Upper bounds (milliseconds) of the latency histogram buckets; the last
+# bucket catches everything slower.
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+# Keys returned by a single /keys call per cache
+KEY_LISTING_LIMIT = 1000
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with quantiles estimated from the buckets.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th observation.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {f"le_{b}ms": n for b, n in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 4) if self.count else None,
+            "max_ms": round(self.max_ms, 4),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class InstrumentationPlugin(BasePlugin):
+    """
+    Counts cache traffic for one cache instance.
+
+    Entries that left the cache without a delete/clear from us are counted
+    as expired if their TTL had run out, and as evictions otherwise (the
+    backend dropped them early): a key we set that later misses, or is past
+    its TTL / gone from the memory backend when stats are collected.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cache: Optional[BaseCache] = None
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+        self.clears = 0
+        self.evictions = 0
+        self.expired = 0
+        self.get_latency = LatencyHistogram()
+        self.set_latency = LatencyHistogram()
+        # built key -> monotonic expiry deadline (None = no TTL)
+        self._tracked: Dict[str, Optional[float]] = {}
+
+    @staticmethod
+    def _built_key(client, key, namespace) -> str:
+        return client.build_key(key, namespace=namespace if namespace is not None else client.namespace)
+
+    def _track(self, client, key, ttl, namespace) -> None:
+        ttl = client._get_ttl(ttl)
+        deadline = time.monotonic() + ttl if ttl else None
+        self._tracked[self._built_key(client, key, namespace)] = deadline
+
+    def _observe_read(self, client, key, found: bool, namespace) -> None:
+        built = self._built_key(client, key, namespace)
+        if found:
+            self.hits += 1
+            return
+        self.misses += 1
+        deadline = self._tracked.pop(built, False)
+        if deadline is not False:
+            self._count_gone(deadline, time.monotonic())
+
+    def _count_gone(self, deadline: Optional[float], now: float) -> None:
+        if deadline is not None and deadline <= now:
+            self.expired += 1
+        else:
+            self.evictions += 1
+
+    async def post_get(self, client, key, took=0, ret=None, namespace=None, **kwargs):
+        self.get_latency.observe(took)
+        self._observe_read(client, key, ret is not None, namespace)
+
+    async def post_multi_get(self, client, keys, took=0, ret=None, namespace=None, **kwargs):
+        self.get_latency.observe(took)
+        for key, value in zip(keys, ret or [None] * len(keys)):
+            self._observe_read(client, key, value is not None, namespace)
+
+    async def post_set(self, client, key, value, ttl=SENTINEL, took=0, namespace=None, **kwargs):
+        self.set_latency.observe(took)
+        self.sets += 1
+        self._track(client, key, ttl, namespace)
+
+    async def post_add(self, client, key, value, ttl=SENTINEL, took=0, namespace=None, **kwargs):
+        self.set_latency.observe(took)
+        self.sets += 1
+        self._track(client, key, ttl, namespace)
+
+    async def post_multi_set(self, client, pairs, ttl=SENTINEL, took=0, namespace=None, **kwargs):
+        self.set_latency.observe(took)
+        self.sets += len(pairs)
+        for key, _ in pairs:
+            self._track(client, key, ttl, namespace)
+
+    async def post_delete(self, client, key, took=0, ret=None, namespace=None, **kwargs):
+        self.deletes += 1
+        self._tracked.pop(self._built_key(client, key, namespace), None)
+
+    async def post_clear(self, client, namespace=None, took=0, **kwargs):
+        self.clears += 1
+        self.forget(namespace or "")
+
+    def forget(self, prefix: str) -> None:
+        """
+        Stop tracking keys starting with `prefix`; they were removed on purpose.
+        """
+        if not prefix:
+            self._tracked.clear()
+            return
+        for built in [k for k in self._tracked if k.startswith(prefix)]:
+            del self._tracked[built]
+
+    def sweep(self) -> None:
+        """
+        Count tracked keys that expired or were dropped by the backend.
+        """
+        now = time.monotonic()
+        live = self.cache._cache if isinstance(self.cache, SimpleMemoryCache) else None
+        gone = [
+            k
+            for k, deadline in self._tracked.items()
+            if (deadline is not None and deadline <= now) or (live is not None and k not in live)
+        ]
+        for k in gone:
+            self._count_gone(self._tracked.pop(k), now)
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "sets": self.sets,
+            "deletes": self.deletes,
+            "clears": self.clears,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "get_latency": self.get_latency.to_dict(),
+            "set_latency": self.set_latency.to_dict(),
+        }
+
+
+# name -> plugin, in registration order
+_instrumented: Dict[str, InstrumentationPlugin] = {}
+
+
+def instrument(target, name: str) -> InstrumentationPlugin:
+    """
+    Attach an InstrumentationPlugin to a cache, or to the cache of a
+    function decorated with @cached, and register it under `name`.
+    Calling it again for the same cache returns the existing plugin.
+    """
+    cache = getattr(target, "cache", target)
+    for plugin in cache.plugins:
+        if isinstance(plugin, InstrumentationPlugin):
+            return plugin
+    plugin = InstrumentationPlugin(name)
+    plugin.cache = cache
+    cache.plugins = [*cache.plugins, plugin]
+    _instrumented[name] = plugin
+    return plugin
+
+
+def instrumented_alias(alias: str = "default") -> BaseCache:
+    """
+    caches.get(alias), instrumented. Use this instead of caches.get() so the
+    configured caches show up in /stats and /keys.
+    """
+    cache = caches.get(alias)
+    instrument(cache, alias)
+    return cache
+
+
+def value_size(value) -> int:
+    """
+    Approximate bytes held by a cached value: exact for serialized
+    (bytes/str) values, deep memory usage for pandas objects, pickled size
+    otherwise.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "surrogatepass"))
+    if hasattr(value, "memory_usage"):
+        try:
+            usage = value.memory_usage(deep=True)
+            return int(usage.sum() if hasattr(usage, "sum") else usage)
+        except Exception:
+            pass
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return -1
+
+
+def _memory_keys(cache, pattern: str, limit: int) -> List[Dict[str, Any]]:
+    now = asyncio.get_running_loop().time()
+    handlers = cache._handlers
+    rows = []
+    for key, value in list(cache._cache.items()):
+        if not key.startswith(pattern):
+            continue
+        handle = handlers.get(key)
+        rows.append(
+            {
+                "key": key,
+                "size_bytes": value_size(value),
+                "ttl_seconds": round(handle.when() - now, 3) if handle else None,
+            }
+        )
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+async def _redis_keys(cache, pattern: str, limit: int) -> List[Dict[str, Any]]:
+    client = cache.client
+    keys = []
+    async for key in client.scan_iter(match=f"{pattern}*", count=500):
+        keys.append(key)
+        if len(keys) >= limit:
+            break
+    if not keys:
+        return []
+
+    async with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.pttl(key)
+            pipe.strlen(key)
+        replies = await pipe.execute(raise_on_error=False)
+
+    rows = []
+    for i, key in enumerate(keys):
+        pttl, size = replies[2 * i], replies[2 * i + 1]
+        rows.append(
+            {
+                "key": key.decode() if isinstance(key, bytes) else key,
+                "size_bytes": size if isinstance(size, int) else -1,
+                "ttl_seconds": pttl / 1000.0 if isinstance(pttl, int) and pttl >= 0 else None,
+            }
+        )
+    return rows
+
+
+async def list_keys(cache, pattern: str = "", limit: int = KEY_LISTING_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Keys starting with `pattern`, with their stored size and remaining TTL.
+    A two-tier cache lists its shared tier.
+    """
+    cache = getattr(cache, "l2", cache)
+    if isinstance(cache, SimpleMemoryCache):
+        return _memory_keys(cache, pattern, limit)
+    if RedisCache is not None and isinstance(cache, RedisCache):
+        return await _redis_keys(cache, pattern, limit)
+    raise TypeError(f"Cannot list keys of {type(cache).__name__}")
+
+
+async def _redis_server_stats(cache) -> Dict[str, Any]:
+    try:
+        info = await cache.client.info("stats")
+        memory = await cache.client.info("memory")
+    except RedisError as e:
+        logger.info("Redis INFO unavailable: %s", e)
+        return {}
+    return {
+        "keyspace_hits": info.get("keyspace_hits"),
+        "keyspace_misses": info.get("keyspace_misses"),
+        "expired_keys": info.get("expired_keys"),
+        "evicted_keys": info.get("evicted_keys"),
+        "used_memory": memory.get("used_memory"),
+        "maxmemory": memory.get("maxmemory"),
+    }
+
+
+async def collect_stats(plugin: InstrumentationPlugin) -> Dict[str, Any]:
+    cache = plugin.cache
+    plugin.sweep()
+    stats = {"backend": type(cache).__name__, "namespace": cache.namespace, **plugin.to_dict()}
+    if isinstance(cache, SimpleMemoryCache):
+        sizes = [value_size(v) for v in list(cache._cache.values())]
+        stats["keys"] = len(sizes)
+        stats["size_bytes"] = sum(sizes)
+    shared = getattr(cache, "l2", cache)
+    if RedisCache is not None and isinstance(shared, RedisCache):
+        stats["server"] = await _redis_server_stats(shared)
+    usage = getattr(cache, "usage", None)
+    if callable(usage):
+        # budget, bytes and eviction counters of a BoundedMemoryCache (the
+        # L1 of a TieredCache)
+        stats["memory"] = usage()
+    return stats
+
+
+def registered_caches() -> Dict[str, InstrumentationPlugin]:
+    return dict(_instrumented)
+
+
+
+---------------
+
+
+# services/util/cache_namespaces.py
+"""
+Namespaced cache entries, so one kind of data can be invalidated without
+throwing away everything else in the shared cache.
+
+Every @namespaced_cached function stores its entries in the shared alias
+cache under "<namespace>:<key>". Namespaces are hierarchical on ":" -
+invalidating "username" also drops "username:jira" and
+"username:confluence". Data that does not live in aiocache (the license
+dataset) registers its own invalidator for its namespace.
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from aiocache import SimpleMemoryCache, cached
+from aiocache.base import SENTINEL
+
+from services.util.tiered_cache import TieredCache, configure_default_cache, unlink_prefix
+from services.util.cache_instrumentation import (
+    InstrumentationPlugin,
+    RedisCache,
+    instrument,
+    instrumented_alias,
+)
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_SEPARATOR = ":"
+
+USERNAME_NAMESPACE = "username"
+USERNAME_JIRA_NAMESPACE = f"{USERNAME_NAMESPACE}{NAMESPACE_SEPARATOR}jira"
+USERNAME_CONFLUENCE_NAMESPACE = f"{USERNAME_NAMESPACE}{NAMESPACE_SEPARATOR}confluence"
+RESTRICTED_USERS_NAMESPACE = "restricted_users"
+LICENSE_NAMESPACE = "license"
+HR_NAMESPACE = "hr"
+
+# before any @namespaced_cached creates the default cache
+configure_default_cache()
+
+# namespace -> alias of the cache holding its entries
+_aliases: Dict[str, str] = {}
+# namespace -> invalidator for data kept outside aiocache; returns entries dropped
+_invalidators: Dict[str, Callable[[], Awaitable[int]]] = {}
+# keys no invalidation deletes: locks another worker may hold (they expire)
+_preserved: Set[str] = set()
+
+
+def register_namespace(
+    namespace: str,
+    alias: Optional[str] = None,
+    invalidator: Optional[Callable[[], Awaitable[int]]] = None,
+    preserve: Iterable[str] = (),
+) -> None:
+    if alias is not None:
+        _aliases[namespace] = alias
+    if invalidator is not None:
+        _invalidators[namespace] = invalidator
+    _preserved.update(preserve)
+
+
+def preserved_keys() -> Set[str]:
+    return set(_preserved)
+
+
+def known_namespaces() -> List[str]:
+    return sorted({*_aliases, *_invalidators})
+
+
+def namespace_prefixes() -> List[str]:
+    """
+    One key prefix per top-level namespace ("username:", "license:", ...),
+    together covering every entry this app stores.
+    """
+    roots = {n.split(NAMESPACE_SEPARATOR, 1)[0] for n in known_namespaces()}
+    return [f"{root}{NAMESPACE_SEPARATOR}" for root in sorted(roots)]
+
+
+def _covered(namespace: str, candidate: str) -> bool:
+    return candidate == namespace or candidate.startswith(namespace + NAMESPACE_SEPARATOR)
+
+
+def is_known_namespace(namespace: str) -> bool:
+    return any(_covered(namespace, n) for n in known_namespaces())
+
+
+# known up front so they can be cleared before the modules using them load
+for _namespace in (USERNAME_JIRA_NAMESPACE, USERNAME_CONFLUENCE_NAMESPACE, RESTRICTED_USERS_NAMESPACE):
+    register_namespace(_namespace, alias="default")
+
+
+class namespaced_cached(cached):
+    """
+    @cached on the shared `alias` cache with every key prefixed by `namespace`.
+
+    aiocache ignores `namespace=` when `alias=` is given, which is why the
+    prefix is added to the key here instead.
+    """
+
+    def __init__(self, namespace: str, ttl=SENTINEL, alias: str = "default", **kwargs):
+        super().__init__(ttl=ttl, alias=alias, **kwargs)
+        self.cache_namespace = namespace
+
+    def __call__(self, f):
+        wrapper = super().__call__(f)
+        instrument(self.cache, self.alias)
+        register_namespace(self.cache_namespace, alias=self.alias)
+        wrapper.cache_namespace = self.cache_namespace
+        return wrapper
+
+    def get_cache_key(self, f, args, kwargs):
+        key = super().get_cache_key(f, args, kwargs)
+        return f"{self.cache_namespace}{NAMESPACE_SEPARATOR}{key}"
+
+
+# What an invalidation touches:
+#   "shared" - state every worker sees (Redis, the L2 of a TieredCache)
+#   "local"  - this process only (memory caches, L1s, registered invalidators)
+#   "all"    - both
+INVALIDATION_SCOPES = ("all", "shared", "local")
+
+
+def _forget(cache, prefix: str) -> None:
+    for plugin in cache.plugins:
+        if isinstance(plugin, InstrumentationPlugin):
+            plugin.forget(prefix)
+
+
+async def _delete_prefix(
+    cache, prefix: str, scope: str = "all", keep: Optional[Set[str]] = None
+) -> int:
+    """
+    Delete every key starting with `prefix` (already built for this cache)
+    within `scope`. Preserved keys (see register_namespace) stay in Redis.
+    """
+    if keep is None:
+        keep = {cache.build_key(key) for key in _preserved}
+    if isinstance(cache, TieredCache):
+        local = await _delete_prefix(cache.l1, prefix, keep=keep) if scope != "shared" else 0
+        shared = await _delete_prefix(cache.l2, prefix, keep=keep) if scope != "local" else 0
+        _forget(cache, prefix)
+        # L1 entries are copies of L2 ones; count them only on their own
+        return local if scope == "local" else shared
+
+    if isinstance(cache, SimpleMemoryCache):
+        if scope == "shared":
+            return 0
+        count = sum(1 for key in list(cache._cache) if key.startswith(prefix))
+        # _clear(namespace) deletes by key prefix on the memory backend
+        await cache.clear(namespace=prefix)
+        return count
+
+    if RedisCache is None or not isinstance(cache, RedisCache):
+        raise TypeError(f"Cannot invalidate by prefix on {type(cache).__name__}")
+    if scope == "local":
+        return 0
+    count = await unlink_prefix(cache.client, prefix, keep=keep)
+    _forget(cache, prefix)
+    return count
+
+
+async def invalidate_namespace(namespace: str, scope: str = "all") -> Optional[int]:
+    """
+    Drop every entry in `namespace` and its child namespaces.
+
+    Returns:
+        Optional[int]: Number of entries dropped, or None if nothing is
+            registered under that namespace
+    """
+    names = [n for n in known_namespaces() if _covered(namespace, n)]
+    if not names:
+        return None
+
+    dropped = 0
+    # one prefix delete per alias covers the child namespaces as well
+    for alias in sorted({_aliases[n] for n in names if n in _aliases}):
+        cache = instrumented_alias(alias)
+        prefix = cache.build_key(f"{namespace}{NAMESPACE_SEPARATOR}")
+        dropped += await _delete_prefix(cache, prefix, scope)
+    if scope != "shared":
+        for name in names:
+            if name in _invalidators:
+                dropped += await _invalidators[name]()
+    logger.info("Invalidated cache namespace %s (%s, %d entries)", namespace, scope, dropped)
+    return dropped
+
+
+async def invalidate_all(scope: str = "all") -> None:
+    """
+    Drop everything within `scope`: the aliases backing any namespace, plus
+    every registered invalidator. In-process caches are emptied; Redis only
+    loses the keys under our namespaces, since other services (Superset)
+    may share the database, and keeps the preserved ones (held locks).
+    """
+    for alias in sorted({"default", *_aliases.values()}):
+        cache = instrumented_alias(alias)
+        if isinstance(cache, TieredCache):
+            if scope != "shared":
+                await cache.l1.clear()
+            if scope != "local":
+                keep = {cache.build_key(key) for key in _preserved}
+                for prefix in namespace_prefixes():
+                    await _delete_prefix(cache.l2, cache.build_key(prefix), keep=keep)
+            _forget(cache, "")
+        elif isinstance(cache, SimpleMemoryCache):
+            if scope != "shared":
+                await cache.clear()
+        elif scope != "local":
+            for prefix in namespace_prefixes():
+                await _delete_prefix(cache, cache.build_key(prefix))
+    if scope != "shared":
+        for invalidator in _invalidators.values():
+            await invalidator()
+
+
+
+
+---------------
+
+
+# services/util/bounded_memory_cache.py
+"""
+Size-bounded in-process cache backend.
+
+SimpleMemoryCache grows without limit. BoundedMemoryCache keeps a byte
+budget for the whole cache and optional byte quotas per namespace, and
+evicts by LRU or LFU when either is exceeded. Each namespace with a quota
+evicts only its own entries, so one multi-megabyte DataFrame can't push out
+thousands of small username entries. When the total is over budget, the
+new entry's own namespace gives up entries first, then entries outside any
+quota; a namespace within its quota is never evicted to make room for
+another one, and an entry that can't fit otherwise is refused.
+
+The backend hooks into SimpleMemoryBackend internals (_cache, _handlers,
+the private __delete), so it relies on the aiocache pin enforced by
+cache_instrumentation (AIOCACHE_VERSION).
+"""
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+from aiocache import SimpleMemoryCache
+
+from services.util.cache_instrumentation import value_size
+
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 2**20)))
+CACHE_EVICTION_POLICY = os.getenv("CACHE_EVICTION_POLICY", "lru")
+# "username=16777216,license=134217728"
+CACHE_NAMESPACE_QUOTAS = os.getenv("CACHE_NAMESPACE_QUOTAS", "")
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+# entries not in any namespace with a quota
+_SHARED = ""
+
+
+def parse_namespace_quotas(spec: str) -> Dict[str, int]:
+    quotas = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        namespace, _, limit = item.partition("=")
+        quotas[namespace.strip()] = int(limit)
+    return quotas
+
+
+class _Group:
+    """
+    Entries of one namespace, in eviction order.
+
+    `buckets` maps access frequency -> keys in least-recently-used order.
+    Under LRU every key stays in bucket 0, so the first key of the lowest
+    bucket is the victim for both policies.
+    """
+
+    __slots__ = ("quota", "bytes", "sizes", "freq", "buckets", "evictions", "rejected")
+
+    def __init__(self, quota: Optional[int]):
+        self.quota = quota
+        self.bytes = 0
+        self.sizes: Dict[str, int] = {}
+        self.freq: Dict[str, int] = {}
+        self.buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self.evictions = 0
+        self.rejected = 0
+
+    def insert(self, key: str, size: int) -> None:
+        self.sizes[key] = size
+        self.bytes += size
+        self.freq[key] = 0
+        self.buckets.setdefault(0, OrderedDict())[key] = None
+
+    def remove(self, key: str) -> None:
+        size = self.sizes.pop(key, None)
+        if size is None:
+            return
+        self.bytes -= size
+        f = self.freq.pop(key)
+        bucket = self.buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[f]
+
+    def touch(self, key: str, lfu: bool) -> None:
+        f = self.freq.get(key)
+        if f is None:
+            return
+        if not lfu:
+            self.buckets[f].move_to_end(key)
+            return
+        bucket = self.buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[f]
+        self.freq[key] = f + 1
+        self.buckets.setdefault(f + 1, OrderedDict())[key] = None
+
+    def victims(self) -> Iterator[str]:
+        for f in sorted(self.buckets):
+            yield from list(self.buckets[f])
+
+
+class BoundedMemoryCache(SimpleMemoryCache):
+    """
+    SimpleMemoryCache with a byte budget, LRU/LFU eviction and
+    per-namespace quotas.
+
+    :param max_bytes: budget for all entries together
+    :param policy: "lru" or "lfu"
+    :param namespace_quotas: namespace -> byte quota. A key belongs to the
+        longest namespace it starts with ("<namespace>:..."); keys outside
+        every namespace only count against max_bytes.
+
+    Sizes are taken from the stored (serialized) value, so use a byte
+    serializer such as PickleSerializer for exact accounting. An entry
+    bigger than its quota or the budget, or one that would only fit by
+    evicting other namespaces' quota'd entries, is not stored at all.
+    """
+
+    NAME = "bounded_memory"
+
+    def __init__(
+        self,
+        max_bytes: int = CACHE_MAX_BYTES,
+        policy: str = CACHE_EVICTION_POLICY,
+        namespace_quotas: Optional[Dict[str, int]] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}; expected one of {EVICTION_POLICIES}")
+        self.max_bytes = int(max_bytes)
+        self.policy = policy
+        self._lfu = policy == "lfu"
+        self._quota_prefixes = sorted(
+            ((f"{ns}:", ns) for ns in (namespace_quotas or {})), key=lambda p: -len(p[0])
+        )
+        self._groups: Dict[str, _Group] = {_SHARED: _Group(None)}
+        for ns, quota in (namespace_quotas or {}).items():
+            self._groups[ns] = _Group(int(quota))
+        self._group_of: Dict[str, str] = {}
+        self.total_bytes = 0
+
+    def _namespace_for(self, key: str) -> str:
+        bare = key
+        if self.namespace and key.startswith(self.namespace):
+            bare = key[len(self.namespace):]
+        for prefix, ns in self._quota_prefixes:
+            if bare.startswith(prefix):
+                return ns
+        return _SHARED
+
+    def _forget(self, key: str) -> None:
+        ns = self._group_of.pop(key, None)
+        if ns is not None:
+            group = self._groups[ns]
+            self.total_bytes -= group.sizes.get(key, 0)
+            group.remove(key)
+
+    def _evict(self, group: _Group, keep: str) -> bool:
+        for key in group.victims():
+            if key != keep:
+                group.evictions += 1
+                self._SimpleMemoryBackend__delete(key)
+                return True
+        return False
+
+    async def _get(self, key, encoding="utf-8", _conn=None):
+        value = self._cache.get(key)
+        if value is not None:
+            self._groups[self._group_of[key]].touch(key, self._lfu)
+        return value
+
+    async def _multi_get(self, keys, encoding="utf-8", _conn=None):
+        return [await self._get(key) for key in keys]
+
+    def _room_for(self, group: _Group) -> int:
+        """
+        Bytes a new entry in `group` can take: the free budget plus everything
+        its own namespace and the unquota'd entries could give up.
+        """
+        shared = self._groups[_SHARED]
+        reclaimable = group.bytes + (shared.bytes if group is not shared else 0)
+        return self.max_bytes - self.total_bytes + reclaimable
+
+    async def _set(self, key, value, ttl=None, _cas_token=None, _conn=None):
+        ns = self._namespace_for(key)
+        group = self._groups[ns]
+        size = value_size(value)
+        limit = self.max_bytes if group.quota is None else min(group.quota, self.max_bytes)
+        if size > limit or size > self._room_for(group):
+            group.rejected += 1
+            # don't leave a stale value behind the one we refused
+            self._SimpleMemoryBackend__delete(key)
+            return False
+
+        stored = await super()._set(key, value, ttl=ttl, _cas_token=_cas_token, _conn=_conn)
+        if not stored:
+            return stored
+        self._forget(key)
+        group.insert(key, size)
+        self._group_of[key] = ns
+        self.total_bytes += size
+
+        while group.quota is not None and group.bytes > group.quota:
+            if not self._evict(group, keep=key):
+                break
+        # _room_for() checked that these two can free enough
+        for donor in (group, self._groups[_SHARED]):
+            while self.total_bytes > self.max_bytes and self._evict(donor, keep=key):
+                pass
+        return True
+
+    async def _increment(self, key, delta, _conn=None):
+        ret = await super()._increment(key, delta, _conn=_conn)
+        if key not in self._group_of:
+            ns = self._namespace_for(key)
+            self._groups[ns].insert(key, value_size(ret))
+            self._group_of[key] = ns
+            self.total_bytes += self._groups[ns].sizes[key]
+        return ret
+
+    async def _clear(self, namespace=None, _conn=None):
+        if namespace:
+            return await super()._clear(namespace, _conn=_conn)
+        for handle in self._handlers.values():
+            handle.cancel()
+        self._cache = {}
+        self._handlers = {}
+        for ns, group in list(self._groups.items()):
+            fresh = _Group(group.quota)
+            fresh.evictions, fresh.rejected = group.evictions, group.rejected
+            self._groups[ns] = fresh
+        self._group_of = {}
+        self.total_bytes = 0
+        return True
+
+    def _SimpleMemoryBackend__delete(self, key):
+        # every removal (delete, TTL expiry, prefix clear, eviction) goes
+        # through the base backend's private __delete
+        self._forget(key)
+        return super()._SimpleMemoryBackend__delete(key)
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "max_bytes": self.max_bytes,
+            "bytes": self.total_bytes,
+            "evictions": sum(g.evictions for g in self._groups.values()),
+            "rejected": sum(g.rejected for g in self._groups.values()),
+            "namespaces": {
+                ns or "(shared)": {
+                    "quota_bytes": g.quota,
+                    "bytes": g.bytes,
+                    "keys": len(g.sizes),
+                    "evictions": g.evictions,
+                    "rejected": g.rejected,
+                }
+                for ns, g in self._groups.items()
+            },
+        }
+
+
+def bounded_cache_config() -> Dict[str, Any]:
+    """
+    aiocache alias config for a BoundedMemoryCache sized from the environment.
+    """
+    return {
+        "cache": "services.util.bounded_memory_cache.BoundedMemoryCache",
+        "serializer": {"class": "aiocache.serializers.PickleSerializer"},
+        "max_bytes": CACHE_MAX_BYTES,
+        "policy": CACHE_EVICTION_POLICY,
+        "namespace_quotas": parse_namespace_quotas(CACHE_NAMESPACE_QUOTAS),
+    }
+
+
+---------------
+
+
+# services/util/tiered_cache.py
+"""
+Two-tier cache: a small in-process L1 in front of a Redis L2 shared by
+every worker and replica.
+
+Reads try L1, then L2, and copy L2 hits into L1 for at most
+CACHE_L1_TTL_SECONDS. Writes and deletes go to both tiers. L1 entries are
+capped by that short TTL because other workers only update L2, so a worker
+never serves a value more than CACHE_L1_TTL_SECONDS older than Redis.
+If Redis is unreachable the cache degrades to L1 only instead of failing
+the request.
+"""
+
+import logging
+import os
+import urllib.parse
+from typing import Any, Dict, Iterable, Optional
+
+from aiocache import RedisCache, caches
+from aiocache.base import BaseCache
+from aiocache.serializers import NullSerializer, PickleSerializer
+from redis.exceptions import RedisError
+
+from services.util.bounded_memory_cache import (
+    CACHE_EVICTION_POLICY,
+    CACHE_NAMESPACE_QUOTAS,
+    BoundedMemoryCache,
+    bounded_cache_config,
+    parse_namespace_quotas,
+)
+
+logger = logging.getLogger(__name__)
+
+# Shared L2; the default cache stays in-process when unset. The database may be
+# shared with other services: clears only ever delete this app's namespaces.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 2**20)))
+CACHE_L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "30"))
+
+
+async def unlink_prefix(
+    client, prefix: str, keep: Iterable[str] = (), batch_size: int = 500
+) -> int:
+    """
+    Delete every Redis key starting with `prefix`, except those in `keep`.
+    SCAN + UNLINK in batches rather than KEYS, which blocks the server.
+    """
+    keep = {k.encode() for k in keep}
+    count, batch = 0, []
+    async for key in client.scan_iter(match=f"{prefix}*", count=batch_size):
+        if key in keep:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            count += await client.unlink(*batch)
+            batch = []
+    if batch:
+        count += await client.unlink(*batch)
+    return count
+
+
+def redis_kwargs_from_url(url: str) -> Dict[str, Any]:
+    parsed = urllib.parse.urlparse(url)
+    return {
+        "endpoint": parsed.hostname or "127.0.0.1",
+        "port": parsed.port or 6379,
+        "db": int(parsed.path.lstrip("/") or 0),
+        "password": parsed.password,
+        "ssl": parsed.scheme == "rediss",
+    }
+
+
+class TieredCache(BaseCache):
+    """
+    BoundedMemoryCache (L1) in front of RedisCache (L2).
+
+    Values are serialized once by this cache and stored as the same bytes
+    in both tiers, which call each other's backend methods directly so
+    plugins and serialization run only once, at this level.
+
+    :param l1_max_bytes: byte budget of the in-process tier
+    :param l1_ttl: longest time an entry stays in L1 without going back to L2
+    :param policy / namespace_quotas: eviction settings of L1
+    :param redis_url: L2 location, or pass endpoint/port/db/password directly
+    """
+
+    NAME = "tiered"
+
+    def __init__(
+        self,
+        serializer=None,
+        l1_max_bytes: int = CACHE_L1_MAX_BYTES,
+        l1_ttl: float = CACHE_L1_TTL_SECONDS,
+        policy: str = CACHE_EVICTION_POLICY,
+        namespace_quotas: Optional[Dict[str, int]] = None,
+        redis_url: Optional[str] = None,
+        endpoint: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        ssl: bool = False,
+        **kwargs,
+    ):
+        super().__init__(serializer=serializer or PickleSerializer(), **kwargs)
+        redis_kwargs = (
+            redis_kwargs_from_url(redis_url)
+            if redis_url
+            else {"endpoint": endpoint, "port": port, "db": db, "password": password, "ssl": ssl}
+        )
+        self.l1 = BoundedMemoryCache(
+            max_bytes=l1_max_bytes,
+            policy=policy,
+            namespace_quotas=namespace_quotas,
+            serializer=NullSerializer(),
+        )
+        # encoding=None: hand back the stored bytes undecoded
+        self.l2 = RedisCache(serializer=NullSerializer(encoding=None), **redis_kwargs)
+        self.l1_ttl = float(l1_ttl)
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.l2_errors = 0
+
+    def _l1_ttl(self, ttl) -> float:
+        return min(ttl, self.l1_ttl) if ttl else self.l1_ttl
+
+    def _l2_failed(self, op: str, e: Exception) -> None:
+        self.l2_errors += 1
+        logger.warning("Redis L2 %s failed, using L1 only: %s", op, e)
+
+    async def _get(self, key, encoding="utf-8", _conn=None):
+        value = await self.l1._get(key)
+        if value is not None:
+            self.l1_hits += 1
+            return value
+        try:
+            async with self.l2.client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = await pipe.execute()
+        except RedisError as e:
+            self._l2_failed("get", e)
+            return None
+        if value is None:
+            return None
+        self.l2_hits += 1
+        await self.l1._set(key, value, ttl=self._l1_ttl(pttl / 1000.0 if pttl > 0 else None))
+        return value
+
+    async def _gets(self, key, encoding="utf-8", _conn=None):
+        return await self._get(key, encoding=encoding)
+
+    async def _multi_get(self, keys, encoding="utf-8", _conn=None):
+        return [await self._get(key, encoding=encoding) for key in keys]
+
+    async def _set(self, key, value, ttl=None, _cas_token=None, _conn=None):
+        try:
+            stored = await self.l2._set(key, value, ttl=ttl, _cas_token=_cas_token)
+        except RedisError as e:
+            self._l2_failed("set", e)
+            stored = True
+        if stored:
+            await self.l1._set(key, value, ttl=self._l1_ttl(ttl))
+        else:
+            await self.l1._delete(key)
+        return stored
+
+    async def _multi_set(self, pairs, ttl=None, _conn=None):
+        for key, value in pairs:
+            await self._set(key, value, ttl=ttl)
+        return True
+
+    async def _add(self, key, value, ttl=None, _conn=None):
+        # L2 decides whether the key exists; raises ValueError if it does
+        try:
+            await self.l2._add(key, value, ttl=ttl)
+        except RedisError as e:
+            self._l2_failed("add", e)
+            return await self.l1._add(key, value, ttl=self._l1_ttl(ttl))
+        await self.l1._set(key, value, ttl=self._l1_ttl(ttl))
+        return True
+
+    async def _exists(self, key, _conn=None):
+        if await self.l1._exists(key):
+            return True
+        try:
+            return await self.l2._exists(key)
+        except RedisError as e:
+            self._l2_failed("exists", e)
+            return False
+
+    async def _increment(self, key, delta, _conn=None):
+        await self.l1._delete(key)
+        return await self.l2._increment(key, delta)
+
+    async def _expire(self, key, ttl, _conn=None):
+        await self.l1._delete(key)
+        return await self.l2._expire(key, ttl)
+
+    async def _delete(self, key, _conn=None):
+        removed = await self.l1._delete(key)
+        try:
+            return await self.l2._delete(key)
+        except RedisError as e:
+            self._l2_failed("delete", e)
+            return removed
+
+    async def _clear(self, namespace=None, _conn=None):
+        await self.l1._clear(namespace)
+        # never FLUSHDB: only this app's namespaces are ours to drop
+        from services.util.cache_namespaces import namespace_prefixes, preserved_keys
+
+        if namespace:
+            # prefix semantics, like the memory backend
+            prefixes = [namespace]
+        else:
+            prefixes = [self.build_key(prefix) for prefix in namespace_prefixes()]
+        keep = [self.build_key(key) for key in preserved_keys()]
+        try:
+            for prefix in prefixes:
+                await unlink_prefix(self.l2.client, prefix, keep=keep)
+        except RedisError as e:
+            self._l2_failed("clear", e)
+        return True
+
+    async def _raw(self, command, *args, encoding="utf-8", _conn=None, **kwargs):
+        return await self.l2._raw(command, *args, encoding=encoding, **kwargs)
+
+    async def _redlock_release(self, key, value):
+        await self.l1._delete(key)
+        return await self.l2._redlock_release(key, value)
+
+    async def _close(self, *args, _conn=None, **kwargs):
+        await self.l2.close()
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "l1": self.l1.usage(),
+            "l1_ttl_seconds": self.l1_ttl,
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "l2_errors": self.l2_errors,
+        }
+
+
+def shared_tier(cache) -> Optional[RedisCache]:
+    """
+    The Redis tier behind `cache`, if it has one: what other workers see.
+    """
+    if isinstance(cache, TieredCache):
+        return cache.l2
+    if isinstance(cache, RedisCache):
+        return cache
+    return None
+
+
+def default_cache_config() -> Dict[str, Any]:
+    if not CACHE_REDIS_URL:
+        return bounded_cache_config()
+    return {
+        "cache": "services.util.tiered_cache.TieredCache",
+        "serializer": {"class": "aiocache.serializers.PickleSerializer"},
+        "redis_url": CACHE_REDIS_URL,
+        "l1_max_bytes": CACHE_L1_MAX_BYTES,
+        "l1_ttl": CACHE_L1_TTL_SECONDS,
+        "policy": CACHE_EVICTION_POLICY,
+        "namespace_quotas": parse_namespace_quotas(CACHE_NAMESPACE_QUOTAS),
+    }
+
+
+# what aiocache configures "default" as out of the box
+_STOCK_DEFAULT_CACHES = (None, "aiocache.SimpleMemoryCache", "aiocache.backends.memory.SimpleMemoryCache")
+
+
+def configure_default_cache() -> None:
+    """
+    Make the "default" alias a TieredCache when CACHE_REDIS_URL is set, a
+    BoundedMemoryCache otherwise - unless the app configured it itself.
+    Call it before anything gets the alias: a cache already created keeps
+    the config it was created with.
+    """
+    current = caches.get_config().get("default", {})
+    if current.get("cache") in _STOCK_DEFAULT_CACHES:
+        caches.add("default", default_cache_config())
+
+
+
+---------------
+
+
+# services/util/cache_invalidation.py
+"""
+Cross-worker cache invalidation.
+
+A clear request only reaches one uvicorn worker, but every worker holds its
+own in-process caches (memory cache / L1, the license dataset). The worker
+that gets the request clears the shared Redis state once, then publishes
+the invalidation on a pub/sub channel. Every worker, the sender included,
+subscribes, clears its local state and answers on a per-message reply
+channel, so the endpoint can say how many workers acknowledged.
+
+The bus is Redis pub/sub when CACHE_REDIS_URL is set, and an in-process
+stand-in otherwise (one process, or tests).
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import orjson
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from services.util.cache_namespaces import invalidate_all, invalidate_namespace
+from services.util.tiered_cache import CACHE_REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+# How long a clear request waits for the other workers to acknowledge
+CACHE_INVALIDATION_ACK_TIMEOUT = float(os.getenv("CACHE_INVALIDATION_ACK_TIMEOUT", "2"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalSubscription:
+    def __init__(self, bus: "LocalInvalidationBus", channel: str):
+        self._bus = bus
+        self._channel = channel
+        self._queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        subscribers = self._bus._subscribers.get(self._channel, [])
+        if self in subscribers:
+            subscribers.remove(self)
+
+
+class LocalInvalidationBus:
+    """
+    In-process stand-in for Redis pub/sub: same publish/subscribe surface,
+    fan-out to asyncio queues.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[LocalSubscription]] = {}
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        subscribers = list(self._subscribers.get(channel, []))
+        for sub in subscribers:
+            sub._queue.put_nowait(data)
+        return len(subscribers)
+
+    async def subscribe(self, channel: str) -> LocalSubscription:
+        sub = LocalSubscription(self, channel)
+        self._subscribers.setdefault(channel, []).append(sub)
+        return sub
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Next message payload, or None once `timeout` passes (None waits forever).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            # get_message() polls; wait in short slices so None means "forever"
+            message = await self._pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=1.0 if remaining is None else min(remaining, 1.0),
+            )
+            if message is not None and message["type"] == "message":
+                return message["data"]
+            if remaining is not None and remaining <= 0:
+                return None
+
+    async def close(self) -> None:
+        await self._pubsub.unsubscribe()
+        await self._pubsub.aclose()
+
+
+class RedisInvalidationBus:
+    def __init__(self, client):
+        self.client = client
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        # PUBLISH replies with the number of subscribers that got it
+        return await self.client.publish(channel, data)
+
+    async def subscribe(self, channel: str) -> RedisSubscription:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+        return RedisSubscription(pubsub)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_bus = None
+_listener: Optional["asyncio.Task[None]"] = None
+
+
+def get_invalidation_bus():
+    global _bus
+    if _bus is None:
+        _bus = (
+            RedisInvalidationBus(aioredis.from_url(CACHE_REDIS_URL))
+            if CACHE_REDIS_URL
+            else LocalInvalidationBus()
+        )
+    return _bus
+
+
+async def _apply_locally(message: Dict[str, Any]) -> int:
+    namespace = message.get("namespace")
+    if namespace is None:
+        await invalidate_all(scope="local")
+        return 0
+    return await invalidate_namespace(namespace, scope="local") or 0
+
+
+def _parse_message(raw: bytes) -> Dict[str, Any]:
+    """
+    Decode an invalidation message; ValueError if it isn't one we can act on.
+    """
+    message = orjson.loads(raw)
+    if not isinstance(message, dict):
+        raise ValueError("not a JSON object")
+    if not isinstance(message.get("reply_to"), str):
+        raise ValueError("missing reply_to")
+    if not isinstance(message.get("namespace"), (str, type(None))):
+        raise ValueError("namespace must be a string or null")
+    return message
+
+
+async def _handle(bus, raw: bytes) -> None:
+    try:
+        message = _parse_message(raw)
+    except ValueError as e:  # orjson.JSONDecodeError included
+        logger.warning("Skipping malformed cache invalidation message %r: %s", raw[:200], e)
+        return
+    ack: Dict[str, Any] = {"worker": WORKER_ID}
+    try:
+        ack["cleared"] = await _apply_locally(message)
+        ack["ok"] = True
+    except Exception as e:
+        logger.exception("Cache invalidation %s failed on %s", message.get("id"), WORKER_ID)
+        ack["ok"], ack["error"] = False, repr(e)
+    await bus.publish(message["reply_to"], orjson.dumps(ack))
+
+
+async def _listen(bus, sub) -> None:
+    """
+    Apply every invalidation published on the channel; resubscribe after
+    connection errors or any other failure. Only cancellation stops it.
+    """
+    while True:
+        try:
+            if sub is None:
+                sub = await bus.subscribe(CACHE_INVALIDATION_CHANNEL)
+            while True:
+                raw = await sub.get()
+                if raw is not None:
+                    await _handle(bus, raw)
+        except RedisError as e:
+            logger.warning("Cache invalidation listener lost its connection: %s", e)
+            await asyncio.sleep(1.0)
+        except Exception:
+            logger.exception("Cache invalidation listener failed; restarting it")
+            await asyncio.sleep(1.0)
+        finally:
+            if sub is not None:
+                try:
+                    await sub.close()
+                except RedisError:
+                    pass
+            sub = None
+
+
+async def start_invalidation_listener() -> None:
+    """
+    Subscribe this worker to the invalidation channel. Safe to call again.
+    """
+    global _listener
+    if _listener is None or _listener.done():
+        bus = get_invalidation_bus()
+        # subscribed before returning, so a broadcast right after reaches us
+        sub = await bus.subscribe(CACHE_INVALIDATION_CHANNEL)
+        _listener = asyncio.create_task(_listen(bus, sub))
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener, _bus
+    if _listener is not None:
+        _listener.cancel()
+        _listener = None
+    if _bus is not None:
+        await _bus.close()
+        _bus = None
+
+
+async def broadcast_invalidation(
+    namespace: Optional[str] = None,
+    timeout: float = CACHE_INVALIDATION_ACK_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Clear `namespace` (everything when None) on every worker.
+
+    The shared tier is cleared here, once; each subscribed worker then
+    clears its own process and acknowledges.
+
+    Returns:
+        dict: entries cleared from the shared tier, workers reached,
+            acknowledgements and one ack per worker that answered
+    """
+    # this worker must hear its own broadcast even if startup didn't run
+    await start_invalidation_listener()
+    if namespace is None:
+        await invalidate_all(scope="shared")
+        shared_cleared = 0
+    else:
+        shared_cleared = await invalidate_namespace(namespace, scope="shared") or 0
+
+    bus = get_invalidation_bus()
+    message_id = uuid.uuid4().hex
+    reply_to = f"{CACHE_INVALIDATION_CHANNEL}:ack:{message_id}"
+    # subscribe to the replies before anyone can send one
+    replies = await bus.subscribe(reply_to)
+    try:
+        workers = await bus.publish(
+            CACHE_INVALIDATION_CHANNEL,
+            orjson.dumps(
+                {
+                    "id": message_id,
+                    "origin": WORKER_ID,
+                    "namespace": namespace,
+                    "reply_to": reply_to,
+                }
+            ),
+        )
+        acks: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + timeout
+        while len(acks) < workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            raw = await replies.get(timeout=remaining)
+            if raw is not None:
+                acks.append(orjson.loads(raw))
+    finally:
+        await replies.close()
+
+    return {
+        "shared_cleared": shared_cleared,
+        "workers": workers,
+        "acknowledged": sum(1 for ack in acks if ack.get("ok")),
+        "acks": acks,
+    }
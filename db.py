@@ -1,21 +1,96 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+import asyncio
+import base64
+import binascii
+import bisect
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import uuid
+import numpy as np
+import orjson
 import pandas as pd
-
-from bigdataloader2 import getData
-
-from aiocache import cached
-from aiocache.serializers import PickleSerializer
-
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from aiocache import caches
+from redis.exceptions import RedisError, WatchError
+from sqlalchemy import text
+
+from api.v0.endpoints.cache_mgmt import verify_cache_key
 from databases.psql import engine, schema
+from services.util.cache_namespaces import LICENSE_NAMESPACE, register_namespace
+from services.util.tiered_cache import shared_tier
+from services.util.hr_snapshot import get_hr_snapshot, invalidate_hr_snapshot
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
 
 CACHE_TTL_SECONDS = 86400  # 24 hours
+# Start a background rebuild once the dataset is this old, so it is replaced
+# before CACHE_TTL_SECONDS runs out; readers keep the old version meanwhile.
+REFRESH_AFTER_SECONDS = int(CACHE_TTL_SECONDS * 0.9)
+REFRESH_CHECK_INTERVAL_SECONDS = 300
+# After a failed build, wait this long before trying again, doubling per
+# consecutive failure up to the max, so a down Postgres/HR isn't hammered
+REFRESH_RETRY_BASE_SECONDS = float(os.getenv("LICENSE_REFRESH_RETRY_BASE_SECONDS", "60"))
+REFRESH_RETRY_MAX_SECONDS = float(os.getenv("LICENSE_REFRESH_RETRY_MAX_SECONDS", "3600"))
+
+# Where the enrichment build runs:
+#   "thread"  - worker thread (default; the Postgres/HR I/O releases the GIL)
+#   "process" - worker process (pandas work too; result is pickled back)
+#   "inline"  - on the event loop itself (blocks every route; debugging only)
+LICENSE_BUILD_EXECUTOR = os.getenv("LICENSE_BUILD_EXECUTOR", "thread").lower()
+
+# Event-loop lag sampling (see /license-reduction/build-status)
+LOOP_LAG_INTERVAL_SECONDS = 0.25
+LOOP_LAG_WINDOW = 2400  # samples kept per bucket (~10 minutes)
+
+# Versions kept in memory after a swap so pagination cursors stay valid
+RETAINED_VERSIONS = 2
+MAX_PAGE_SIZE = 1000
+
+# Sent with every ETag'd response: browsers may keep the body but must
+# revalidate (a 304 when the dataset hasn't changed)
+LICENSE_CACHE_CONTROL = os.getenv("LICENSE_CACHE_CONTROL", "private, no-cache")
+
+# Rows per Arrow record batch / Parquet row group / NDJSON write in /license-reduction/export
+EXPORT_CHUNK_ROWS = int(os.getenv("LICENSE_EXPORT_CHUNK_ROWS", "50000"))
+
+# Change feed (see /license-reduction/changes): diffs kept, and the most
+# changed rows one diff may list before it just tells clients to resync
+CHANGE_FEED_HISTORY = int(os.getenv("LICENSE_CHANGE_FEED_HISTORY", "30"))
+CHANGE_FEED_MAX_ROWS = int(os.getenv("LICENSE_CHANGE_FEED_MAX_ROWS", "50000"))
+
+# Build reports kept in memory (see /license-reduction/build-reports)
+BUILD_REPORT_HISTORY = int(os.getenv("LICENSE_BUILD_REPORT_HISTORY", "20"))
+
+# With a Redis-backed default cache one worker builds and the others load its
+# result: lease of the build lock (also the longest anyone waits for it) and
+# how often waiting workers check for the published dataset
+LICENSE_SHARED_LOCK_SECONDS = int(os.getenv("LICENSE_SHARED_LOCK_SECONDS", "900"))
+LICENSE_SHARED_POLL_SECONDS = float(os.getenv("LICENSE_SHARED_POLL_SECONDS", "2"))
+
+# Last successful build, reloaded on startup so restarted pods serve warm
+LICENSE_SNAPSHOT_PATH = os.getenv(
+    "LICENSE_SNAPSHOT_PATH", "/tmp/license_snapshot/license_dataset.feather"
+)
 
 LICENSE_COLS = [
     "USER_NAME",
@@ -31,63 +106,201 @@ LICENSE_COLS = [
     "ACTIVE_DAYS",
 ]
 
+# The rule behind recommendedAction: Analyst when metric >= threshold.
+# /license-reduction/simulate compares other rules against it.
+RECOMMENDED_ACTION_METRIC = "ANALYST_ACTIONS_PER_DAY"
+RECOMMENDED_ACTION_THRESHOLD = 1.0
+
+LICENSE_NUMERIC_COLS = [
+    "ANALYST_FUNCTIONS",
+    "NON_ANALYST_FUNCTIONS",
+    "ANALYST_PCT",
+    "ANALYST_THRESHOLD",
+    "ANALYST_ACTIONS_PER_DAY",
+    "ANALYST_ACTIONS_PER_ACTIVE_DAYS",
+    "ACTIVE_DAYS",
+]
+
+# How get_license_df() reads analyst_functions_users:
+#   "pandas" - pd.read_sql_query (whole result as Python objects, then converted)
+#   "stream" - server-side cursor, converted to typed columns chunk by chunk
+#   "copy"   - COPY ... TO STDOUT (CSV) parsed chunk by chunk; PostgreSQL only
+LICENSE_LOADER = os.getenv("LICENSE_LOADER", "pandas").lower()
+LICENSE_LOAD_CHUNK_ROWS = int(os.getenv("LICENSE_LOAD_CHUNK_ROWS", "50000"))
+
+# After every successful build the final frame is published to
+# "{schema}".LICENSE_PUBLISH_TABLE for BI tools (see publish_dataset)
+LICENSE_PUBLISH_ENABLED = os.getenv("LICENSE_PUBLISH_ENABLED", "1").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+LICENSE_PUBLISH_TABLE = os.getenv("LICENSE_PUBLISH_TABLE", "analyst_functions_users_enriched")
+LICENSE_PUBLISH_CHUNK_ROWS = int(os.getenv("LICENSE_PUBLISH_CHUNK_ROWS", "50000"))
+# Roles granted SELECT on every newly published table (a renamed-in table
+# does not inherit the grants of the one it replaces)
+LICENSE_PUBLISH_GRANT_ROLES = [
+    r.strip() for r in os.getenv("LICENSE_PUBLISH_GRANT_ROLES", "").split(",") if r.strip()
+]
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
-def get_license_df() -> pd.DataFrame:
+def _license_select_sql() -> str:
+    cols_sql = ", ".join([f'"{c}"' for c in LICENSE_COLS])
+    return f'SELECT {cols_sql} FROM "{schema}".analyst_functions_users'
+
+
+_CSV_BOOLS = {"t": True, "true": True, "f": False, "false": False}
+
+
+def _type_license_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give a chunk the same column types pd.read_sql_query would:
+    metric columns become numeric (Decimal -> float, ints stay ints),
+    everything else stays as-is.
+    """
+    for col in LICENSE_NUMERIC_COLS:
+        if col in df.columns:
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    # COPY's CSV spells booleans t/f, which would all be truthy as strings
+    flag = df.get("ANALYST_USER_FLAG")
+    if flag is not None and not (
+        pd.api.types.is_numeric_dtype(flag) or pd.api.types.is_bool_dtype(flag)
+    ):
+        df["ANALYST_USER_FLAG"] = flag.map(
+            lambda v: _CSV_BOOLS.get(v.strip().lower(), v) if isinstance(v, str) else v
+        )
+    return df
+
+
+def _load_license_df_pandas() -> pd.DataFrame:
+    return pd.read_sql_query(_license_select_sql(), con=engine)
+
+
+def _load_license_df_stream(chunk_rows: int) -> pd.DataFrame:
+    """
+    Server-side cursor: only `chunk_rows` rows exist as Python tuples at any
+    time; each batch is converted to typed columns before the next is fetched.
+    """
+    chunks = []
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, max_row_buffer=chunk_rows
+        ).execute(text(_license_select_sql()))
+        columns = list(result.keys())
+        for rows in result.partitions(chunk_rows):
+            chunks.append(
+                _type_license_chunk(pd.DataFrame.from_records(rows, columns=columns))
+            )
+    if not chunks:
+        return pd.DataFrame(columns=LICENSE_COLS)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _load_license_df_copy(chunk_rows: int) -> pd.DataFrame:
+    """
+    PostgreSQL only: COPY ... TO STDOUT as CSV into a spooled temp file
+    (spills to disk past 64MB), then parse it `chunk_rows` at a time.
+    """
+    copy_sql = f"COPY ({_license_select_sql()}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    raw = engine.raw_connection()
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, mode="w+b") as buf:
+            cur = raw.cursor()
+            if hasattr(cur, "copy_expert"):  # psycopg2
+                cur.copy_expert(copy_sql, buf)
+            else:  # psycopg 3
+                with cur.copy(copy_sql) as copy:
+                    for data in copy:
+                        buf.write(data)
+            cur.close()
+            buf.seek(0)
+            text_cols = [c for c in LICENSE_COLS if c not in LICENSE_NUMERIC_COLS]
+            reader = pd.read_csv(
+                buf, chunksize=chunk_rows, dtype={c: object for c in text_cols}
+            )
+            chunks = [_type_license_chunk(chunk) for chunk in reader]
+    finally:
+        raw.close()
+    if not chunks:
+        return pd.DataFrame(columns=LICENSE_COLS)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_license_df(loader: Optional[str] = None) -> pd.DataFrame:
     """
     Pull the analyst functions users dataset from PostgreSQL
-    (replaces the old S3 CSV load).
+    (replaces the old S3 CSV load). See LICENSE_LOADER for the modes.
     """
-    cols_sql = ", ".join([f'"{c}"' for c in LICENSE_COLS])
-    sql = f'SELECT {cols_sql} FROM "{schema}".analyst_functions_users'
-    df = pd.read_sql_query(sql, con=engine)
+    loader = (loader or LICENSE_LOADER).lower()
+    if loader == "pandas":
+        df = _load_license_df_pandas()
+    elif loader == "stream":
+        df = _load_license_df_stream(LICENSE_LOAD_CHUNK_ROWS)
+    elif loader == "copy":
+        df = _load_license_df_copy(LICENSE_LOAD_CHUNK_ROWS)
+    else:
+        raise ValueError(f"Unknown LICENSE_LOADER: {loader!r}")
     df.columns = [c.strip() for c in df.columns]
     return df
 
 
-def _get_primary_employee_data() -> pd.DataFrame:
+PRIMARY_EMPLOYEE_COLUMNS = [
+    "full_name",
+    "smtp",
+    "status_name",
+    "bname",
+    "nt_id",
+    "gad_id",
+    "cost_center_name",
+    "dept_name",
+    "title",
+]
+FALLBACK_EMPLOYEE_COLUMNS = [
+    "full_name",
+    "smtp",
+    "status_name",
+    "cost_center_name",
+    "dept_name",
+    "title",
+]
+
+
+def _get_employee_data() -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Primary employee lookup. We include extra identifiers to support
-    additional matching passes: bname, nt_id, gad_id.
-    Also includes org metadata (cost center / dept / title).
+    Primary (pageradm_employee_ghr) and fallback (dss_employee_ghr) employee
+    tables from the shared HR snapshot, which pulls both concurrently.
+
+    The primary table carries the extra identifiers (bname, nt_id, gad_id)
+    and the org metadata; the fallback's smtp ranks right after the primary
+    smtp in IDENTITY_KEYS. The snapshot may be at most one refresh interval
+    old, so every dataset rebuild sees reasonably current HR data.
     """
-    params = {"data_type": "pageradm_employee_ghr", "MLR": "L"}
-    custom_columns = [
-        "full_name",
-        "smtp",
-        "status_name",
-        "bname",
-        "nt_id",
-        "gad_id",
-        "cost_center_name",
-        "dept_name",
-        "title",
-    ]
-    return getData(params=params, custom_columns=custom_columns)
+    snapshot = get_hr_snapshot(max_age_seconds=REFRESH_AFTER_SECONDS, allow_stale=False)
+    return (
+        snapshot.primary.reindex(columns=PRIMARY_EMPLOYEE_COLUMNS),
+        snapshot.fallback.reindex(columns=FALLBACK_EMPLOYEE_COLUMNS),
+    )
 
 
-def _get_fallback_employee_data() -> pd.DataFrame:
+def _normalize_key(s: pd.Series) -> pd.Series:
     """
-    Secondary/fallback employee lookup (full_name, smtp, status_name, org fields).
-    Used only when the primary merge fails to resolve FULL_NAME.
+    Normalize an identifier column (email / bname / nt_id / gad_id) for matching:
+    stripped + lowercased, with nulls and stringified nulls ("nan", "none", "")
+    turned into real NA so they can never match each other.
     """
-    params = {"data_type": "dss_employee_ghr", "MLR": "L"}
-    custom_columns = [
-        "full_name",
-        "smtp",
-        "status_name",
-        "cost_center_name",
-        "dept_name",
-        "title",
-    ]
-    return getData(params=params, custom_columns=custom_columns)
+    out = s.astype("string").str.strip().str.lower()
+    return out.mask(out.isin(["", "nan", "none"]))
 
 
-def _partner_to_samsung_email(email: Optional[str]) -> Optional[str]:
+def _partner_to_samsung_email(emails: pd.Series) -> pd.Series:
     """
     If a license row uses a contractor/partner email but the employee tables
     now contain @samsung.com, we try an alternate email.
@@ -95,102 +308,152 @@ def _partner_to_samsung_email(email: Optional[str]) -> Optional[str]:
     Example:
     someone@partner.samsung.com -> someone@samsung.com
     """
-    if not email:
-        return email
-    e = str(email).strip()
-    if "@partner.samsung" in e:
-        left = e.split("@", 1)[0]
-        return f"{left}@samsung.com"
-    return e
+    e = emails.astype(str).str.strip()
+    is_partner = e.str.contains("@partner.samsung", regex=False, na=False)
+    return e.where(~is_partner, e.str.split("@", n=1).str[0] + "@samsung.com")
 
 
-def _email_localpart(email: Optional[str]) -> Optional[str]:
+def _email_localpart(emails: pd.Series) -> pd.Series:
     """
-    Return the part of an email before '@'. If '@' not present, returns the input.
+    Return the part of each email before '@'. If '@' is not present, returns the input.
     """
-    if not email:
-        return None
-    e = str(email).strip()
-    if "@" not in e:
-        return e
-    return e.split("@", 1)[0]
+    return emails.astype(str).str.strip().str.split("@", n=1).str[0].where(emails.notna())
 
 
-def _fill_missing_from_key(
-    merged: pd.DataFrame,
-    missing_mask: pd.Series,
-    lookup: pd.DataFrame,
-    lookup_key: str,
-    left_key_series: pd.Series,
-) -> pd.DataFrame:
-    """
-    Fill FULL_NAME + STATUS_NAME + org fields (cost_center_name, dept_name, title)
-    for rows where merged[FULL_NAME] is missing, using a lookup table keyed by
-    `lookup_key`, matching `left_key_series`.
+# ---------------------------------------------------------------------------
+# Identity resolution
+# ---------------------------------------------------------------------------
 
-    - lookup must contain: lookup_key, full_name, status_name, cost_center_name, dept_name, title
-    - left_key_series is the values to look up (same index as merged[missing_mask])
-    """
-    if not missing_mask.any():
-        return merged
+# Every way a license row can be tied to an employee, in priority order
+# (first match wins):
+#   (key name, license column, HR source, HR column)
+IDENTITY_KEYS = [
+    ("smtp", "USER_EMAIL", "primary", "smtp"),
+    ("fallback_smtp", "USER_EMAIL", "fallback", "smtp"),
+    ("partner_smtp", "USER_EMAIL_ALT", "primary", "smtp"),
+    ("bname", "USER_NAME", "primary", "bname"),
+    ("nt_id", "USER_NAME", "primary", "nt_id"),
+    ("gad_id", "USER_EMAIL_LOCAL", "primary", "gad_id"),
+]
 
-    needed = {lookup_key, "full_name", "status_name", "cost_center_name", "dept_name", "title"}
-    if not needed.issubset(set(lookup.columns)):
-        return merged
+# HR field -> enriched column
+EMPLOYEE_FIELDS = {
+    "full_name": "FULL_NAME",
+    "status_name": "STATUS_NAME",
+    "cost_center_name": "cost_center_name",
+    "dept_name": "dept_name",
+    "title": "title",
+}
 
-    lk = lookup[[lookup_key, "full_name", "status_name", "cost_center_name", "dept_name", "title"]].copy()
-    lk[lookup_key] = lk[lookup_key].astype(str).str.strip().str.lower()
-    lk = lk.dropna(subset=[lookup_key]).drop_duplicates(subset=[lookup_key], keep="first")
 
-    left_keys_norm = left_key_series.astype(str).str.strip().str.lower()
+class IdentityIndex:
+    """
+    Every normalized HR identifier mapped to the employee it belongs to.
 
-    name_map = lk.set_index(lookup_key)["full_name"].to_dict()
-    status_map = lk.set_index(lookup_key)["status_name"].to_dict()
-    cc_map = lk.set_index(lookup_key)["cost_center_name"].to_dict()
-    dept_map = lk.set_index(lookup_key)["dept_name"].to_dict()
-    title_map = lk.set_index(lookup_key)["title"].to_dict()
+    `table` has one row per (key_type, key) with the key's priority and the
+    employee fields. Entries without a full_name are left out: they can't
+    resolve a name, so a lower-priority key gets the chance instead.
+    """
 
-    merged.loc[missing_mask, "FULL_NAME"] = merged.loc[missing_mask, "FULL_NAME"].fillna(
-        left_keys_norm.map(name_map)
-    )
-    merged.loc[missing_mask, "STATUS_NAME"] = merged.loc[missing_mask, "STATUS_NAME"].fillna(
-        left_keys_norm.map(status_map)
-    )
-    merged.loc[missing_mask, "cost_center_name"] = merged.loc[missing_mask, "cost_center_name"].fillna(
-        left_keys_norm.map(cc_map)
-    )
-    merged.loc[missing_mask, "dept_name"] = merged.loc[missing_mask, "dept_name"].fillna(
-        left_keys_norm.map(dept_map)
-    )
-    merged.loc[missing_mask, "title"] = merged.loc[missing_mask, "title"].fillna(
-        left_keys_norm.map(title_map)
-    )
+    def __init__(self, primary: pd.DataFrame, fallback: Optional[pd.DataFrame] = None):
+        sources = {"primary": primary, "fallback": fallback}
+        parts = []
+        for priority, (key_type, _, source, hr_col) in enumerate(IDENTITY_KEYS):
+            hr = sources.get(source)
+            if hr is None or hr_col not in hr.columns or "full_name" not in hr.columns:
+                continue
+            fields = [f for f in EMPLOYEE_FIELDS if f in hr.columns]
+            part = hr[fields].copy()
+            part["key"] = _normalize_key(hr[hr_col])
+            part = part.dropna(subset=["key", "full_name"]).drop_duplicates(
+                subset=["key"], keep="first"
+            )
+            part["key_type"] = key_type
+            part["priority"] = priority
+            parts.append(part)
+
+        columns = ["key_type", "key", "priority", *EMPLOYEE_FIELDS]
+        self.table = (
+            pd.concat(parts, ignore_index=True).reindex(columns=columns)
+            if parts
+            else pd.DataFrame(columns=columns)
+        )
 
-    return merged
+    def resolve(
+        self, df: pd.DataFrame, timings: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> pd.DataFrame:
+        """
+        Match every license row against every identifier type and keep the
+        highest-priority hit per row.
+
+        Returns a frame indexed by row position with the employee fields and
+        `key_type` (which identifier matched). If `timings` is given, it is
+        filled with key type -> {seconds, candidates, matched} for each lookup.
+        """
+        hits = []
+        for key_type, license_col, _, _ in IDENTITY_KEYS:
+            if license_col not in df.columns:
+                continue
+            started = time.perf_counter()
+            keys = _normalize_key(df[license_col])
+            candidates = pd.DataFrame(
+                {"row": np.arange(len(df)), "key": keys.to_numpy()}
+            ).dropna(subset=["key"])
+            part = candidates.merge(
+                self.table[self.table["key_type"] == key_type], how="inner", on="key"
+            )
+            hits.append(part)
+            if timings is not None:
+                timings[key_type] = {
+                    "seconds": time.perf_counter() - started,
+                    "candidates": len(candidates),
+                    "matched": len(part),
+                }
+        if not hits:
+            return self.table.iloc[0:0].set_index(pd.Index([], name="row"))
+
+        return (
+            pd.concat(hits, ignore_index=True)
+            .sort_values(["row", "priority"], kind="stable")
+            .drop_duplicates(subset=["row"], keep="first")
+            .set_index("row")
+        )
+
+    def enrich(
+        self, df: pd.DataFrame, timings: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> pd.DataFrame:
+        """
+        Fill FULL_NAME / STATUS_NAME / org fields from the best match and record
+        the identifier that produced it in MATCHED_KEY (None when unresolved).
+        Values already present on the license row win over HR values.
+        """
+        best = self.resolve(df, timings)
+        positions = best.index.to_numpy()
+
+        out = df.copy()
+        for hr_field, col in EMPLOYEE_FIELDS.items():
+            values = np.full(len(out), None, dtype=object)
+            values[positions] = best[hr_field].to_numpy(dtype=object)
+            resolved = pd.Series(values, index=out.index)
+            resolved = resolved.where(resolved.notna(), None)
+            out[col] = out[col].where(out[col].notna(), resolved) if col in out else resolved
+
+        matched = np.full(len(out), None, dtype=object)
+        matched[positions] = best["key_type"].to_numpy(dtype=object)
+        out["MATCHED_KEY"] = matched
+        return out
 
 
 # ---------------------------------------------------------------------------
-# Cached data builders
+# Enrichment build
 # ---------------------------------------------------------------------------
 
 
-@cached(ttl=CACHE_TTL_SECONDS, serializer=PickleSerializer())
-async def get_cached_final_df() -> pd.DataFrame:
+def _prepare_license_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize the raw analyst_functions_users rows and derive the columns
+    used for matching and for the UI.
     """
-    Build the fully-enriched dataset once (per TTL) and cache it:
-
-    1) Load base rows from PostgreSQL (analyst_functions_users)
-    2) Compute recommendedAction
-    3) Primary merge on USER_EMAIL -> smtp to get FULL_NAME + STATUS_NAME + org fields
-    4) Fallback merge for remaining missing FULL_NAME (also fills org fields)
-    5) Partner email repair (partner -> samsung) for still-missing (also fills org fields)
-    6) Additional passes for still-missing:
-        a) bname  -> USER_NAME
-        b) nt_id  -> USER_NAME
-        c) gad_id -> localpart(USER_EMAIL)
-    """
-    # 1) Load base data from Postgres
-    df = get_license_df()
     df.columns = [c.strip() for c in df.columns]
     df = df.where(df.notna(), None)
 
@@ -207,296 +470,2579 @@ async def get_cached_final_df() -> pd.DataFrame:
         ).fillna(0)
 
     # Compute recommendedAction once
-    df["recommendedAction"] = df["ANALYST_ACTIONS_PER_DAY"].apply(
-        lambda x: "Analyst" if float(x) >= 1 else "Consumer"
-    )
-
-    # Partner repair candidate email (used later if needed)
-    df["USER_EMAIL_ALT"] = (
-        df["USER_EMAIL"]
-        .apply(_partner_to_samsung_email)
-        .astype(str)
-        .str.strip()
-        .str.lower()
-    )
+    df["recommendedAction"] = np.where(
+        df[RECOMMENDED_ACTION_METRIC].to_numpy(dtype="float64") >= RECOMMENDED_ACTION_THRESHOLD,
+        "Analyst",
+        "Consumer",
+    ).astype(object)
 
-    # Email local-part (for final matching against gad_id)
-    df["USER_EMAIL_LOCAL"] = df["USER_EMAIL"].apply(_email_localpart)
+    # Partner repair candidate email + email local-part (matched against gad_id)
+    df["USER_EMAIL_ALT"] = _partner_to_samsung_email(df["USER_EMAIL"]).str.lower()
+    df["USER_EMAIL_LOCAL"] = _email_localpart(df["USER_EMAIL"])
 
-    # Ensure org fields exist so downstream fillna logic doesn't KeyError
+    # Ensure org fields exist so enrichment can always fill them
     for col in ["cost_center_name", "dept_name", "title"]:
         if col not in df.columns:
             df[col] = None
 
-    # 2) Primary employee lookup
-    user_data = _get_primary_employee_data().copy()
-
-    # Normalize primary lookup keys
-    for col in ["smtp", "bname", "nt_id", "gad_id"]:
-        if col in user_data.columns:
-            user_data[col] = user_data[col].astype(str).str.strip().str.lower()
-
-    # Normalize org fields in employee data (optional, but helps consistency)
-    for col in ["cost_center_name", "dept_name", "title", "full_name", "status_name"]:
-        if col in user_data.columns:
-            user_data[col] = user_data[col].astype(str).str.strip()
-
-    # 3) Primary merge on email
-    merged = (
-        df.merge(
-            user_data,
-            how="left",
-            left_on="USER_EMAIL",
-            right_on="smtp",
-            suffixes=("", "_emp"),
-        )
-        .drop(columns=["smtp"], errors="ignore")
-        .rename(
-            columns={
-                "full_name": "FULL_NAME",
-                "status_name": "STATUS_NAME",
-                "cost_center_name": "cost_center_name",
-                "dept_name": "dept_name",
-                "title": "title",
-            }
-        )
-    )
+    return df
 
-    # If merge produced duplicate org columns (because df already had them),
-    # keep the merged values and drop extras.
-    for col in ["cost_center_name", "dept_name", "title"]:
-        alt = f"{col}_emp"
-        if alt in merged.columns:
-            merged[col] = merged[col].fillna(merged[alt])
-            merged.drop(columns=[alt], inplace=True)
-
-    # 4) Fallback merge ONLY where FULL_NAME is missing
-    missing_mask = merged["FULL_NAME"].isna()
-    if missing_mask.any():
-        fallback_emp = _get_fallback_employee_data().copy()
-
-        if "smtp" in fallback_emp.columns:
-            fallback_emp["smtp"] = fallback_emp["smtp"].astype(str).str.strip().str.lower()
-
-        to_fix = merged.loc[missing_mask].merge(
-            fallback_emp,
-            how="left",
-            left_on="USER_EMAIL",
-            right_on="smtp",
-            suffixes=("", "_fb"),
-        )
 
-        # Fill missing FULL_NAME/STATUS_NAME from fallback merge
-        name_map = to_fix.set_index("USER_EMAIL")["full_name"].to_dict()
-        status_map = to_fix.set_index("USER_EMAIL")["status_name"].to_dict()
+def _apply_unresolved_fallback(merged: pd.DataFrame) -> pd.DataFrame:
+    """
+    Any rows STILL missing FULL_NAME are likely terminated / not found in HR datasets.
+    """
+    final_missing = merged["FULL_NAME"].isna()
 
-        merged.loc[missing_mask, "FULL_NAME"] = merged.loc[missing_mask, "FULL_NAME"].fillna(
-            merged.loc[missing_mask, "USER_EMAIL"].map(name_map)
-        )
-        merged.loc[missing_mask, "STATUS_NAME"] = merged.loc[missing_mask, "STATUS_NAME"].fillna(
-            merged.loc[missing_mask, "USER_EMAIL"].map(status_map)
-        )
+    if final_missing.any():
+        merged.loc[final_missing, "FULL_NAME"] = POSSIBLY_TERMINATED
+        merged.loc[final_missing, "STATUS_NAME"] = merged.loc[
+            final_missing, "STATUS_NAME"
+        ].fillna("Unknown")
 
-        # Also fill org fields from fallback merge
+        # If org fields are still missing, fill with something consistent
         for col in ["cost_center_name", "dept_name", "title"]:
-            if col in to_fix.columns:
-                col_map = to_fix.set_index("USER_EMAIL")[col].to_dict()
-                merged.loc[missing_mask, col] = merged.loc[missing_mask, col].fillna(
-                    merged.loc[missing_mask, "USER_EMAIL"].map(col_map)
-                )
+            merged.loc[final_missing, col] = merged.loc[final_missing, col].fillna("Unknown")
 
-    # 5) Partner email repair (still missing + partner email)
-    still_missing = merged["FULL_NAME"].isna()
-    partner_missing = still_missing & merged["USER_EMAIL"].astype(str).str.contains(
-        "@partner.samsung", na=False
-    )
+    return merged
 
-    if partner_missing.any():
-        to_fix2 = merged.loc[partner_missing].merge(
-            user_data,
-            how="left",
-            left_on="USER_EMAIL_ALT",
-            right_on="smtp",
-            suffixes=("", "_alt"),
-        )
 
-        name_map2 = to_fix2.set_index("USER_EMAIL")["full_name"].to_dict()
-        status_map2 = to_fix2.set_index("USER_EMAIL")["status_name"].to_dict()
+class BuildReport:
+    """
+    Wall time, rows in and rows newly resolved for every stage of one
+    dataset build. Plain data, so it survives the trip back from a
+    process executor.
+
+    Stages, in order: postgres_load, prepare_license_rows, hr_fetch,
+    identity_index, one match.<key type> per IDENTITY_KEYS entry (rows in =
+    rows no higher-priority identifier resolved), unresolved_fallback,
+    dataset_build, snapshot_write, publish.
+    """
 
-        merged.loc[partner_missing, "FULL_NAME"] = merged.loc[partner_missing, "FULL_NAME"].fillna(
-            merged.loc[partner_missing, "USER_EMAIL"].map(name_map2)
-        )
-        merged.loc[partner_missing, "STATUS_NAME"] = merged.loc[partner_missing, "STATUS_NAME"].fillna(
-            merged.loc[partner_missing, "USER_EMAIL"].map(status_map2)
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.version: Optional[str] = None
+        self.executor = LICENSE_BUILD_EXECUTOR
+        self.stages: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        stage: str,
+        seconds: float,
+        rows_in: Optional[int] = None,
+        resolved: Optional[int] = None,
+        **extra: Any,
+    ) -> None:
+        self.stages.append(
+            {
+                "stage": stage,
+                "seconds": round(seconds, 6),
+                "rowsIn": rows_in,
+                "resolved": resolved,
+                **extra,
+            }
         )
 
-        # Also fill org fields from partner repair merge
-        for col in ["cost_center_name", "dept_name", "title"]:
-            if col in to_fix2.columns:
-                col_map2 = to_fix2.set_index("USER_EMAIL")[col].to_dict()
-                merged.loc[partner_missing, col] = merged.loc[partner_missing, col].fillna(
-                    merged.loc[partner_missing, "USER_EMAIL"].map(col_map2)
-                )
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Time the block; it may fill in rowsIn / resolved / extras on the
+        yielded dict.
+        """
+        entry: Dict[str, Any] = {"rowsIn": rows_in, "resolved": None}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            rows_in, resolved = entry.pop("rowsIn"), entry.pop("resolved")
+            self.add(name, time.perf_counter() - started, rows_in, resolved, **entry)
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "status": self.status,
+            "error": self.error,
+            "executor": self.executor,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "stages": self.stages,
+        }
 
-    # 6) Additional resolution passes for anything STILL missing FULL_NAME
-    #    a) bname -> USER_NAME
-    missing = merged["FULL_NAME"].isna()
-    if missing.any() and "bname" in user_data.columns and "USER_NAME" in merged.columns:
-        user_bname = user_data.dropna(subset=["bname"]).copy()
-        merged = _fill_missing_from_key(
-            merged=merged,
-            missing_mask=missing,
-            lookup=user_bname,
-            lookup_key="bname",
-            left_key_series=merged.loc[missing, "USER_NAME"],
-        )
 
-    #    b) nt_id -> USER_NAME
-    missing = merged["FULL_NAME"].isna()
-    if missing.any() and "nt_id" in user_data.columns and "USER_NAME" in merged.columns:
-        user_ntid = user_data.dropna(subset=["nt_id"]).copy()
-        merged = _fill_missing_from_key(
-            merged=merged,
-            missing_mask=missing,
-            lookup=user_ntid,
-            lookup_key="nt_id",
-            left_key_series=merged.loc[missing, "USER_NAME"],
-        )
+def _build_final_df(report: Optional[BuildReport] = None) -> pd.DataFrame:
+    """
+    Build the fully-enriched dataset:
 
-    #    c) gad_id -> localpart(USER_EMAIL)
-    missing = merged["FULL_NAME"].isna()
-    if (
-        missing.any()
-        and "gad_id" in user_data.columns
-        and "USER_EMAIL_LOCAL" in merged.columns
-    ):
-        user_gad = user_data.dropna(subset=["gad_id"]).copy()
-        merged = _fill_missing_from_key(
-            merged=merged,
-            missing_mask=missing,
-            lookup=user_gad,
-            lookup_key="gad_id",
-            left_key_series=merged.loc[missing, "USER_EMAIL_LOCAL"],
+    1) Load base rows from PostgreSQL (analyst_functions_users)
+    2) Compute recommendedAction + matching helper columns
+    3) Take primary + fallback HR data from the HR snapshot and index every identifier
+       (smtp, fallback smtp, partner->samsung smtp, bname, nt_id, gad_id)
+    4) Resolve every row in one lookup, highest-priority identifier wins
+    5) Mark anything unresolved as "Possibly Terminated"
+
+    Each step is recorded on `report` (see BuildReport).
+    """
+    report = report if report is not None else BuildReport()
+
+    with report.stage("postgres_load") as st:
+        raw = get_license_df()
+        st["rowsIn"] = len(raw)
+    with report.stage("prepare_license_rows", len(raw)):
+        df = _prepare_license_rows(raw)
+
+    # HR text fields are already stripped by the snapshot
+    with report.stage("hr_fetch") as st:
+        primary, fallback = _get_employee_data()
+        st["rowsIn"] = len(primary) + len(fallback)
+        st["primaryRows"], st["fallbackRows"] = len(primary), len(fallback)
+    with report.stage("identity_index", len(primary) + len(fallback)) as st:
+        index = IdentityIndex(primary=primary, fallback=fallback)
+        st["keys"] = len(index.table)
+
+    timings: Dict[str, Dict[str, Any]] = {}
+    merged = index.enrich(df, timings)
+
+    # Attribute each resolved row to the identifier that won it
+    resolved_by = merged["MATCHED_KEY"].value_counts()
+    unresolved = len(merged)
+    for key_type, _, _, _ in IDENTITY_KEYS:
+        timing = timings.get(key_type)
+        if timing is None:
+            continue
+        resolved = int(resolved_by.get(key_type, 0))
+        report.add(
+            f"match.{key_type}",
+            timing["seconds"],
+            unresolved,
+            resolved,
+            candidates=timing["candidates"],
+            matched=timing["matched"],
         )
+        unresolved -= resolved
 
-    # ------------------------------------------------------------
-    # Final fallback: any rows STILL missing FULL_NAME
-    # are likely terminated / not found in HR datasets.
-    # ------------------------------------------------------------
-    final_missing = merged["FULL_NAME"].isna()
+    with report.stage("unresolved_fallback", unresolved):
+        return _apply_unresolved_fallback(merged)
 
-    if final_missing.any():
-        merged.loc[final_missing, "FULL_NAME"] = "Possibly Terminated"
-        merged.loc[final_missing, "STATUS_NAME"] = merged.loc[
-            final_missing, "STATUS_NAME"
-        ].fillna("Unknown")
 
-        # If org fields are still missing, fill with something consistent
-        for col in ["cost_center_name", "dept_name", "title"]:
-            merged.loc[final_missing, col] = merged.loc[final_missing, col].fillna("Unknown")
+# ---------------------------------------------------------------------------
+# Dataset (frame + per-cost-center index + encoded payloads)
+# ---------------------------------------------------------------------------
 
-    return merged
+EMPTY_PAYLOAD = b"[]"
 
 
-@cached(ttl=CACHE_TTL_SECONDS, serializer=PickleSerializer())
-async def get_cached_cost_centers_list() -> List[str]:
+def _json_default(v: Any) -> Any:
+    """
+    orjson fallback for values it can't encode natively
+    (pandas Timestamps, Decimals coming back from the driver, ...).
+    """
+    if isinstance(v, Decimal):
+        return float(v)
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(v).__name__}")
+
+
+def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+# (output key, source column, coercion). Coercions mirror what the frontend
+# has always received: numbers default to 0, the flag to False, and every
+# other null becomes None.
+UI_FIELDS = [
+    # UI-visible columns
+    ("name", "FULL_NAME", None),
+    ("statusName", "STATUS_NAME", None),
+    ("user", "USER_NAME", None),
+    ("email", "USER_EMAIL", None),
+    ("costCenterName", "cost_center_name", None),
+    ("departmentName", "dept_name", None),
+    ("title", "title", None),
+    ("recommendedAction", "recommendedAction", None),
+    # Extra fields (optional; safe to keep for later UI expansion)
+    ("lastActivity", "LAST_ACTIVITY", None),
+    ("analystActionsPerDay", "ANALYST_ACTIONS_PER_DAY", "float"),
+    ("analystFunctions", "ANALYST_FUNCTIONS", "int"),
+    ("nonAnalystFunctions", "NON_ANALYST_FUNCTIONS", "int"),
+    ("activeDays", "ACTIVE_DAYS", "int"),
+    ("titleCategory", "TITLE_CATEGORY", None),
+    ("analystPct", "ANALYST_PCT", None),
+    ("analystUserFlag", "ANALYST_USER_FLAG", "bool"),
+    ("analystThreshold", "ANALYST_THRESHOLD", None),
+]
+
+MISSING_NAME_FIELDS = [
+    ("user", "USER_NAME", None),
+    ("email", "USER_EMAIL", None),
+    ("altEmail", "USER_EMAIL_ALT", None),
+    ("emailLocal", "USER_EMAIL_LOCAL", None),
+    ("costCenterName", "cost_center_name", None),
+    ("departmentName", "dept_name", None),
+    ("title", "title", None),
+    ("recommendedAction", "recommendedAction", None),
+]
+
+UI_FIELD_COLUMNS = {key: col for key, col, _ in UI_FIELDS}
+
+_COERCION_DEFAULTS = {None: None, "float": 0.0, "int": 0, "bool": False}
+
+
+def _column_values(df: pd.DataFrame, col: str, coercion: Optional[str]) -> List[Any]:
+    """
+    Convert one frame column to a list of JSON-ready Python values,
+    applying the null handling / coercion as a whole-column operation.
     """
-    Cache the cost center list so the UI dropdown doesn't cause repeated work.
+    if col not in df.columns:
+        return [_COERCION_DEFAULTS[coercion]] * len(df)
+
+    s = df[col]
+    if coercion == "float":
+        return pd.to_numeric(s, errors="coerce").fillna(0).astype("float64").tolist()
+    if coercion == "int":
+        return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64").tolist()
+    if coercion == "bool":
+        return s.where(s.notna(), False).astype(bool).tolist()
+    if pd.api.types.is_datetime64_any_dtype(s):
+        # Plain datetimes are encoded natively by orjson; Timestamps would
+        # go through _json_default one value at a time. Kept positional: a
+        # Series wrapper would realign on the frame's (sliced) index.
+        values = np.array(s.dt.to_pydatetime(), dtype=object)
+        values[s.isna().to_numpy()] = None
+        return values.tolist()
+    return s.astype(object).where(s.notna(), None).tolist()
+
+
+def frame_to_records(df: pd.DataFrame, fields=UI_FIELDS) -> List[Dict[str, Any]]:
     """
-    df = await get_cached_final_df()
+    Columnar replacement for `[row_to_ui(r) for _, r in df.iterrows()]`:
+    each column is converted once, then zipped into records.
+    """
+    keys = [key for key, _, _ in fields]
+    columns = [_column_values(df, col, coercion) for _, col, coercion in fields]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
+
+
+def serialize_frame(df: pd.DataFrame, fields=UI_FIELDS) -> bytes:
+    """
+    Encode `df` as a JSON array of UI records (see `frame_to_records`).
+    """
+    if df.empty:
+        return EMPTY_PAYLOAD
+    return _dumps(frame_to_records(df, fields))
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+# Repetitive text columns, stored as categoricals
+CATEGORICAL_COLS = [
+    "cost_center_name",
+    "dept_name",
+    "title",
+    "STATUS_NAME",
+    "recommendedAction",
+    "MATCHED_KEY",
+]
+# Metrics downcast to the smallest dtype that holds them exactly
+INTEGER_METRIC_COLS = [
+    "ANALYST_FUNCTIONS",
+    "NON_ANALYST_FUNCTIONS",
+    "ACTIVE_DAYS",
+    "ANALYST_THRESHOLD",
+    "ANALYST_USER_FLAG",
+]
+FLOAT_METRIC_COLS = [
+    "ANALYST_PCT",
+    "ANALYST_ACTIONS_PER_DAY",
+    "ANALYST_ACTIONS_PER_ACTIVE_DAYS",
+    "ANALYST_THRESHOLD",
+]
+# Matching helpers only /license-reduction/missing-names shows; they are
+# dropped from the cached frame and re-derived on demand (LicenseDataset.debug_frame)
+DEBUG_ONLY_COLS = ["USER_EMAIL_ALT", "USER_EMAIL_LOCAL"]
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def compact_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Shrink the enriched frame before it is cached:
+
+    - repetitive text columns -> categoricals
+    - integer metrics -> smallest integer dtype
+    - float metrics -> float32, only where that is lossless (so the JSON
+      the frontend gets doesn't change)
+    - debug-only helper columns dropped
+
+    Returns the compacted frame and a before/after memory report.
+    """
+    before = _frame_bytes(df)
+    before_cols = df.memory_usage(index=False, deep=True)
+
+    out = df.drop(columns=[c for c in DEBUG_ONLY_COLS if c in df.columns])
+
+    for col in CATEGORICAL_COLS:
+        if col in out.columns and not isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype("category")
+
+    for col in INTEGER_METRIC_COLS:
+        if col in out.columns and pd.api.types.is_integer_dtype(out[col]):
+            out[col] = pd.to_numeric(out[col], downcast="integer")
+
+    for col in FLOAT_METRIC_COLS:
+        if col in out.columns and out[col].dtype == "float64":
+            as_f32 = out[col].astype("float32")
+            if np.array_equal(as_f32.to_numpy("float64"), out[col].to_numpy(), equal_nan=True):
+                out[col] = as_f32
+
+    after_cols = out.memory_usage(index=False, deep=True)
+    report = {
+        "rows": len(out),
+        "beforeBytes": before,
+        "afterBytes": _frame_bytes(out),
+        "droppedColumns": [c for c in DEBUG_ONLY_COLS if c in df.columns],
+        "columns": {
+            col: {
+                "dtype": str(out[col].dtype),
+                "beforeBytes": int(before_cols[col]),
+                "afterBytes": int(after_cols[col]),
+            }
+            for col in out.columns
+        },
+    }
+    return out, report
+
 
+def _build_cost_center_index(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Map each (stripped) cost_center_name to the row positions it owns in `df`.
+    Rows without a cost center are left out of the index.
+    """
     if "cost_center_name" not in df.columns:
         raise HTTPException(
             status_code=400, detail="Missing 'cost_center_name' after employee merge"
         )
 
-    centers = sorted(
+    cc = df["cost_center_name"]
+    keys = cc.astype(str).str.strip().where(cc.notna())
+    return {
+        k: positions
+        for k, positions in keys.groupby(keys, sort=False).indices.items()
+        if k
+    }
+
+
+# ---------------------------------------------------------------------------
+# Summary rollups
+# ---------------------------------------------------------------------------
+
+POSSIBLY_TERMINATED = "Possibly Terminated"
+
+# /license-reduction/summary?group_by=... -> grouping column
+SUMMARY_GROUPINGS = {
+    "cost_center": "cost_center_name",
+    "department": "dept_name",
+}
+
+
+def _safe_float(v: Any) -> Optional[float]:
+    return None if pd.isna(v) else float(v)
+
+
+def _rollup_counts(df: pd.DataFrame, keys: pd.Series) -> pd.DataFrame:
+    """
+    One row per key: user counts by recommendedAction / STATUS_NAME,
+    "Possibly Terminated" count, reclaimable licenses and mean
+    ANALYST_ACTIONS_PER_DAY.
+
+    Reclaimable = users recommended "Consumer" plus users who are possibly
+    terminated (each user counted once).
+    """
+    action = df["recommendedAction"].astype(object)
+    terminated = (df["FULL_NAME"] == POSSIBLY_TERMINATED).to_numpy()
+    frame = pd.DataFrame(
         {
-            str(x).strip()
-            for x in df["cost_center_name"].dropna().tolist()
-            if str(x).strip()
+            "key": keys.to_numpy(),
+            "analyst": (action == "Analyst").to_numpy(),
+            "consumer": (action == "Consumer").to_numpy(),
+            "possiblyTerminated": terminated,
+            "reclaimable": (action == "Consumer").to_numpy() | terminated,
+            "actionsPerDay": pd.to_numeric(df["ANALYST_ACTIONS_PER_DAY"], errors="coerce").to_numpy(),
         }
     )
-    return centers
+    grouped = frame.groupby("key", sort=True, dropna=True)
+    counts = grouped[["analyst", "consumer", "possiblyTerminated", "reclaimable"]].sum()
+    counts.insert(0, "users", grouped.size())
+    counts["meanAnalystActionsPerDay"] = grouped["actionsPerDay"].mean().round(4)
+    return counts
+
+
+def _status_counts(df: pd.DataFrame, keys: pd.Series) -> Dict[Any, Dict[str, int]]:
+    status = df["STATUS_NAME"].astype(object).where(df["STATUS_NAME"].notna(), "Unknown")
+    table = pd.crosstab(keys.to_numpy(), status.to_numpy())
+    return {
+        key: {s: int(n) for s, n in row.items() if n}
+        for key, row in table.to_dict(orient="index").items()
+    }
+
+
+def build_summary(df: pd.DataFrame, group_col: str) -> Dict[str, Any]:
+    """
+    Org overview grouped by `group_col`, plus overall totals.
+    """
+    keys = df[group_col].astype(object).where(df[group_col].notna(), None)
+    rollup = _rollup_counts(df, keys)
+    statuses = _status_counts(df, keys)
+    totals = _rollup_counts(df, pd.Series("all", index=df.index)).iloc[0]
+
+    groups = [
+        {
+            "name": name,
+            "users": int(row["users"]),
+            "analyst": int(row["analyst"]),
+            "consumer": int(row["consumer"]),
+            "possiblyTerminated": int(row["possiblyTerminated"]),
+            "reclaimable": int(row["reclaimable"]),
+            "meanAnalystActionsPerDay": _safe_float(row["meanAnalystActionsPerDay"]),
+            "byStatus": statuses.get(name, {}),
+        }
+        for name, row in rollup.iterrows()
+    ]
+    return {
+        "totals": {
+            "users": int(totals["users"]),
+            "analyst": int(totals["analyst"]),
+            "consumer": int(totals["consumer"]),
+            "possiblyTerminated": int(totals["possiblyTerminated"]),
+            "reclaimable": int(totals["reclaimable"]),
+            "meanAnalystActionsPerDay": _safe_float(totals["meanAnalystActionsPerDay"]),
+        },
+        "groups": groups,
+    }
 
 
 # ---------------------------------------------------------------------------
-# Routes
+# What-if threshold simulation
 # ---------------------------------------------------------------------------
 
-
-@router.get("/cost-centers", response_model=List[str])
-async def get_cost_centers() -> List[str]:
-    return await get_cached_cost_centers_list()
+# Metrics a simulated rule may threshold on (/license-reduction/simulate)
+SIMULATION_METRICS = [
+    "ANALYST_ACTIONS_PER_DAY",
+    "ANALYST_ACTIONS_PER_ACTIVE_DAYS",
+    "ANALYST_PCT",
+    "ANALYST_FUNCTIONS",
+    "ACTIVE_DAYS",
+]
+MAX_SIMULATION_THRESHOLDS = 100
 
 
-@router.get("/license-reduction", response_model=List[Dict[str, Any]])
-async def get_license_reduction(
-    cost_center_name: str = Query(..., description="Exact cost-center name"),
-) -> List[Dict[str, Any]]:
+class ThresholdIndex:
     """
-    Return a list of records in the exact shape expected by the Next frontend.
+    Per-group sorted metric values, answering "how many rows in each group
+    have metric >= t" for many groups and thresholds with one binary search.
+
+    Values are replaced by their rank among the distinct values and packed
+    with the group code into one sorted int64 key (group * (n_distinct + 1)
+    + rank), so every group's rows are a sorted run of `keys`. Null metrics
+    never meet a threshold.
     """
-    df = await get_cached_final_df()
 
-    if "cost_center_name" not in df.columns:
-        raise HTTPException(
-            status_code=400, detail="Missing 'cost_center_name' after employee merge"
+    def __init__(self, values: np.ndarray, codes: np.ndarray, n_groups: int):
+        values = np.where(np.isnan(values), -np.inf, values)
+        self.distinct, ranks = np.unique(values, return_inverse=True)
+        self.stride = len(self.distinct) + 1
+        self.n_groups = n_groups
+        self.keys = np.sort(codes.astype("int64") * self.stride + ranks)
+        # one past the last key of each group
+        self.group_ends = np.searchsorted(
+            self.keys, (np.arange(n_groups, dtype="int64") + 1) * self.stride
         )
 
-    mask = df["cost_center_name"].astype(str).str.strip().eq(cost_center_name.strip())
-    filtered = df.loc[mask].copy()
+    def count_at_least(self, thresholds: np.ndarray) -> np.ndarray:
+        """
+        (len(thresholds), n_groups) counts of rows with value >= threshold.
+        """
+        ranks = np.searchsorted(self.distinct, np.asarray(thresholds, dtype="float64"))
+        groups = np.arange(self.n_groups, dtype="int64")
+        targets = groups[None, :] * self.stride + ranks[:, None]
+        return self.group_ends[None, :] - np.searchsorted(self.keys, targets)
 
-    def safe(v):
-        return None if pd.isna(v) else v
 
-    def row_to_ui(r: pd.Series) -> Dict[str, Any]:
+def _group_codes(n_rows: int, index: Dict[str, np.ndarray], groups: List[str]) -> np.ndarray:
+    """
+    Row -> position of its group in `groups`; rows in no group get len(groups).
+    """
+    codes = np.full(n_rows, len(groups), dtype="int64")
+    for code, group in enumerate(groups):
+        codes[index[group]] = code
+    return codes
+
+
+def simulate_thresholds(
+    dataset: "LicenseDataset",
+    metric: str,
+    thresholds: List[float],
+    cost_center_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Analyst / Consumer / reclaimable counts per cost center if the rule were
+    `metric >= threshold`, next to the current rule (RECOMMENDED_ACTION_METRIC
+    >= RECOMMENDED_ACTION_THRESHOLD). Reclaimable means Consumer or possibly
+    terminated, as in the summary rollups.
+    """
+    groups = dataset.cost_centers
+    all_rows, terminated = dataset.threshold_indexes(metric)
+    base_all, base_terminated = dataset.threshold_indexes(RECOMMENDED_ACTION_METRIC)
+
+    # last column is the rows without a cost center
+    _, _, totals = dataset.simulation_groups
+    baseline = np.array([RECOMMENDED_ACTION_THRESHOLD])
+    base_analyst = base_all.count_at_least(baseline)[0]
+    base_reclaimable = totals - (base_analyst - base_terminated.count_at_least(baseline)[0])
+
+    analyst = all_rows.count_at_least(np.asarray(thresholds, dtype="float64"))
+    reclaimable = totals[None, :] - (analyst - terminated.count_at_least(thresholds))
+
+    if cost_center_name is not None:
+        cc = cost_center_name.strip()
+        selected = [groups.index(cc)] if cc in dataset.cost_center_index else []
+    else:
+        selected = range(len(groups))
+
+    def counts(total, n_analyst, n_reclaimable, b_analyst, b_reclaimable) -> Dict[str, int]:
         return {
-            # UI-visible columns
-            "name": safe(r.get("FULL_NAME")),
-            "statusName": safe(r.get("STATUS_NAME")),
-            "user": safe(r.get("USER_NAME")),
-            "email": safe(r.get("USER_EMAIL")),
-            "costCenterName": safe(r.get("cost_center_name")),
-            "departmentName": safe(r.get("dept_name")),
-            "title": safe(r.get("title")),
-            "recommendedAction": safe(r.get("recommendedAction")),
-            # Extra fields (optional; safe to keep for later UI expansion)
-            "lastActivity": safe(r.get("LAST_ACTIVITY")),
-            "analystActionsPerDay": float(r.get("ANALYST_ACTIONS_PER_DAY") or 0),
-            "analystFunctions": int(r.get("ANALYST_FUNCTIONS") or 0),
-            "nonAnalystFunctions": int(r.get("NON_ANALYST_FUNCTIONS") or 0),
-            "activeDays": int(r.get("ACTIVE_DAYS") or 0),
-            "titleCategory": safe(r.get("TITLE_CATEGORY")),
-            "analystPct": safe(r.get("ANALYST_PCT")),
-            "analystUserFlag": bool(r.get("ANALYST_USER_FLAG") or False),
-            "analystThreshold": safe(r.get("ANALYST_THRESHOLD")),
+            "total": int(total),
+            "analyst": int(n_analyst),
+            "consumer": int(total - n_analyst),
+            "reclaimable": int(n_reclaimable),
+            "analystDelta": int(n_analyst - b_analyst),
+            "reclaimableDelta": int(n_reclaimable - b_reclaimable),
         }
 
-    return [row_to_ui(row) for _, row in filtered.iterrows()]
+    scenarios = []
+    for i, threshold in enumerate(thresholds):
+        scenarios.append(
+            {
+                "threshold": float(threshold),
+                "totals": counts(
+                    totals.sum(),
+                    analyst[i].sum(),
+                    reclaimable[i].sum(),
+                    base_analyst.sum(),
+                    base_reclaimable.sum(),
+                ),
+                "costCenters": [
+                    {
+                        "costCenterName": groups[g],
+                        **counts(
+                            totals[g],
+                            analyst[i, g],
+                            reclaimable[i, g],
+                            base_analyst[g],
+                            base_reclaimable[g],
+                        ),
+                    }
+                    for g in selected
+                ],
+            }
+        )
+
+    return {
+        "version": dataset.version,
+        "metric": metric,
+        "baseline": {
+            "metric": RECOMMENDED_ACTION_METRIC,
+            "threshold": RECOMMENDED_ACTION_THRESHOLD,
+            "analyst": int(base_analyst.sum()),
+            "reclaimable": int(base_reclaimable.sum()),
+        },
+        "scenarios": scenarios,
+    }
 
 
-@router.get("/license-reduction/missing-names", response_model=List[Dict[str, Any]])
-async def get_missing_full_names() -> List[Dict[str, Any]]:
+# ---------------------------------------------------------------------------
+# Typeahead search
+# ---------------------------------------------------------------------------
+
+# (column, weight 0-7): a hit in a higher-weight column ranks first
+SEARCH_COLUMNS = [
+    ("FULL_NAME", 3),
+    ("USER_NAME", 3),
+    ("USER_EMAIL", 2),
+]
+SEARCH_EXACT_BONUS = 2  # whole word typed, not just a prefix of it
+SEARCH_TOKEN_PATTERN = r"[\s@._\-,()/]+"
+# Domain of an email-like word; SearchIndex drops it from USER_EMAIL too
+SEARCH_EMAIL_DOMAIN_PATTERN = r"@\S*"
+SEARCH_MIN_QUERY_LENGTH = 2
+# Postings considered per query word; very short prefixes stop here
+SEARCH_MAX_CANDIDATES = 200_000
+MAX_SEARCH_RESULTS = 100
+
+SEARCH_RESULT_FIELDS = [
+    f
+    for f in UI_FIELDS
+    if f[0]
+    in (
+        "name",
+        "statusName",
+        "user",
+        "email",
+        "costCenterName",
+        "departmentName",
+        "title",
+        "recommendedAction",
+    )
+]
+
+
+def _search_tokens(text_value: str) -> List[str]:
     """
-    Debug endpoint: show rows that STILL do not have FULL_NAME after all passes.
+    Query words, split the way SearchIndex splits column values. Email
+    domains are dropped as they are in the index, so pasting a full
+    address matches on its local part.
     """
-    df = await get_cached_final_df()
-    missing = df[df["FULL_NAME"] == "Possibly Terminated"].copy()
+    text_value = re.sub(SEARCH_EMAIL_DOMAIN_PATTERN, "", text_value.lower())
+    return [t for t in re.split(SEARCH_TOKEN_PATTERN, text_value) if t]
 
-    def safe(v):
-        return None if pd.isna(v) else v
 
-    return [
-        {
-            "user": safe(r.get("USER_NAME")),
-            "email": safe(r.get("USER_EMAIL")),
-            "altEmail": safe(r.get("USER_EMAIL_ALT")),
-            "emailLocal": safe(r.get("USER_EMAIL_LOCAL")),
-            "costCenterName": safe(r.get("cost_center_name")),
-            "departmentName": safe(r.get("dept_name")),
-            "title": safe(r.get("title")),
-            "recommendedAction": safe(r.get("recommendedAction")),
+class SearchIndex:
+    """
+    Word-prefix index over SEARCH_COLUMNS.
+
+    Every value is lowercased and split into words (email local parts on
+    . _ - too), and each (word, row) pair becomes a posting. Postings are sorted by word,
+    so all words starting with a prefix are one contiguous slice found with
+    two binary searches. A query matches rows that have a word starting with
+    each of its words; rows score the best column weight per query word,
+    plus SEARCH_EXACT_BONUS for whole-word hits.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        words, rows, weights = [], [], []
+        for col, weight in SEARCH_COLUMNS:
+            if col not in df.columns:
+                continue
+            s = df[col].astype(object)
+            if col == "FULL_NAME":
+                # the placeholder would match every unresolved row
+                s = s.where(s != POSSIBLY_TERMINATED, None)
+            values = pc.utf8_lower(pa.array(s, type=pa.string(), from_pandas=True))
+            if col == "USER_EMAIL":
+                # every address shares the domain; only the local part tells users apart
+                values = pc.replace_substring_regex(values, SEARCH_EMAIL_DOMAIN_PATTERN, "")
+            split = pc.split_pattern_regex(values, SEARCH_TOKEN_PATTERN)
+            col_words = pc.list_flatten(split)
+            keep = pc.not_equal(col_words, "")
+            words.append(pc.filter(col_words, keep))
+            rows.append(pc.filter(pc.list_parent_indices(split), keep).to_numpy())
+            weights.append(np.full(len(words[-1]), weight, dtype="int16"))
+
+        if words:
+            encoded = pa.chunked_array(words, type=pa.string()).combine_chunks().dictionary_encode()
+            vocabulary = encoded.dictionary
+            order = pc.array_sort_indices(vocabulary).to_numpy()
+            rank = np.empty(len(order), dtype="int32")
+            rank[order] = np.arange(len(order), dtype="int32")
+            terms = rank[encoded.indices.to_numpy(zero_copy_only=False)]
+            self.terms: List[str] = vocabulary.take(pa.array(order)).to_pylist()
+        else:
+            terms, self.terms = np.array([], dtype="int32"), []
+        rows = np.concatenate(rows).astype("int32") if rows else np.array([], dtype="int32")
+        weights = np.concatenate(weights) if weights else np.array([], dtype="int16")
+
+        # Sort by word, then row, best weight first, as one packed int64 key
+        # (much cheaper than a lexsort); keep one posting per (word, row).
+        n_rows = max(len(df), 1)
+        keys = (terms.astype("int64") * n_rows + rows) * 8 + (7 - weights)
+        keys.sort()
+        pairs = keys >> 3
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = pairs[1:] != pairs[:-1]
+        keys, pairs = keys[first], pairs[first]
+        self.rows = (pairs % n_rows).astype("int32")
+        self.weights = (7 - (keys & 7)).astype("int16")
+        self.term_starts = np.searchsorted(
+            pairs // n_rows, np.arange(len(self.terms) + 1)
+        ).astype("int64")
+
+    def _token_hits(self, token: str) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        (rows, best score per row) for one query word, and whether the
+        candidate cap cut it short.
+        """
+        lo = bisect.bisect_left(self.terms, token)
+        hi = bisect.bisect_left(self.terms, token + "\U0010ffff", lo)
+        start, end = self.term_starts[lo], self.term_starts[hi]
+        truncated = end - start > SEARCH_MAX_CANDIDATES
+        if truncated:
+            end = start + SEARCH_MAX_CANDIDATES
+
+        rows = self.rows[start:end]
+        scores = self.weights[start:end].copy()
+        if lo < hi and self.terms[lo] == token:
+            # the exact word sorts first in its prefix range
+            scores[: self.term_starts[lo + 1] - start] += SEARCH_EXACT_BONUS
+
+        order = np.lexsort((-scores, rows))
+        rows, scores = rows[order], scores[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        return rows[first], scores[first], truncated
+
+    def search(
+        self, query: str, candidates: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        (rows, scores) ranked best first (ties in row order) and whether any
+        query word hit the candidate cap. `candidates` limits the rows.
+        """
+        rows: Optional[np.ndarray] = None
+        scores = np.array([], dtype="int16")
+        truncated = False
+        for token in dict.fromkeys(_search_tokens(query)):
+            token_rows, token_scores, cut = self._token_hits(token)
+            truncated = truncated or cut
+            if rows is None:
+                rows, scores = token_rows, token_scores
+            else:
+                rows, left, right = np.intersect1d(
+                    rows, token_rows, assume_unique=True, return_indices=True
+                )
+                scores = scores[left] + token_scores[right]
+            if not len(rows):
+                break
+        if rows is None:
+            return np.array([], dtype="int32"), scores, False
+
+        if candidates is not None:
+            keep = np.isin(rows, candidates)
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))
+        return rows[order], scores[order], truncated
+
+
+# ---------------------------------------------------------------------------
+# Faceted filtering
+# ---------------------------------------------------------------------------
+
+# /license-reduction/query facet (query parameter) -> column
+FACET_COLUMNS = {
+    "department": "dept_name",
+    "title": "title",
+    "status": "STATUS_NAME",
+    "recommendedAction": "recommendedAction",
+    "analystUserFlag": "ANALYST_USER_FLAG",
+}
+# Facets served as booleans (see UI_FIELDS); their values and filters are
+# matched as True/False, whatever spelling the column or the query uses
+BOOLEAN_FACETS = {"analystUserFlag"}
+FACET_BOOLS = {
+    "1": True,
+    "true": True,
+    "t": True,
+    "yes": True,
+    "y": True,
+    "0": False,
+    "false": False,
+    "f": False,
+    "no": False,
+    "n": False,
+}
+MAX_FACET_VALUES = 100  # facet counts returned per facet, largest first
+# Values on at least 1/32 of the rows get a bitmap (n/8 bytes); rarer ones
+# keep their sorted row positions (4 bytes each), which is smaller.
+FACET_DENSE_FRACTION = 1 / 32
+
+
+def _positions_to_bitmap(positions: np.ndarray, n_rows: int) -> np.ndarray:
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[positions] = True
+    return np.packbits(mask)
+
+
+class FacetIndex:
+    """
+    Per-value row bitmaps for one column, as numpy packed bits.
+
+    Common values are stored as bitmaps; rare ones as sorted row positions
+    that are turned into a bitmap when selected. `codes` (value number per
+    row, -1 for null) is kept for counting values over any set of rows.
+    Values are matched case-insensitively by their string form; a `boolean`
+    facet holds True/False (nulls count as False, as the routes serve them)
+    and matches any FACET_BOOLS spelling.
+    """
+
+    def __init__(self, values: pd.Series, boolean: bool = False):
+        self.boolean = boolean
+        if boolean:
+            values = values.map(
+                lambda v: FACET_BOOLS.get(v.strip().lower(), v) if isinstance(v, str) else v
+            )
+            values = values.where(values.notna(), False).astype(bool)
+        codes, uniques = pd.factorize(values, sort=True)
+        self.n_rows = len(values)
+        self.codes = codes.astype("int32")
+        self.values: List[Any] = pd.Index(uniques).tolist()
+        self.lookup = {self._key(v): code for code, v in enumerate(self.values)}
+        self.sizes = np.bincount(codes[codes >= 0], minlength=len(self.values))
+
+        order = np.argsort(codes, kind="stable")
+        starts = np.searchsorted(codes[order], np.arange(len(self.values) + 1))
+        self.bitmaps: Dict[int, np.ndarray] = {}
+        self.positions: Dict[int, np.ndarray] = {}
+        for code in range(len(self.values)):
+            rows = order[starts[code] : starts[code + 1]]
+            if len(rows) >= self.n_rows * FACET_DENSE_FRACTION:
+                self.bitmaps[code] = _positions_to_bitmap(rows, self.n_rows)
+            else:
+                self.positions[code] = rows.astype("int32")
+
+    def _key(self, value: Any) -> Any:
+        key = str(value).strip().lower()
+        return FACET_BOOLS.get(key) if self.boolean else key
+
+    def bitmap(self, code: int) -> np.ndarray:
+        cached = self.bitmaps.get(code)
+        if cached is not None:
+            return cached
+        return _positions_to_bitmap(self.positions[code], self.n_rows)
+
+    def select(self, wanted: List[str]) -> np.ndarray:
+        """
+        Bitmap of the rows holding any of `wanted` (unknown values match nothing).
+        """
+        out = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for value in wanted:
+            code = self.lookup.get(self._key(value))
+            if code is not None:
+                out |= self.bitmap(code)
+        return out
+
+    def counts(self, rows: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        [{value, count}] over `rows` (all rows if None), largest first.
+        """
+        if rows is None:
+            sizes = self.sizes
+        else:
+            codes = self.codes[rows]
+            sizes = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        present = np.flatnonzero(sizes)
+        top = present[np.argsort(-sizes[present], kind="stable")][:MAX_FACET_VALUES]
+        return [{"value": self.values[c], "count": int(sizes[c])} for c in top]
+
+
+def query_facets(
+    dataset: "LicenseDataset",
+    filters: Dict[str, List[str]],
+    cost_center_name: Optional[str] = None,
+) -> Tuple[np.ndarray, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Rows matching every facet filter (any of the values within one facet),
+    and the counts of every facet. A facet's own filter is left out of its
+    counts, so the other values of a selected facet stay visible.
+    """
+    n_rows = len(dataset.df)
+    selections = {
+        key: dataset.facets[key].select(values)
+        for key, values in filters.items()
+        if values and key in dataset.facets
+    }
+    if cost_center_name is not None:
+        positions = dataset.cost_center_index.get(
+            cost_center_name.strip(), np.array([], dtype="int64")
+        )
+        selections[None] = _positions_to_bitmap(positions, n_rows)
+
+    def matching(excluded: Optional[str] = "") -> Optional[np.ndarray]:
+        bitmaps = [b for key, b in selections.items() if key is None or key != excluded]
+        if not bitmaps:
+            return None
+        combined = bitmaps[0].copy()
+        for b in bitmaps[1:]:
+            combined &= b
+        return np.flatnonzero(np.unpackbits(combined, count=n_rows))
+
+    rows = matching()
+    facets = {
+        key: facet.counts(matching(key) if key in selections else rows)
+        for key, facet in dataset.facets.items()
+    }
+    return (np.arange(n_rows) if rows is None else rows), facets
+
+
+# ---------------------------------------------------------------------------
+# Change feed
+# ---------------------------------------------------------------------------
+
+# A user is the same user across versions if both of these match
+CHANGE_KEY_FIELDS = [("user", "USER_NAME", None), ("email", "USER_EMAIL", None)]
+
+
+def _unique_row_keys(df: pd.DataFrame) -> Tuple[pd.Index, np.ndarray]:
+    """
+    (USER_NAME, USER_EMAIL) key per row, first occurrence of each key only,
+    and the row positions those keys come from.
+    """
+    keys = pd.Series(
+        [
+            f"{user}\x1f{email}"
+            for user, email in zip(
+                _column_values(df, "USER_NAME", None), _column_values(df, "USER_EMAIL", None)
+            )
+        ]
+    )
+    first = ~keys.duplicated().to_numpy()
+    return pd.Index(keys[first]), np.flatnonzero(first)
+
+
+def compute_dataset_diff(old: "LicenseDataset", new: "LicenseDataset") -> bytes:
+    """
+    Encoded diff from `old` to `new`, keyed on USER_NAME / USER_EMAIL:
+    rows added (full record), removed (key only) and changed (full new
+    record plus the UI fields that changed, old and new). Differences are
+    judged on the values the routes serve (UI_FIELDS). If more than
+    CHANGE_FEED_MAX_ROWS rows differ, the diff only carries the counts and
+    `resync: true`.
+    """
+    old_keys, old_positions = _unique_row_keys(old.df)
+    new_keys, new_positions = _unique_row_keys(new.df)
+
+    in_old = old_keys.get_indexer(new_keys)
+    added = new_positions[in_old < 0]
+    matched_new = new_positions[in_old >= 0]
+    matched_old = old_positions[in_old[in_old >= 0]]
+    kept = np.zeros(len(old_positions), dtype=bool)
+    kept[in_old[in_old >= 0]] = True
+    removed = old_positions[~kept]
+
+    old_rows, new_rows = old.df.iloc[matched_old], new.df.iloc[matched_new]
+    differs: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    any_change = np.zeros(len(matched_new), dtype=bool)
+    for key, col, coercion in UI_FIELDS:
+        before = np.array(_column_values(old_rows, col, coercion), dtype=object)
+        after = np.array(_column_values(new_rows, col, coercion), dtype=object)
+        neq = before != after
+        if neq.any():
+            differs[key] = (neq, before, after)
+            any_change |= neq
+    changed = np.flatnonzero(any_change)
+
+    counts = {"added": int(len(added)), "removed": int(len(removed)), "changed": int(len(changed))}
+    diff: Dict[str, Any] = {
+        "fromVersion": old.version,
+        "toVersion": new.version,
+        "builtAt": new.built_at,
+        "counts": counts,
+    }
+    if sum(counts.values()) > CHANGE_FEED_MAX_ROWS:
+        diff["resync"] = True
+        return _dumps(diff)
+
+    changed_records = frame_to_records(new_rows.iloc[changed])
+    for record, i in zip(changed_records, changed.tolist()):
+        record["changes"] = {
+            key: {"old": before[i], "new": after[i]}
+            for key, (neq, before, after) in differs.items()
+            if neq[i]
         }
-        for _, r in missing.iterrows()
-    ]
+    diff.update(
+        resync=False,
+        added=frame_to_records(new.df.iloc[added]),
+        removed=frame_to_records(old.df.iloc[removed], CHANGE_KEY_FIELDS),
+        changed=changed_records,
+    )
+    return _dumps(diff)
+
+
+def _content_version(df: pd.DataFrame) -> str:
+    """
+    Hash of the frame's columns and values. Rebuilds that produce the same
+    data get the same version, so ETags survive a no-op refresh or restart.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update("\x1f".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _payload_etag(payload: bytes) -> str:
+    return '"' + hashlib.blake2b(payload, digest_size=8).hexdigest() + '"'
+
+
+_EMPTY_PAYLOAD_ETAG = _payload_etag(EMPTY_PAYLOAD)
+
+
+class LicenseDataset:
+    """
+    The enriched license frame plus everything derived from it.
+
+    Built once per rebuild of the frame so the per-cost-center routes do a
+    dict lookup instead of scanning every row:
+
+    - cost_center_index: cost_center_name -> row positions in `df`
+    - payloads:          cost_center_name -> encoded /license-reduction body
+    - summary_payloads:  group_by -> encoded /license-reduction/summary body
+    - search_index:      typeahead index over names / emails / usernames
+    - facets:            per-value row bitmaps for /license-reduction/query
+    - etags:             strong ETag of each of those bodies (and of /cost-centers)
+
+    `version` is a content hash of `df`. `df` is compacted first (see compact_frame); `memory_report` says by how much.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        built_at: Optional[float] = None,
+        version: Optional[str] = None,
+    ):
+        df, self.memory_report = compact_frame(df)
+        self.df = df
+        self._debug_frame: Optional[pd.DataFrame] = None
+        self._orderings: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._simulation_groups: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._threshold_indexes: Dict[str, Tuple[ThresholdIndex, ThresholdIndex]] = {}
+        self.built_at = time.time() if built_at is None else built_at
+        self.version = version or _content_version(df)
+        self.build_report: Optional[BuildReport] = None  # None when loaded from a snapshot
+        self.cost_center_index = _build_cost_center_index(df)
+        self.cost_centers = sorted(self.cost_center_index)
+        self.search_index = SearchIndex(df)
+        self.facets = {
+            key: FacetIndex(df[col], boolean=key in BOOLEAN_FACETS)
+            for key, col in FACET_COLUMNS.items()
+            if col in df.columns
+        }
+        self.payloads = {
+            cc: serialize_frame(df.iloc[positions])
+            for cc, positions in self.cost_center_index.items()
+        }
+        self.summary_payloads = {
+            group_by: _dumps(
+                {"version": self.version, "groupBy": group_by, **build_summary(df, col)}
+            )
+            for group_by, col in SUMMARY_GROUPINGS.items()
+        }
+        self.cost_centers_payload = _dumps(self.cost_centers)
+        self.cost_centers_etag = _payload_etag(self.cost_centers_payload)
+        self.payload_etags = {cc: _payload_etag(p) for cc, p in self.payloads.items()}
+        self.summary_etags = {g: _payload_etag(p) for g, p in self.summary_payloads.items()}
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
+
+    def rows_for(self, cost_center_name: str) -> pd.DataFrame:
+        positions = self.cost_center_index.get(cost_center_name.strip())
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+    def payload_for(self, cost_center_name: str) -> bytes:
+        return self.payloads.get(cost_center_name.strip(), EMPTY_PAYLOAD)
+
+    def payload_etag_for(self, cost_center_name: str) -> str:
+        return self.payload_etags.get(cost_center_name.strip(), _EMPTY_PAYLOAD_ETAG)
+
+    def variant_etag(self, *parts: Any) -> str:
+        """
+        ETag for a response derived from this version plus request options
+        (sorted / projected / paged views).
+        """
+        key = "\x1f".join([self.version, *map(str, parts)]).encode()
+        return _payload_etag(key)
+
+    def ordered_positions(
+        self, cost_center_name: str, sort: Optional[Tuple[str, bool]]
+    ) -> np.ndarray:
+        """
+        Row positions of one cost center, optionally sorted by
+        (UI field, descending). Ties keep dataset order, so pages are stable.
+        Orderings are memoized per (cost center, sort) for the life of the version.
+        """
+        key = (cost_center_name.strip(), sort)
+        cached = self._orderings.get(key)
+        if cached is not None:
+            return cached
+
+        positions = self.cost_center_index.get(key[0], np.array([], dtype="int64"))
+        if sort is not None and len(positions):
+            field, descending = sort
+            col = UI_FIELD_COLUMNS[field]
+            if col in self.df.columns:
+                order = (
+                    self.df[col]
+                    .iloc[positions]
+                    .reset_index(drop=True)
+                    .sort_values(ascending=not descending, kind="stable", na_position="last")
+                    .index.to_numpy()
+                )
+                positions = positions[order]
+
+        if len(self._orderings) >= 256:
+            self._orderings.clear()
+        self._orderings[key] = positions
+        return positions
+
+    @property
+    def simulation_groups(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (cost center code per row, possibly-terminated mask, rows per code),
+        built on first use. Codes follow `cost_centers`; the extra last code
+        is rows without a cost center.
+        """
+        if self._simulation_groups is None:
+            codes = _group_codes(len(self.df), self.cost_center_index, self.cost_centers)
+            terminated = (self.df["FULL_NAME"] == POSSIBLY_TERMINATED).to_numpy(dtype=bool)
+            sizes = np.bincount(codes, minlength=len(self.cost_centers) + 1)
+            self._simulation_groups = (codes, terminated, sizes)
+        return self._simulation_groups
+
+    def threshold_indexes(self, metric: str) -> Tuple[ThresholdIndex, ThresholdIndex]:
+        """
+        ThresholdIndex over `metric` by cost center for all rows and for the
+        possibly-terminated rows, built on first use per metric.
+        """
+        cached = self._threshold_indexes.get(metric)
+        if cached is None:
+            codes, terminated, _ = self.simulation_groups
+            n_groups = len(self.cost_centers) + 1
+            values = pd.to_numeric(self.df[metric], errors="coerce").to_numpy(
+                dtype="float64", na_value=np.nan
+            )
+            cached = (
+                ThresholdIndex(values, codes, n_groups),
+                ThresholdIndex(values[terminated], codes[terminated], n_groups),
+            )
+            self._threshold_indexes[metric] = cached
+        return cached
+
+    @property
+    def debug_frame(self) -> pd.DataFrame:
+        """
+        Unresolved rows with the matching helper columns re-derived,
+        built on first access.
+        """
+        if self._debug_frame is None:
+            unresolved = self.df[self.df["MATCHED_KEY"].isna()].copy()
+            unresolved["USER_EMAIL_ALT"] = _partner_to_samsung_email(
+                unresolved["USER_EMAIL"]
+            ).str.lower()
+            unresolved["USER_EMAIL_LOCAL"] = _email_localpart(unresolved["USER_EMAIL"])
+            self._debug_frame = unresolved
+        return self._debug_frame
+
+
+# ---------------------------------------------------------------------------
+# Cached data builders
+# ---------------------------------------------------------------------------
+
+
+def _build_dataset(report: Optional[BuildReport] = None) -> LicenseDataset:
+    """
+    The whole build, as a plain function so it can be shipped to an executor.
+    The stage timings come back on `dataset.build_report`.
+    """
+    report = report if report is not None else BuildReport()
+    final = _build_final_df(report)
+    with report.stage("dataset_build", len(final)):
+        dataset = LicenseDataset(final)
+    with report.stage("snapshot_write", len(dataset.df)):
+        write_dataset_snapshot(dataset)
+    # best effort, like the snapshot: the API keeps serving either way
+    with report.stage("publish", len(dataset.df)) as st:
+        try:
+            st["outcome"] = publish_dataset(dataset)
+        except Exception as e:
+            logger.warning("Could not publish %s: %s", LICENSE_PUBLISH_TABLE, e)
+            st["outcome"], st["error"] = "failed", repr(e)
+    report.version = dataset.version
+    report.finish("success")
+    dataset.build_report = report
+    return dataset
+
+
+# ---------------------------------------------------------------------------
+# On-disk dataset snapshot (warm restarts)
+# ---------------------------------------------------------------------------
+
+_SNAPSHOT_VERSION = b"license_dataset_version"
+_SNAPSHOT_BUILT_AT = b"license_dataset_built_at"
+
+
+def _dataset_table(dataset: LicenseDataset) -> pa.Table:
+    """
+    The enriched frame as an Arrow table stamped with version and build time.
+    """
+    table = pa.Table.from_pandas(dataset.df, preserve_index=False)
+    return table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            _SNAPSHOT_VERSION: dataset.version.encode(),
+            _SNAPSHOT_BUILT_AT: repr(dataset.built_at).encode(),
+        }
+    )
+
+
+def _dataset_from_table(table: pa.Table) -> LicenseDataset:
+    metadata = table.schema.metadata or {}
+    return LicenseDataset(
+        table.to_pandas(),
+        built_at=float(metadata[_SNAPSHOT_BUILT_AT].decode()),
+        version=metadata[_SNAPSHOT_VERSION].decode(),
+    )
+
+
+def write_dataset_snapshot(dataset: LicenseDataset) -> None:
+    """
+    Persist the enriched frame (uncompressed Feather, so loading it needs
+    no decompression) with its version and build time. Best effort: a failed
+    write only costs the next restart its warm start.
+    """
+    try:
+        table = _dataset_table(dataset)
+        os.makedirs(os.path.dirname(LICENSE_SNAPSHOT_PATH) or ".", exist_ok=True)
+        tmp = f"{LICENSE_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+        feather.write_feather(table, tmp, compression="uncompressed")
+        os.replace(tmp, LICENSE_SNAPSHOT_PATH)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Could not write license dataset snapshot: %s", e)
+
+
+def load_dataset_snapshot() -> Optional[LicenseDataset]:
+    """
+    Load the last persisted dataset, or None if there isn't a usable one.
+    The frame is copied into pandas: the dataset's indexes and payloads
+    need a DataFrame, so a mapped file would not stay shared anyway.
+    """
+    try:
+        with pa.OSFile(LICENSE_SNAPSHOT_PATH, "rb") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return _dataset_from_table(table)
+    except (OSError, KeyError, ValueError, pa.ArrowException) as e:
+        logger.info("No usable license dataset snapshot at %s: %s", LICENSE_SNAPSHOT_PATH, e)
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Sharing builds across workers (Redis tier of the default cache)
+# ---------------------------------------------------------------------------
+
+_SHARED_DATASET_KEY = f"{LICENSE_NAMESPACE}:dataset"
+_SHARED_META_KEY = f"{LICENSE_NAMESPACE}:dataset-meta"
+_SHARED_LOCK_KEY = f"{LICENSE_NAMESPACE}:build-lock"
+
+
+def _shared_cache():
+    """
+    The Redis tier every worker and replica sees, or None when the default
+    cache is in-process only (then every worker builds for itself).
+    """
+    return shared_tier(caches.get("default"))
+
+
+def _encode_shared_dataset(dataset: LicenseDataset) -> bytes:
+    table = _dataset_table(dataset)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _decode_shared_dataset(blob: bytes) -> LicenseDataset:
+    return _dataset_from_table(pa.ipc.open_stream(blob).read_all())
+
+
+async def _fetch_shared_dataset(shared, newer_than: float) -> Optional[LicenseDataset]:
+    """
+    The dataset another worker published, if it is fresh and newer than
+    `newer_than` (a built_at). The small meta key is checked first so
+    waiting workers don't download the frame on every poll.
+    """
+    meta = await shared.get(_SHARED_META_KEY)
+    if meta is None:
+        return None
+    meta = orjson.loads(meta)
+    if meta["built_at"] <= newer_than or time.time() - meta["built_at"] >= REFRESH_AFTER_SECONDS:
+        return None
+    blob = await shared.get(_SHARED_DATASET_KEY)
+    if blob is None:
+        return None
+    return await asyncio.get_running_loop().run_in_executor(None, _decode_shared_dataset, blob)
+
+
+async def _share_dataset(shared, dataset: LicenseDataset) -> None:
+    blob = await asyncio.get_running_loop().run_in_executor(
+        None, _encode_shared_dataset, dataset
+    )
+    ttl = 2 * REFRESH_AFTER_SECONDS
+    # frame first, so a worker that sees the new meta always finds it
+    await shared.set(_SHARED_DATASET_KEY, blob, ttl=ttl)
+    await shared.set(
+        _SHARED_META_KEY,
+        orjson.dumps({"version": dataset.version, "built_at": dataset.built_at}),
+        ttl=ttl,
+    )
+
+
+async def _build_or_fetch_shared(report: BuildReport) -> LicenseDataset:
+    """
+    One build for all workers: take the dataset another worker published,
+    or take the build lock and build it, or wait for the lock holder to
+    publish. Redis trouble, or a holder that takes longer than the lock
+    lease, falls back to building locally.
+    """
+    shared = _shared_cache()
+    if shared is None:
+        return await _run_build(report)
+
+    current = _state.current
+    newer_than = current.built_at if current is not None else 0.0
+    token = os.urandom(16).hex()
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + LICENSE_SHARED_LOCK_SECONDS
+    locked = False
+    try:
+        while True:
+            started = time.perf_counter()
+            fetched = await _fetch_shared_dataset(shared, newer_than)
+            if fetched is not None:
+                report.add("shared_load", time.perf_counter() - started, rows_in=len(fetched.df))
+                report.version = fetched.version
+                report.finish("success")
+                fetched.build_report = report
+                return fetched
+            try:
+                await shared.add(_SHARED_LOCK_KEY, token, ttl=LICENSE_SHARED_LOCK_SECONDS)
+                locked = True
+                break
+            except ValueError:
+                pass
+            if loop.time() >= give_up_at:
+                logger.warning("Timed out waiting for another worker's license build; building here")
+                break
+            await asyncio.sleep(LICENSE_SHARED_POLL_SECONDS)
+    except RedisError as e:
+        logger.warning("Shared license build unavailable, building locally: %s", e)
+        return await _run_build(report)
+
+    try:
+        dataset = await _run_build(report)
+        try:
+            await _share_dataset(shared, dataset)
+        except RedisError as e:
+            logger.warning("Could not share license dataset %s: %s", dataset.version, e)
+        return dataset
+    finally:
+        if locked:
+            await _release_shared_lock(shared, token)
+
+
+async def _release_shared_lock(shared, token: str) -> None:
+    """
+    Delete the build lock if it is still ours: compare-and-delete in a
+    WATCH/MULTI transaction, so a lock that expired and was taken by another
+    worker in between is left alone.
+    """
+    key = shared.build_key(_SHARED_LOCK_KEY)
+    try:
+        async with shared.client.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            if await pipe.get(key) != token.encode():
+                return
+            pipe.multi()
+            pipe.delete(key)
+            await pipe.execute()
+    except WatchError:
+        pass  # changed under us: no longer ours to release
+    except RedisError as e:
+        logger.warning("Could not release the license build lock: %s", e)
+
+
+# ---------------------------------------------------------------------------
+# Publishing to PostgreSQL (pre-joined table for BI tools)
+# ---------------------------------------------------------------------------
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _pg_type(dtype: Any) -> str:
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _pg_type(dtype.categories.dtype)
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "bigint"
+    if pd.api.types.is_float_dtype(dtype):
+        return "double precision"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "timestamptz" if getattr(dtype, "tz", None) is not None else "timestamp"
+    return "text"
+
+
+def _publish_csv_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+    """
+    The frame as headerless CSV for COPY, `chunk_rows` rows at a time.
+    float32 columns go back to float64 first so Postgres stores the same
+    value the JSON routes serve.
+    """
+    widen = {c: "float64" for c in df.columns if df[c].dtype == "float32"}
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        if widen:
+            chunk = chunk.astype(widen)
+        yield chunk.to_csv(header=False, index=False).encode()
+
+
+def _publish_lock_key(target: str) -> int:
+    """
+    pg_advisory_xact_lock key for publishing `target`: a signed 64-bit hash.
+    """
+    return int.from_bytes(hashlib.sha256(target.encode()).digest()[:8], "big", signed=True)
+
+
+def _published_version(cur, target: str) -> Optional[str]:
+    cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (target,))
+    row = cur.fetchone()
+    comment = row[0] if row else None
+    prefix = "license_dataset_version="
+    if comment and comment.startswith(prefix):
+        return comment[len(prefix) :]
+    return None
+
+
+def publish_dataset(dataset: LicenseDataset) -> str:
+    """
+    Replace "{schema}".LICENSE_PUBLISH_TABLE with the dataset's frame.
+
+    In one transaction: create a staging table, COPY the frame into it,
+    index + analyze it, then rename the live table away, rename staging
+    into place and drop the old copy. Readers see the previous version
+    until the commit and the new one after it - never a partial table.
+    Publishes of the same table (other workers, other containers) are
+    serialized by a transaction-scoped advisory lock, and the scratch
+    tables get unique names.
+    The dataset version is kept in the table comment, so an unchanged
+    rebuild is not re-published. Views over the table would block the
+    drop; point BI tools at the table itself.
+
+    Returns "published", "unchanged" or "skipped" (not PostgreSQL / disabled).
+    """
+    if not LICENSE_PUBLISH_ENABLED:
+        return "skipped"
+    if engine.dialect.name != "postgresql":
+        logger.info("Not publishing %s: engine is %s", LICENSE_PUBLISH_TABLE, engine.dialect.name)
+        return "skipped"
+
+    df = dataset.df
+    table = LICENSE_PUBLISH_TABLE
+    # unique per publish: PIDs repeat across containers (often 1)
+    suffix = uuid.uuid4().hex[:12]
+    staging_name = f"{table}__staging_{suffix}"
+    old_name = f"{table}__old_{suffix}"
+    target = f"{_quote_ident(schema)}.{_quote_ident(table)}"
+    staging = f"{_quote_ident(schema)}.{_quote_ident(staging_name)}"
+    old = f"{_quote_ident(schema)}.{_quote_ident(old_name)}"
+
+    columns_ddl = ", ".join(f"{_quote_ident(c)} {_pg_type(df[c].dtype)}" for c in df.columns)
+    columns = ", ".join(_quote_ident(c) for c in df.columns)
+    copy_sql = f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        # held until commit/rollback; a concurrent publish waits here and
+        # then sees this one's version
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_publish_lock_key(target),))
+        if _published_version(cur, target) == dataset.version:
+            raw.rollback()
+            return "unchanged"
+
+        cur.execute(f"CREATE TABLE {staging} ({columns_ddl})")
+        chunks = _publish_csv_chunks(df, LICENSE_PUBLISH_CHUNK_ROWS)
+        if hasattr(cur, "copy_expert"):  # psycopg2
+            with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, mode="w+b") as buf:
+                for data in chunks:
+                    buf.write(data)
+                buf.seek(0)
+                cur.copy_expert(copy_sql, buf)
+        else:  # psycopg 3
+            with cur.copy(copy_sql) as copy:
+                for data in chunks:
+                    copy.write(data)
+        if "cost_center_name" in df.columns:
+            cur.execute(f"CREATE INDEX ON {staging} ({_quote_ident('cost_center_name')})")
+        for role in LICENSE_PUBLISH_GRANT_ROLES:
+            cur.execute(f"GRANT SELECT ON {staging} TO {_quote_ident(role)}")
+        cur.execute(f"ANALYZE {staging}")
+
+        cur.execute(f"ALTER TABLE IF EXISTS {target} RENAME TO {_quote_ident(old_name)}")
+        cur.execute(f"ALTER TABLE {staging} RENAME TO {_quote_ident(table)}")
+        cur.execute(f"COMMENT ON TABLE {target} IS 'license_dataset_version={dataset.version}'")
+        cur.execute(f"DROP TABLE IF EXISTS {old}")
+        raw.commit()
+        cur.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return "published"
+
+
+_executors: Dict[str, Executor] = {}
+
+
+def _get_executor(kind: str) -> Optional[Executor]:
+    if kind == "inline":
+        return None
+    if kind not in ("thread", "process"):
+        raise ValueError(f"Unknown LICENSE_BUILD_EXECUTOR: {kind!r}")
+    if kind not in _executors:
+        if kind == "process":
+            # spawn: the child imports this module fresh instead of inheriting
+            # the parent's DB connection pool / event loop via fork
+            _executors[kind] = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            _executors[kind] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="license-build"
+            )
+    return _executors[kind]
+
+
+class _DatasetState:
+    """
+    Process-wide holder for the current dataset.
+
+    `current` is only ever replaced by assignment, so readers always see a
+    complete version. `inflight` is the one running build (single-flight):
+    every caller that needs a rebuild awaits that same task.
+    """
+
+    current: Optional[LicenseDataset] = None
+    inflight: Optional["asyncio.Task[LicenseDataset]"] = None
+    refresher: Optional["asyncio.Task[None]"] = None
+    lag_monitor: Optional["asyncio.Task[None]"] = None
+    builds_started: int = 0
+
+    def __init__(self):
+        # the last few versions by version id, so cursors handed out before a
+        # swap keep paging through the data they started on
+        self.retained: "OrderedDict[str, LicenseDataset]" = OrderedDict()
+        self.build_reports: "deque[BuildReport]" = deque(maxlen=BUILD_REPORT_HISTORY)
+        self.build_results: Dict[str, int] = {"success": 0, "failed": 0}
+        # consecutive failed builds, and the time.monotonic() before which
+        # no new build is started on their account
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        # (from version, to version, encoded diff), oldest first; always a
+        # contiguous chain ending at `current`
+        self.changes: "deque[Tuple[str, str, bytes]]" = deque(maxlen=CHANGE_FEED_HISTORY)
+
+    @property
+    def building(self) -> bool:
+        return self.inflight is not None and not self.inflight.done()
+
+    @property
+    def retry_in(self) -> float:
+        """
+        Seconds until a build may be retried after failures (0 = now).
+        """
+        return max(0.0, self.retry_at - time.monotonic())
+
+    def build_failed(self) -> None:
+        self.consecutive_failures += 1
+        delay = min(
+            REFRESH_RETRY_MAX_SECONDS,
+            REFRESH_RETRY_BASE_SECONDS * 2 ** (self.consecutive_failures - 1),
+        )
+        self.retry_at = time.monotonic() + delay
+
+    def build_succeeded(self) -> None:
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+
+    def install(self, dataset: LicenseDataset) -> None:
+        self.current = dataset
+        # an identical rebuild has the same version; keep it newest
+        self.retained.pop(dataset.version, None)
+        self.retained[dataset.version] = dataset
+        while len(self.retained) > RETAINED_VERSIONS:
+            self.retained.popitem(last=False)
+
+
+_state = _DatasetState()
+
+
+async def _run_build(report: BuildReport) -> LicenseDataset:
+    executor = _get_executor(LICENSE_BUILD_EXECUTOR)
+    if executor is None:
+        return _build_dataset(report)
+    return await asyncio.get_running_loop().run_in_executor(executor, _build_dataset, report)
+
+
+async def _build_and_swap() -> LicenseDataset:
+    _state.builds_started += 1
+    started = time.perf_counter()
+    # thread/inline builds fill this report in place, so a failed build still
+    # shows how far it got; a process build sends back its own copy
+    report = BuildReport()
+    _state.build_reports.append(report)
+    try:
+        dataset = await _build_or_fetch_shared(report)
+    except Exception as e:
+        report.finish("failed", error=repr(e))
+        _state.build_results["failed"] += 1
+        _state.build_failed()
+        raise
+    if dataset.build_report is not report:
+        _state.build_reports[_state.build_reports.index(report)] = dataset.build_report
+    _state.build_results["success"] += 1
+    _state.build_succeeded()
+    await _record_changes(_state.current, dataset)
+    _state.install(dataset)
+    logger.info(
+        "License dataset %s built in %.1fs (%d rows, executor=%s, %.1f -> %.1f MB)",
+        dataset.version,
+        time.perf_counter() - started,
+        len(dataset.df),
+        LICENSE_BUILD_EXECUTOR,
+        dataset.memory_report["beforeBytes"] / 2**20,
+        dataset.memory_report["afterBytes"] / 2**20,
+    )
+    return dataset
+
+
+async def _record_changes(previous: Optional[LicenseDataset], dataset: LicenseDataset) -> None:
+    """
+    Append the diff previous -> dataset to the change feed. Without a
+    previous version, or if the diff fails, the history is dropped instead:
+    a gap would make the chain lie, and clients resync on a 410.
+    """
+    if previous is not None and previous.version == dataset.version:
+        return
+    if previous is None:
+        _state.changes.clear()
+        return
+    try:
+        if LICENSE_BUILD_EXECUTOR == "inline":
+            diff = compute_dataset_diff(previous, dataset)
+        else:
+            diff = await asyncio.get_running_loop().run_in_executor(
+                None, compute_dataset_diff, previous, dataset
+            )
+    except Exception:
+        logger.exception("Could not diff %s -> %s", previous.version, dataset.version)
+        _state.changes.clear()
+        return
+    if _state.changes and _state.changes[-1][1] != previous.version:
+        _state.changes.clear()
+    _state.changes.append((previous.version, dataset.version, diff))
+
+
+async def refresh_dataset() -> LicenseDataset:
+    """
+    Rebuild the dataset, or join the rebuild that is already running.
+    Raises a 503 while backing off after failed builds.
+    """
+    if not _state.building:
+        if _state.retry_in > 0:
+            raise HTTPException(
+                status_code=503,
+                detail="License dataset is unavailable; the last build failed",
+                headers={"Retry-After": str(int(_state.retry_in) + 1)},
+            )
+        _state.inflight = asyncio.create_task(_build_and_swap())
+    # shield: a cancelled request must not cancel the shared build
+    return await asyncio.shield(_state.inflight)
+
+
+def _refresh_in_background(force: bool = False) -> None:
+    """
+    Start a rebuild unless one is running or, without `force`, failed
+    builds are still backing off.
+    """
+    if _state.building or (not force and _state.retry_in > 0):
+        return
+    task = asyncio.create_task(_build_and_swap())
+    task.add_done_callback(_log_refresh_failure)
+    _state.inflight = task
+
+
+def _log_refresh_failure(task: "asyncio.Task[LicenseDataset]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Background license dataset rebuild failed; still serving %s, next attempt in %.0fs",
+            _state.current.version if _state.current else "nothing",
+            _state.retry_in,
+            exc_info=task.exception(),
+        )
+
+
+async def get_cached_dataset() -> LicenseDataset:
+    """
+    Stale-while-revalidate access to the dataset.
+
+    Only the very first call waits for a build. After that the current
+    version is returned immediately, and once it is older than
+    REFRESH_AFTER_SECONDS a background rebuild is started that swaps the
+    new version in when it finishes.
+    """
+    current = _state.current
+    if current is None:
+        return await refresh_dataset()
+    if current.age_seconds >= REFRESH_AFTER_SECONDS:
+        _refresh_in_background()
+    return current
+
+
+async def _refresh_loop() -> None:
+    """
+    Keep the dataset fresh even when nobody is calling the routes.
+    """
+    while True:
+        await asyncio.sleep(REFRESH_CHECK_INTERVAL_SECONDS)
+        current = _state.current
+        if current is None or current.age_seconds >= REFRESH_AFTER_SECONDS:
+            _refresh_in_background()
+
+
+class _LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a short sleep wakes up. Samples are
+    bucketed by whether a dataset build was running, which shows what the
+    build costs every other route for the configured executor.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples = {
+            "idle": deque(maxlen=LOOP_LAG_WINDOW),
+            "building": deque(maxlen=LOOP_LAG_WINDOW),
+        }
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            building, builds = _state.building, _state.builds_started
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            # a build overlapped this sample if one was running at either end
+            # or started (and maybe finished) in between
+            building = building or _state.building or builds != _state.builds_started
+            self.samples["building" if building else "idle"].append(lag)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for bucket, samples in self.samples.items():
+            arr = np.fromiter(samples, dtype="float64")
+            out[bucket] = {
+                "samples": int(arr.size),
+                "meanMs": round(float(arr.mean()) * 1000, 2) if arr.size else None,
+                "p99Ms": round(float(np.percentile(arr, 99)) * 1000, 2) if arr.size else None,
+                "maxMs": round(float(arr.max()) * 1000, 2) if arr.size else None,
+            }
+        return out
+
+
+_lag_monitor = _LoopLagMonitor()
+
+
+@router.on_event("startup")
+async def _start_dataset_refresher() -> None:
+    # Serve the last persisted dataset right away; a fresh build is started
+    # below either way and swaps in when it's done.
+    if _state.current is None:
+        snapshot = await asyncio.get_running_loop().run_in_executor(
+            None, load_dataset_snapshot
+        )
+        if snapshot is not None and _state.current is None:
+            _state.install(snapshot)
+            logger.info(
+                "Serving license dataset %s from snapshot (%.0fs old) until the rebuild finishes",
+                snapshot.version,
+                snapshot.age_seconds,
+            )
+    if _state.lag_monitor is None or _state.lag_monitor.done():
+        _state.lag_monitor = asyncio.create_task(_lag_monitor.run())
+    if _state.refresher is None or _state.refresher.done():
+        _state.refresher = asyncio.create_task(_refresh_loop())
+    _refresh_in_background()
+
+
+@router.on_event("shutdown")
+async def _stop_dataset_refresher() -> None:
+    for task in (_state.refresher, _state.lag_monitor):
+        if task is not None:
+            task.cancel()
+    _state.refresher = None
+    _state.lag_monitor = None
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
+
+
+async def get_cached_final_df() -> pd.DataFrame:
+    return (await get_cached_dataset()).df
+
+
+async def get_cached_cost_centers_list() -> List[str]:
+    """
+    Sorted cost center list for the UI dropdown (precomputed on the dataset).
+    """
+    return (await get_cached_dataset()).cost_centers
+
+
+async def _invalidate_license_namespace() -> int:
+    """
+    Invalidator for the "license" cache namespace: start a rebuild now, on
+    freshly pulled HR data. As with any refresh, the current version is
+    served until the new one swaps in.
+    """
+    dropped = 1 if _state.current is not None else 0
+    invalidate_hr_snapshot()
+    # an explicit request from an admin skips the failure backoff
+    _refresh_in_background(force=True)
+    return dropped
+
+
+# a clear must not drop the build lock another worker holds: a second
+# worker would start a concurrent shared build
+register_namespace(
+    LICENSE_NAMESPACE, invalidator=_invalidate_license_namespace, preserve=[_SHARED_LOCK_KEY]
+)
+
+
+# ---------------------------------------------------------------------------
+# Bulk export
+# ---------------------------------------------------------------------------
+
+# format -> (media type, file extension); Accept also takes the aliases below
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+_EXPORT_MEDIA_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json-seq": "ndjson",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+def _negotiate_export_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the export format from an Accept header, honouring q-values.
+    No header or a wildcard means NDJSON; None means nothing acceptable.
+    """
+    if not accept:
+        return "ndjson"
+    ranked = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((-q, position, media_type.lower()))
+    for _, _, media_type in sorted(ranked):
+        if media_type in _EXPORT_MEDIA_TYPES:
+            return _EXPORT_MEDIA_TYPES[media_type]
+        if media_type in ("*/*", "application/*"):
+            return "ndjson"
+    return None
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that hands back whatever was written since the last
+    drain(). tell() keeps counting, which the Parquet writer relies on for
+    its footer offsets.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def _export_ndjson(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+    fields = [(col, col, None) for col in df.columns]
+    for chunk in _frame_chunks(df, chunk_rows):
+        records = frame_to_records(chunk, fields)
+        yield b"".join(_dumps(r) + b"\n" for r in records)
+
+
+def _export_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Schema for the whole frame. Inferring it from the full data (not an
+    empty slice) matters for object columns, which would otherwise come out
+    as null-typed and fail on the first chunk, after the headers are sent.
+    """
+    return pa.Schema.from_pandas(df, preserve_index=False)
+
+
+def _export_arrow(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+    schema = _export_schema(df)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _frame_chunks(df, chunk_rows):
+            writer.write_batch(
+                pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _export_parquet(df: pd.DataFrame, chunk_rows: int) -> Iterator[bytes]:
+    schema = _export_schema(df)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _frame_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+_EXPORT_WRITERS = {
+    "ndjson": _export_ndjson,
+    "arrow": _export_arrow,
+    "parquet": _export_parquet,
+}
+
+
+# ---------------------------------------------------------------------------
+# Routes
+# ---------------------------------------------------------------------------
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    RFC 7232 weak comparison against an If-None-Match header value.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def _etag_response(etag: str, if_none_match: Optional[str], body) -> Response:
+    """
+    304 if the client already has `etag`, otherwise the JSON from `body()`.
+    `body` is only called on a miss.
+    """
+    headers = {"ETag": etag, "Cache-Control": LICENSE_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body(), media_type="application/json", headers=headers)
+
+
+@router.get("/cost-centers", response_model=List[str])
+async def get_cost_centers(
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    dataset = await get_cached_dataset()
+    return _etag_response(
+        dataset.cost_centers_etag, if_none_match, lambda: dataset.cost_centers_payload
+    )
+
+
+def _parse_fields(fields: Optional[str]) -> list:
+    """
+    `fields=name,email,...` -> the matching UI_FIELDS entries (in request order).
+    """
+    if not fields:
+        return UI_FIELDS
+    by_key = {f[0]: f for f in UI_FIELDS}
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in by_key]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(by_key)}",
+        )
+    return [by_key[f] for f in dict.fromkeys(wanted)]
+
+
+def _parse_sort(sort: Optional[str]) -> Optional[Tuple[str, bool]]:
+    """
+    `sort=analystActionsPerDay` (ascending) or `sort=-analystActionsPerDay` (descending).
+    """
+    if not sort:
+        return None
+    descending = sort.startswith("-")
+    field = sort.lstrip("+-").strip()
+    if field not in UI_FIELD_COLUMNS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sort field: {field}. Allowed: {', '.join(UI_FIELD_COLUMNS)}",
+        )
+    return field, descending
+
+
+def _encode_cursor(payload: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        state = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    if not isinstance(state, dict):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    return state
+
+
+def _cursor_int(state: Dict[str, Any], key: str, default: int) -> int:
+    """
+    A non-negative int from a decoded cursor; the client can edit it.
+    """
+    value = state.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    return value
+
+
+@router.get("/license-reduction", response_model=List[Dict[str, Any]])
+async def get_license_reduction(
+    cost_center_name: str = Query(..., description="Exact cost-center name"),
+    limit: Optional[int] = Query(
+        None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables the paged response"
+    ),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    sort: Optional[str] = Query(None, description="UI field to sort by; prefix '-' for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated UI fields to return"),
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """
+    Return a list of records in the exact shape expected by the Next frontend.
+    Without options the body is pre-encoded per cost center when the dataset
+    is built.
+
+    `sort` / `fields` reorder / project that list. With `limit` (or `cursor`)
+    the response becomes one page: {"version", "items", "nextCursor"}. A
+    cursor is tied to the dataset version it was issued on, so paging keeps
+    reading that version across a background refresh (410 once it's gone).
+
+    Every response carries an ETag; a matching If-None-Match gets a 304
+    before any rows are looked at.
+    """
+    paged = limit is not None or cursor is not None
+    if not paged and sort is None and fields is None:
+        dataset = await get_cached_dataset()
+        return _etag_response(
+            dataset.payload_etag_for(cost_center_name),
+            if_none_match,
+            lambda: dataset.payload_for(cost_center_name),
+        )
+
+    selected = _parse_fields(fields)
+    order = _parse_sort(sort)
+    offset = 0
+
+    if cursor is not None:
+        state = _decode_cursor(cursor)
+        if (
+            state.get("cc") != cost_center_name.strip()
+            or state.get("s") != sort
+            or state.get("f") != fields
+        ):
+            raise HTTPException(
+                status_code=400, detail="Cursor does not match cost_center_name/sort/fields"
+            )
+        dataset = _state.retained.get(state.get("v"))
+        if dataset is None:
+            raise HTTPException(
+                status_code=410,
+                detail="Dataset version behind this cursor has expired; start from the first page",
+            )
+        offset = _cursor_int(state, "o", 0)
+        # same bounds as the limit query parameter
+        limit = limit or min(max(_cursor_int(state, "l", MAX_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    else:
+        dataset = await get_cached_dataset()
+
+    etag = dataset.variant_etag(
+        cost_center_name.strip(), sort, [f[0] for f in selected], offset, limit if paged else None
+    )
+
+    def render() -> bytes:
+        positions = dataset.ordered_positions(cost_center_name, order)
+        if not paged:
+            return serialize_frame(dataset.df.iloc[positions], selected)
+
+        page = positions[offset : offset + limit]
+        next_offset = offset + len(page)
+        next_cursor = (
+            _encode_cursor(
+                {
+                    "v": dataset.version,
+                    "cc": cost_center_name.strip(),
+                    "s": sort,
+                    "f": fields,
+                    "o": next_offset,
+                    "l": limit,
+                }
+            )
+            if next_offset < len(positions)
+            else None
+        )
+        return _dumps(
+            {
+                "version": dataset.version,
+                "total": int(len(positions)),
+                "items": frame_to_records(dataset.df.iloc[page], selected),
+                "nextCursor": next_cursor,
+            }
+        )
+
+    return _etag_response(etag, if_none_match, render)
+
+
+@router.get("/license-reduction/summary", response_model=Dict[str, Any])
+async def get_license_summary(
+    group_by: str = Query(
+        "cost_center", description=f"One of: {', '.join(SUMMARY_GROUPINGS)}"
+    ),
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """
+    Analyst vs Consumer counts, status counts, possibly-terminated and
+    reclaimable licenses, and mean analyst actions/day per cost center (or
+    department). Computed once per dataset build.
+    """
+    dataset = await get_cached_dataset()
+    payload = dataset.summary_payloads.get(group_by)
+    if payload is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by: {group_by}. Allowed: {', '.join(SUMMARY_GROUPINGS)}",
+        )
+    return _etag_response(dataset.summary_etags[group_by], if_none_match, lambda: payload)
+
+
+@router.get("/license-reduction/simulate")
+async def simulate_license_rule(
+    metric: str = Query(
+        RECOMMENDED_ACTION_METRIC, description=f"One of: {', '.join(SIMULATION_METRICS)}"
+    ),
+    threshold: List[float] = Query(
+        ..., description="Analyst when metric >= threshold; repeat to sweep several"
+    ),
+    cost_center_name: Optional[str] = Query(None, description="Only this cost center"),
+) -> Response:
+    """
+    What-if: Analyst / Consumer / reclaimable counts per cost center under
+    `metric >= threshold`, with deltas against the current recommendedAction
+    rule. Answered by binary search over per-cost-center sorted metric
+    values (built once per dataset version and metric), not a rescan.
+    `totals` are org-wide even when `cost_center_name` narrows the list.
+    """
+    if metric not in SIMULATION_METRICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric: {metric}. Allowed: {', '.join(SIMULATION_METRICS)}",
+        )
+    if len(threshold) > MAX_SIMULATION_THRESHOLDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_SIMULATION_THRESHOLDS} thresholds per request",
+        )
+    if not all(np.isfinite(threshold)):
+        raise HTTPException(status_code=400, detail="Thresholds must be finite numbers")
+
+    dataset = await get_cached_dataset()
+    if metric not in dataset.df.columns:
+        raise HTTPException(status_code=400, detail=f"Metric not in dataset: {metric}")
+    return Response(
+        content=_dumps(simulate_thresholds(dataset, metric, threshold, cost_center_name)),
+        media_type="application/json",
+    )
+
+
+@router.get("/license-reduction/search")
+async def search_license_users(
+    q: str = Query(..., description="Name, email or username prefix(es)"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    cost_center_name: Optional[str] = Query(None, description="Only this cost center"),
+) -> Response:
+    """
+    Typeahead across every cost center: users whose name, email or username
+    has a word starting with each word of `q`, best matches first.
+    """
+    if len(q.strip()) < SEARCH_MIN_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"q must be at least {SEARCH_MIN_QUERY_LENGTH} characters",
+        )
+    dataset = await get_cached_dataset()
+    candidates = (
+        dataset.cost_center_index.get(cost_center_name.strip(), np.array([], dtype="int64"))
+        if cost_center_name is not None
+        else None
+    )
+    rows, scores, truncated = dataset.search_index.search(q, candidates)
+    items = frame_to_records(dataset.df.iloc[rows[:limit]], SEARCH_RESULT_FIELDS)
+    for item, score in zip(items, scores[:limit].tolist()):
+        item["score"] = score
+    return Response(
+        content=_dumps(
+            {
+                "version": dataset.version,
+                "query": q,
+                "total": int(len(rows)),
+                "truncated": truncated,
+                "items": items,
+            }
+        ),
+        media_type="application/json",
+    )
+
+
+@router.get("/license-reduction/query")
+async def query_license_users(
+    department: List[str] = Query([], description="dept_name; repeat for any-of"),
+    title: List[str] = Query([], description="title; repeat for any-of"),
+    status: List[str] = Query([], description="STATUS_NAME; repeat for any-of"),
+    recommended_action: List[str] = Query([], alias="recommendedAction"),
+    analyst_user_flag: List[str] = Query([], alias="analystUserFlag"),
+    cost_center_name: Optional[str] = Query(None, description="Only this cost center"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description="Comma-separated UI fields to return"),
+) -> Response:
+    """
+    Filter by any combination of facets (AND across facets, OR within one)
+    using the precomputed bitmaps, and return one page of rows plus the
+    value counts of every facet.
+    """
+    selected = _parse_fields(fields)
+    dataset = await get_cached_dataset()
+    filters = {
+        "department": department,
+        "title": title,
+        "status": status,
+        "recommendedAction": recommended_action,
+        "analystUserFlag": analyst_user_flag,
+    }
+    rows, facets = query_facets(dataset, filters, cost_center_name)
+    return Response(
+        content=_dumps(
+            {
+                "version": dataset.version,
+                "total": int(len(rows)),
+                "items": frame_to_records(dataset.df.iloc[rows[offset : offset + limit]], selected),
+                "facets": facets,
+            }
+        ),
+        media_type="application/json",
+    )
+
+
+@router.get("/license-reduction/changes")
+async def get_license_changes(
+    since: str = Query(..., description="Dataset version the client already has"),
+) -> Response:
+    """
+    Incremental sync: the diffs from `since` to the current version, oldest
+    first, to be applied in order. Empty when `since` is current. 410 when
+    `since` is older than the kept history (or unknown): refetch everything.
+    """
+    current = _state.current or await get_cached_dataset()
+    if since == current.version:
+        diffs: List[bytes] = []
+    else:
+        history = list(_state.changes)
+        start = next((i for i, (v, _, _) in enumerate(history) if v == since), None)
+        if start is None or history[-1][1] != current.version:
+            raise HTTPException(
+                status_code=410,
+                detail="No change history from that version; refetch the full dataset",
+            )
+        diffs = [diff for _, _, diff in history[start:]]
+
+    head = _dumps({"since": since, "version": current.version})[:-1]
+    return Response(
+        content=head + b',"diffs":[' + b",".join(diffs) + b"]}",
+        media_type="application/json",
+    )
+
+
+@router.get("/license-reduction/export")
+async def export_license_dataset(
+    export_format: Optional[str] = Query(
+        None,
+        alias="format",
+        description=f"One of: {', '.join(EXPORT_FORMATS)} (overrides Accept)",
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """
+    The whole enriched frame of the cached version for BI tools, streamed
+    EXPORT_CHUNK_ROWS rows at a time as NDJSON, an Arrow IPC stream or
+    Parquet. The format comes from `format` or the Accept header. Never
+    triggers a rebuild of a dataset that is already cached.
+    """
+    if export_format is not None:
+        fmt = export_format.strip().lower()
+        if fmt not in EXPORT_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown format: {export_format}. Allowed: {', '.join(EXPORT_FORMATS)}",
+            )
+    else:
+        fmt = _negotiate_export_format(accept)
+        if fmt is None:
+            raise HTTPException(
+                status_code=406,
+                detail=f"Acceptable types: {', '.join(m for m, _ in EXPORT_FORMATS.values())}",
+            )
+
+    # pinned: a swap mid-download doesn't change what this response streams
+    dataset = await get_cached_dataset()
+    media_type, extension = EXPORT_FORMATS[fmt]
+    etag = dataset.variant_etag("export", fmt)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": LICENSE_CACHE_CONTROL,
+        "Vary": "Accept",
+        "X-Dataset-Version": dataset.version,
+        "Content-Disposition": (
+            f'attachment; filename="license_dataset_{dataset.version}.{extension}"'
+        ),
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # a sync generator: Starlette runs each chunk's encoding in its threadpool
+    return StreamingResponse(
+        _EXPORT_WRITERS[fmt](dataset.df, EXPORT_CHUNK_ROWS),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/license-reduction/missing-names", response_model=List[Dict[str, Any]])
+async def get_missing_full_names() -> Response:
+    """
+    Debug endpoint: show rows that no identifier (see IDENTITY_KEYS) resolved.
+    """
+    dataset = await get_cached_dataset()
+
+    return Response(
+        content=serialize_frame(dataset.debug_frame, MISSING_NAME_FIELDS),
+        media_type="application/json",
+    )
+
+
+@router.get("/license-reduction/build-status")
+async def get_build_status() -> Dict[str, Any]:
+    """
+    Debug endpoint: current dataset version, whether a rebuild is running,
+    and event-loop lag while idle vs. while building.
+    """
+    current = _state.current
+    return {
+        "executor": LICENSE_BUILD_EXECUTOR,
+        "version": current.version if current else None,
+        "builtAt": current.built_at if current else None,
+        "ageSeconds": round(current.age_seconds, 1) if current else None,
+        "building": _state.building,
+        "consecutiveFailures": _state.consecutive_failures,
+        "retryInSeconds": round(_state.retry_in, 1),
+        "memory": current.memory_report if current else None,
+        "loopLag": _lag_monitor.summary(),
+    }
+
+
+@router.get("/license-reduction/build-reports")
+async def get_build_reports(admin: str = Depends(verify_cache_key)) -> Dict[str, Any]:
+    """
+    Admin endpoint: per-stage timings and match counts of the last
+    BUILD_REPORT_HISTORY builds, newest first.
+    """
+    return {
+        "builds": _state.build_results,
+        "reports": [r.to_dict() for r in reversed(_state.build_reports)],
+    }
+
+
+def _prom_labels(**labels: Any) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _render_prometheus() -> str:
+    """
+    Build metrics in the Prometheus text exposition format. Stage metrics
+    describe the last successful build.
+    """
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        samples = [
+            (labels, value if isinstance(value, int) else float(value))
+            for labels, value in samples
+            if value is not None
+        ]
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_prom_labels(**labels)} {value!r}")
+
+    last = next((r for r in reversed(_state.build_reports) if r.status == "success"), None)
+    stages = last.stages if last is not None else []
+
+    metric(
+        "license_builds_total",
+        "counter",
+        "Dataset builds by outcome.",
+        [({"status": k}, v) for k, v in _state.build_results.items()],
+    )
+    metric(
+        "license_build_in_progress",
+        "gauge",
+        "1 while a dataset build is running.",
+        [({}, int(_state.building))],
+    )
+    if last is not None:
+        metric(
+            "license_build_duration_seconds",
+            "gauge",
+            "Wall time of the last successful build.",
+            [({}, last.seconds)],
+        )
+        metric(
+            "license_build_last_success_timestamp_seconds",
+            "gauge",
+            "Unix time the last successful build finished.",
+            [({}, last.finished_at)],
+        )
+    metric(
+        "license_build_stage_seconds",
+        "gauge",
+        "Wall time per build stage.",
+        [({"stage": s["stage"]}, s["seconds"]) for s in stages],
+    )
+    metric(
+        "license_build_stage_rows_in",
+        "gauge",
+        "Rows entering each build stage.",
+        [({"stage": s["stage"]}, s["rowsIn"]) for s in stages],
+    )
+    metric(
+        "license_build_stage_resolved_rows",
+        "gauge",
+        "Rows newly resolved by each identifier pass.",
+        [({"stage": s["stage"]}, s["resolved"]) for s in stages],
+    )
+
+    current = _state.current
+    if current is not None:
+        metric("license_dataset_rows", "gauge", "Rows in the served dataset.", [({}, len(current.df))])
+        metric(
+            "license_dataset_unresolved_rows",
+            "gauge",
+            "Rows no identifier resolved (Possibly Terminated).",
+            [({}, int(current.df["MATCHED_KEY"].isna().sum()))],
+        )
+        metric(
+            "license_dataset_age_seconds",
+            "gauge",
+            "Age of the served dataset.",
+            [({}, current.age_seconds)],
+        )
+
+    lag = _lag_monitor.summary()
+    metric(
+        "license_event_loop_lag_p99_seconds",
+        "gauge",
+        "p99 event-loop lag over the sample window, idle vs. building.",
+        [
+            ({"bucket": bucket}, s["p99Ms"] / 1000 if s["p99Ms"] is not None else None)
+            for bucket, s in lag.items()
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/license-reduction/metrics")
+async def get_build_metrics() -> Response:
+    """
+    Prometheus scrape endpoint for the dataset build.
+    """
+    return Response(
+        content=_render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,6 +1,7 @@
 # api/v0/endpoints/ticket.py
 from fastapi import APIRouter, HTTPException
-from bigdataloader2 import getData
+from starlette.concurrency import run_in_threadpool
+from services.util.hr_snapshot import aget_hr_snapshot, get_hr_snapshot, warm_hr_snapshot
 from pydantic import BaseModel
 from s2cloudapi import cloudSmtp as smtp
 from services.v0.external_api.jiraRequests import JiraAPIClient
@@ -14,12 +15,12 @@ jira_client = JiraAPIClient()
 router = APIRouter()
 
 
+@router.on_event("startup")
+async def _warm_hr_snapshot() -> None:
+    warm_hr_snapshot()
+
+
 def user_cost_centers(user):
-    params = {
-        "data_type": "pageradm_employee_ghr", 
-        "MLR": "L", 
-        "gad_id": user,
-        'status_name': 'Active',}
     custom_columns = [
         "full_name",
         "smtp",
@@ -30,19 +31,20 @@ def user_cost_centers(user):
         "dept_name",
         "title",
     ]
-    return getData(params=params, custom_columns=custom_columns)
+    df = get_hr_snapshot().lookup("gad_id", user)
+    df = df[df["status_name"] == "Active"]
+    return df[custom_columns].reset_index(drop=True)
 
 def dispatcher(user):
-    params = {
-        "data_type": "pageradm_employee_ghr", 
-        "MLR": "L", 
-        "gad_id": user,
-        'employee_type_name': '%Dispatcher%',
-        'status_name': 'Active',}
     custom_columns = [
         "employee_type_name",
     ]
-    return getData(params=params, custom_columns=custom_columns)
+    df = get_hr_snapshot().lookup("gad_id", user)
+    df = df[
+        (df["status_name"] == "Active")
+        & df["employee_type_name"].str.contains("Dispatcher", regex=False, na=False)
+    ]
+    return df[custom_columns].reset_index(drop=True)
 
 def format_user_information(raw_requested_users: list[str]) -> str:
     sections = []
@@ -122,7 +124,7 @@ class SpotfireRequest(BaseModel):
 async def verify_user(username: str) -> Optional[str]:
     """
     Verify if a user exists in Jira by username.
-    If not found, checks in bigdataloader2 and attempts verification with the found nt_id.
+    If not found, checks the HR snapshot and attempts verification with the found nt_id.
     Returns the verified username or None if not found.
     """
     
@@ -134,18 +136,12 @@ async def verify_user(username: str) -> Optional[str]:
     except Exception as e:
         print(f"Error checking user {username} in Jira: {str(e)}")
 
-    # If not found in Jira, search in bigdataloader2
+    # If not found in Jira, search the HR snapshot
     try:
-        params = {
-            "data_type": "pageradm_employee_ghr",
-            "MLR": "L",
-            "mysingle_id": username,
-        }
-        columns = ["nt_id"]
-        data = getData(params=params, convert_type=True, custom_columns=columns)
+        data = (await aget_hr_snapshot()).lookup("mysingle_id", username, columns=["nt_id"])
 
-        if data and len(data) > 0:
-            nt_id = data[0]['nt_id']
+        if not data.empty:
+            nt_id = data.iloc[0]['nt_id']
             # Verify if the nt_id exists in Jira
             try:
                 jira_response = await jira_client.get(f"api/2/user/search?username={nt_id}")
@@ -154,7 +150,7 @@ async def verify_user(username: str) -> Optional[str]:
             except Exception as e:
                 print(f"Error checking nt_id {nt_id} in Jira: {str(e)}")
     except Exception as e:
-        print(f"Error checking user {username} in bigdataloader2: {str(e)}")
+        print(f"Error checking user {username} in HR snapshot: {str(e)}")
 
     print(f"Could not find user: {username}")
     return None
@@ -217,8 +213,9 @@ async def putSpotfireTicket(request: SpotfireRequest):
     # if not verified_reporter:
     #     raise HTTPException(status_code=400, detail="Could not verify the submitter (reporter)")
 
-    user_information = format_user_information(raw_requested_users)
-    expat_information = format_expat_information(raw_requested_users)
+    # both read the HR snapshot, which may still be loading
+    user_information = await run_in_threadpool(format_user_information, raw_requested_users)
+    expat_information = await run_in_threadpool(format_expat_information, raw_requested_users)
     
     if request.form_title == 'Spotfire License Exception Request':
         description = f"""
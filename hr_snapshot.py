@@ -0,0 +1,428 @@
+# services/util/hr_snapshot.py
+"""
+Shared HR directory snapshot.
+
+pageradm_employee_ghr (primary) and dss_employee_ghr (fallback) are pulled
+from bigdataloader2 together, normalized once and written as uncompressed
+Feather files stamped with a snapshot version. Every consumer (license
+enrichment, EmployeeService, ticket helpers, scripts) reads the same
+snapshot instead of issuing its own getData call; workers that share
+HR_SNAPSHOT_DIR memory-map the files rather than pulling again.
+
+Lookups see HR data up to HR_SNAPSHOT_MAX_AGE_SECONDS old, plus the length
+of one background pull once it has expired. Invalidating the "hr" (or
+"license") cache namespace makes the next strict read pull fresh data.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+from bigdataloader2 import getData
+from starlette.concurrency import run_in_threadpool
+
+from services.util.cache_namespaces import HR_NAMESPACE, register_namespace
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------------
+
+# Pod-local by default: workers in one pod share the files, but each pod pulls
+# its own copy. Point this at a shared volume to share one pull across pods.
+HR_SNAPSHOT_DIR = os.getenv("HR_SNAPSHOT_DIR", "/tmp/hr_snapshot")
+HR_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("HR_SNAPSHOT_MAX_AGE_SECONDS", "86400"))
+HR_SNAPSHOT_RETRY_SECONDS = int(os.getenv("HR_SNAPSHOT_RETRY_SECONDS", "60"))
+
+# Union of the columns every consumer asks for
+PRIMARY_PARAMS = {"data_type": "pageradm_employee_ghr", "MLR": "L"}
+PRIMARY_COLUMNS = [
+    "ghr_id",
+    "mysingle_id",
+    "full_name",
+    "smtp",
+    "status_name",
+    "employee_type_name",
+    "bname",
+    "nt_id",
+    "gad_id",
+    "cost_center_name",
+    "dept_name",
+    "title",
+]
+
+FALLBACK_PARAMS = {"data_type": "dss_employee_ghr", "MLR": "L"}
+FALLBACK_COLUMNS = [
+    "full_name",
+    "smtp",
+    "status_name",
+    "cost_center_name",
+    "dept_name",
+    "title",
+]
+
+# Columns looked up case-insensitively by HRSnapshot.lookup()
+IDENTIFIER_COLUMNS = {"ghr_id", "mysingle_id", "smtp", "bname", "nt_id", "gad_id"}
+
+_METADATA_VERSION = b"hr_snapshot_version"
+_METADATA_BUILT_AT = b"hr_snapshot_built_at"
+
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+
+def _normalize_hr_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Strip every text column once, keeping nulls as nulls.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            s = df[col]
+            df[col] = s.astype("string").str.strip().astype(object).where(s.notna(), None)
+    return df
+
+
+def _normalize_keys(values: pa.ChunkedArray) -> pd.Series:
+    keys = pc.utf8_lower(pc.utf8_trim_whitespace(values.cast(pa.string())))
+    return keys.to_pandas()
+
+
+def _hr_table(df: pd.DataFrame) -> pa.Table:
+    return pa.Table.from_pandas(_normalize_hr_frame(df), preserve_index=False)
+
+
+class HRSnapshot:
+    """
+    One version of the HR directory: the primary and fallback employee tables.
+
+    Both are kept as Arrow tables. Loaded from disk they are memory-mapped,
+    so the workers on a host share the same pages instead of each holding a
+    copy; lookups only convert the rows they return to pandas.
+    """
+
+    def __init__(
+        self,
+        primary: pa.Table,
+        fallback: pa.Table,
+        version: str,
+        built_at: float,
+    ):
+        self.primary_table = primary
+        self.fallback_table = fallback
+        self.version = version
+        self.built_at = built_at
+        self._indexes: Dict[str, Dict[str, np.ndarray]] = {}
+        self._index_lock = threading.Lock()
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
+
+    @property
+    def primary(self) -> pd.DataFrame:
+        """
+        The whole primary table as a DataFrame: a private copy, for bulk
+        consumers like the dataset build. Prefer lookup() for a few rows.
+        """
+        return self.primary_table.to_pandas()
+
+    @property
+    def fallback(self) -> pd.DataFrame:
+        """
+        The whole fallback table as a DataFrame (a private copy).
+        """
+        return self.fallback_table.to_pandas()
+
+    def _index(self, column: str) -> Dict[str, np.ndarray]:
+        """
+        Normalized value -> row positions in `primary`, built on first use.
+        """
+        with self._index_lock:
+            if column not in self._indexes:
+                keys = _normalize_keys(self.primary_table.column(column))
+                self._indexes[column] = keys.groupby(keys, sort=False).indices
+            return self._indexes[column]
+
+    def lookup(
+        self,
+        column: str,
+        values: Union[str, Iterable[str]],
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Primary-table rows whose `column` matches any of `values` - the
+        snapshot equivalent of getData(params={..., column: values}).
+        Identifier columns match case-insensitively.
+        """
+        if isinstance(values, str):
+            values = [values]
+        values = [v for v in values if v is not None]
+
+        table = self.primary_table
+        if column in IDENTIFIER_COLUMNS:
+            index = self._index(column)
+            hits = [index[k] for k in (str(v).strip().lower() for v in values) if k in index]
+            positions = np.concatenate(hits) if hits else np.array([], dtype="int64")
+            rows = table.take(pa.array(np.sort(positions), type=pa.int64()))
+        else:
+            mask = table.column(column).to_pandas().isin(values).to_numpy()
+            rows = table.filter(pa.array(mask, type=pa.bool_()))
+
+        if columns is not None:
+            rows = rows.select(columns)
+        return rows.to_pandas()
+
+
+def _fetch_hr_frames() -> HRSnapshot:
+    """
+    Pull both HR tables concurrently and normalize them.
+    """
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="hr-fetch") as pool:
+        primary = pool.submit(
+            getData, params=PRIMARY_PARAMS, custom_columns=PRIMARY_COLUMNS
+        )
+        fallback = pool.submit(
+            getData, params=FALLBACK_PARAMS, custom_columns=FALLBACK_COLUMNS
+        )
+        primary_df, fallback_df = primary.result(), fallback.result()
+
+    built_at = time.time()
+    return HRSnapshot(
+        primary=_hr_table(primary_df),
+        fallback=_hr_table(fallback_df),
+        version=format(time.time_ns(), "x"),
+        built_at=built_at,
+    )
+
+
+def _snapshot_path(name: str) -> str:
+    return os.path.join(HR_SNAPSHOT_DIR, f"{name}.feather")
+
+
+def _write_table(table: pa.Table, name: str, snapshot: HRSnapshot) -> None:
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            _METADATA_VERSION: snapshot.version.encode(),
+            _METADATA_BUILT_AT: repr(snapshot.built_at).encode(),
+        }
+    )
+    path = _snapshot_path(name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    # uncompressed so readers can use the mapped file's pages as they are
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def _read_table(name: str) -> "tuple[pa.Table, str, float]":
+    # Zero-copy: the table's buffers point into the mapping, which stays
+    # open for as long as they are referenced.
+    table = pa.ipc.open_file(pa.memory_map(_snapshot_path(name), "r")).read_all()
+    metadata = table.schema.metadata or {}
+    return (
+        table,
+        metadata[_METADATA_VERSION].decode(),
+        float(metadata[_METADATA_BUILT_AT].decode()),
+    )
+
+
+def write_snapshot(snapshot: HRSnapshot) -> None:
+    """
+    Persist both tables. The fallback file is replaced first so a reader
+    never pairs a new primary with an old fallback without noticing
+    (load_snapshot() checks that the versions match).
+    """
+    os.makedirs(HR_SNAPSHOT_DIR, exist_ok=True)
+    _write_table(snapshot.fallback_table, "fallback", snapshot)
+    _write_table(snapshot.primary_table, "primary", snapshot)
+
+
+def load_snapshot() -> Optional[HRSnapshot]:
+    """
+    Memory-map the snapshot on disk, or None if it is missing / torn / unreadable.
+    """
+    try:
+        primary, version, built_at = _read_table("primary")
+        fallback, fallback_version, _ = _read_table("fallback")
+    except (OSError, KeyError, pa.ArrowException) as e:
+        logger.info("No usable HR snapshot in %s: %s", HR_SNAPSHOT_DIR, e)
+        return None
+    if version != fallback_version:
+        return None
+    return HRSnapshot(primary, fallback, version=version, built_at=built_at)
+
+
+# ---------------------------------------------------------------------------
+# Process-wide access
+# ---------------------------------------------------------------------------
+
+_current: Optional[HRSnapshot] = None
+_refresh_lock = threading.RLock()
+# snapshots built before this (time.time()) were invalidated explicitly
+_invalidated_at = 0.0
+
+# At most one background refresh per process; after a failed one, wait
+# HR_SNAPSHOT_RETRY_SECONDS before starting another.
+_background: Optional[threading.Thread] = None
+_background_lock = threading.Lock()
+_background_failed_at = 0.0
+
+
+def refresh_hr_snapshot() -> HRSnapshot:
+    """
+    Re-pull HR data, persist it and make it current.
+    """
+    global _current
+    with _refresh_lock:
+        snapshot = _fetch_hr_frames()
+        try:
+            write_snapshot(snapshot)
+        except OSError as e:
+            logger.warning("Could not persist HR snapshot to %s: %s", HR_SNAPSHOT_DIR, e)
+        else:
+            # serve the mapped file, shared with the other workers, rather
+            # than this process's private copy
+            on_disk = load_snapshot()
+            if on_disk is not None and on_disk.version == snapshot.version:
+                snapshot = on_disk
+        _current = snapshot
+        logger.info(
+            "HR snapshot %s refreshed (%d primary, %d fallback rows)",
+            snapshot.version,
+            snapshot.primary_table.num_rows,
+            snapshot.fallback_table.num_rows,
+        )
+        return snapshot
+
+
+def _is_fresh(snapshot: Optional[HRSnapshot], max_age_seconds: int) -> bool:
+    return (
+        snapshot is not None
+        and snapshot.age_seconds < max_age_seconds
+        and snapshot.built_at > _invalidated_at
+    )
+
+
+def invalidate_hr_snapshot() -> None:
+    """
+    Treat every snapshot built so far, in memory or on disk, as expired. The
+    next get_hr_snapshot(allow_stale=False) pulls fresh HR data; other
+    callers keep getting the old copy while a background refresh runs.
+    """
+    global _invalidated_at
+    _invalidated_at = time.time()
+
+
+def _load_or_refresh(max_age_seconds: int) -> HRSnapshot:
+    """
+    Make a snapshot no older than `max_age_seconds` current: the file on disk
+    if another worker already wrote one, otherwise a fresh pull.
+    """
+    global _current
+    with _refresh_lock:
+        current = _current
+        if _is_fresh(current, max_age_seconds):
+            return current
+        on_disk = load_snapshot()
+        if _is_fresh(on_disk, max_age_seconds):
+            _current = on_disk
+            return on_disk
+        return refresh_hr_snapshot()
+
+
+def _refresh_worker(max_age_seconds: int) -> None:
+    global _background_failed_at
+    try:
+        _load_or_refresh(max_age_seconds)
+    except Exception:
+        _background_failed_at = time.monotonic()
+        logger.exception("Background HR snapshot refresh failed; serving the stale copy")
+
+
+def _refresh_in_background(max_age_seconds: int) -> None:
+    global _background
+    with _background_lock:
+        if _background is not None and _background.is_alive():
+            return
+        if time.monotonic() - _background_failed_at < HR_SNAPSHOT_RETRY_SECONDS:
+            return
+        _background = threading.Thread(
+            target=_refresh_worker,
+            args=(max_age_seconds,),
+            name="hr-snapshot-refresh",
+            daemon=True,
+        )
+        _background.start()
+
+
+def get_hr_snapshot(
+    max_age_seconds: int = HR_SNAPSHOT_MAX_AGE_SECONDS,
+    allow_stale: bool = True,
+) -> HRSnapshot:
+    """
+    The current HR snapshot, no older than `max_age_seconds`.
+
+    Order of preference: the copy already in memory, the file on disk
+    (written by any worker sharing HR_SNAPSHOT_DIR), a fresh pull.
+    Only one thread per process pulls at a time; the others wait and reuse it.
+
+    With `allow_stale` (the default) an out-of-date copy already in memory is
+    returned immediately while a background thread refreshes it, so only the
+    very first call in a process can block. Still blocking - call it through
+    aget_hr_snapshot() from async code.
+    """
+    current = _current
+    if _is_fresh(current, max_age_seconds):
+        return current
+    if current is not None and allow_stale:
+        _refresh_in_background(max_age_seconds)
+        return current
+    return _load_or_refresh(max_age_seconds)
+
+
+async def aget_hr_snapshot(
+    max_age_seconds: int = HR_SNAPSHOT_MAX_AGE_SECONDS,
+) -> HRSnapshot:
+    """
+    get_hr_snapshot() for async handlers: a cold load or pull runs in the
+    threadpool instead of on the event loop.
+    """
+    current = _current
+    if _is_fresh(current, max_age_seconds):
+        return current
+    return await run_in_threadpool(get_hr_snapshot, max_age_seconds)
+
+
+def warm_hr_snapshot(max_age_seconds: int = HR_SNAPSHOT_MAX_AGE_SECONDS) -> None:
+    """
+    Start loading the snapshot in the background so the first request
+    doesn't pay for it. Safe to call from startup hooks.
+    """
+    if not _is_fresh(_current, max_age_seconds):
+        _refresh_in_background(max_age_seconds)
+
+
+async def _invalidate_hr_namespace() -> int:
+    """
+    Invalidator for the "hr" cache namespace: the next strict read pulls
+    fresh HR data (lazily, so a broadcast doesn't make every worker pull).
+    """
+    dropped = 1 if _current is not None else 0
+    invalidate_hr_snapshot()
+    return dropped
+
+
+register_namespace(HR_NAMESPACE, invalidator=_invalidate_hr_namespace)
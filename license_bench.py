@@ -0,0 +1,437 @@
+"""
+Benchmarks for the license-reduction endpoints in db.py.
+
+Run from the directory that contains db.py:
+
+    python license_bench.py serialize --rows 1000 10000 100000
+    python license_bench.py load --rows 100000 1000000
+    python license_bench.py load --url postgresql://user:pw@localhost/db --loaders pandas stream copy
+    python license_bench.py pipeline --rows 10000 100000 1000000 --output bench/$(date +%F).json
+    python license_bench.py pipeline --rows 100000 --compare bench/2026-10-01.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import db
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+
+def make_enriched_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic frame shaped like the output of db._build_final_df().
+    """
+    rng = np.random.default_rng(seed)
+    idx = np.arange(rows)
+    per_day = rng.gamma(0.8, 1.2, rows)
+    return pd.DataFrame(
+        {
+            "USER_NAME": [f"user{i}" for i in idx],
+            "USER_EMAIL": [f"user{i}@samsung.com" for i in idx],
+            "LAST_ACTIVITY": pd.Timestamp("2026-01-01")
+            + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+            "ANALYST_FUNCTIONS": rng.integers(0, 500, rows),
+            "NON_ANALYST_FUNCTIONS": rng.integers(0, 500, rows),
+            "ANALYST_PCT": rng.random(rows).round(4),
+            "ANALYST_USER_FLAG": rng.integers(0, 2, rows).astype(bool),
+            "ANALYST_THRESHOLD": np.ones(rows, dtype="int64"),
+            "ANALYST_ACTIONS_PER_DAY": per_day,
+            "ANALYST_ACTIONS_PER_ACTIVE_DAYS": rng.random(rows),
+            "ACTIVE_DAYS": rng.integers(0, 365, rows),
+            "recommendedAction": np.where(per_day >= 1, "Analyst", "Consumer"),
+            "cost_center_name": [f"CC {i % 400:04d}" for i in idx],
+            "dept_name": [f"Dept {i % 60}" for i in idx],
+            "title": [f"Title {i % 35}" for i in idx],
+            "FULL_NAME": [f"Employee {i}" for i in idx],
+            "STATUS_NAME": np.where(idx % 17 == 0, "Leave", "Active"),
+        }
+    )
+
+
+# ---------------------------------------------------------------------------
+# Serialization: legacy per-row path vs columnar
+# ---------------------------------------------------------------------------
+
+
+def _legacy_safe(v):
+    return None if pd.isna(v) else v
+
+
+def _legacy_row_to_ui(r: pd.Series) -> Dict[str, Any]:
+    """
+    The per-row converter /license-reduction used before the columnar serializer.
+    """
+    safe = _legacy_safe
+    return {
+        "name": safe(r.get("FULL_NAME")),
+        "statusName": safe(r.get("STATUS_NAME")),
+        "user": safe(r.get("USER_NAME")),
+        "email": safe(r.get("USER_EMAIL")),
+        "costCenterName": safe(r.get("cost_center_name")),
+        "departmentName": safe(r.get("dept_name")),
+        "title": safe(r.get("title")),
+        "recommendedAction": safe(r.get("recommendedAction")),
+        "lastActivity": safe(r.get("LAST_ACTIVITY")),
+        "analystActionsPerDay": float(r.get("ANALYST_ACTIONS_PER_DAY") or 0),
+        "analystFunctions": int(r.get("ANALYST_FUNCTIONS") or 0),
+        "nonAnalystFunctions": int(r.get("NON_ANALYST_FUNCTIONS") or 0),
+        "activeDays": int(r.get("ACTIVE_DAYS") or 0),
+        "titleCategory": safe(r.get("TITLE_CATEGORY")),
+        "analystPct": safe(r.get("ANALYST_PCT")),
+        "analystUserFlag": bool(r.get("ANALYST_USER_FLAG") or False),
+        "analystThreshold": safe(r.get("ANALYST_THRESHOLD")),
+    }
+
+
+def legacy_serialize(df: pd.DataFrame) -> bytes:
+    return db._dumps([_legacy_row_to_ui(r) for _, r in df.iterrows()])
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_serialize(sizes: List[int], repeat: int) -> None:
+    print(f"{'rows':>10} {'iterrows (ms)':>15} {'columnar (ms)':>15} {'speedup':>9}")
+    for rows in sizes:
+        df = make_enriched_frame(rows)
+        assert legacy_serialize(df) == db.serialize_frame(df), "outputs differ"
+        # routes serialize iloc slices, whose index isn't 0..n-1
+        sliced = df.iloc[::3]
+        assert legacy_serialize(sliced) == db.serialize_frame(sliced), "sliced outputs differ"
+        legacy = _best_of(lambda: legacy_serialize(df), repeat)
+        columnar = _best_of(lambda: db.serialize_frame(df), repeat)
+        print(
+            f"{rows:>10} {legacy * 1000:>15.1f} {columnar * 1000:>15.1f} "
+            f"{legacy / columnar:>8.1f}x"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Loading analyst_functions_users: read_sql_query vs streaming loaders
+# ---------------------------------------------------------------------------
+
+
+def make_license_rows(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic analyst_functions_users rows (the LICENSE_COLS columns).
+    """
+    df = make_enriched_frame(rows, seed)
+    df["LAST_ACTIVITY"] = df["LAST_ACTIVITY"].dt.strftime("%Y-%m-%d")
+    return df[db.LICENSE_COLS]
+
+
+def _point_db_at(url: Optional[str], schema: str, rows: int) -> Callable[[], None]:
+    """
+    Load `rows` synthetic rows into `schema`.analyst_functions_users and point
+    db.engine / db.schema at it. Without a URL a temporary SQLite file stands
+    in for Postgres. Returns a cleanup function.
+    """
+    from sqlalchemy import create_engine
+
+    tmpdir = None
+    if url is None:
+        tmpdir = tempfile.mkdtemp(prefix="license_bench_")
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        schema = "main"
+
+    engine = create_engine(url)
+    make_license_rows(rows).to_sql(
+        "analyst_functions_users",
+        engine,
+        schema=schema,
+        if_exists="replace",
+        index=False,
+        chunksize=50_000,
+    )
+    db.engine, db.schema = engine, schema
+
+    def cleanup() -> None:
+        engine.dispose()
+        if tmpdir is not None:
+            os.remove(os.path.join(tmpdir, "bench.db"))
+            os.rmdir(tmpdir)
+
+    return cleanup
+
+
+def _measure(fn: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    final = int(result.memory_usage(deep=True).sum())
+    return {"seconds": elapsed, "peak_mb": peak / 2**20, "final_mb": final / 2**20}
+
+
+def bench_load(
+    sizes: List[int], loaders: List[str], url: Optional[str], schema: str
+) -> None:
+    print(f"{'rows':>10} {'loader':>8} {'time (s)':>9} {'peak (MB)':>10} {'frame (MB)':>11} {'peak/frame':>11}")
+    for rows in sizes:
+        cleanup = _point_db_at(url, schema, rows)
+        try:
+            for loader in loaders:
+                m = _measure(lambda: db.get_license_df(loader))
+                print(
+                    f"{rows:>10} {loader:>8} {m['seconds']:>9.2f} {m['peak_mb']:>10.1f} "
+                    f"{m['final_mb']:>11.1f} {m['peak_mb'] / m['final_mb']:>10.1f}x"
+                )
+        finally:
+            cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Enrichment pipeline: synthetic inputs + per-stage timings
+# ---------------------------------------------------------------------------
+
+# How each synthetic license row can be resolved (IDENTITY_KEYS order), with
+# the default share of rows; "smtp" takes whatever is left.
+DEFAULT_MIX = {
+    "partner_smtp": 0.05,
+    "fallback_smtp": 0.05,
+    "bname": 0.03,
+    "nt_id": 0.03,
+    "gad_id": 0.02,
+    "unresolved": 0.02,
+}
+
+
+def make_pipeline_inputs(
+    rows: int, mix: Dict[str, float], extra_employees: float = 0.5, seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Synthetic analyst_functions_users rows plus primary/fallback HR tables.
+
+    Each license row is assigned the identifier that should resolve it
+    (per `mix`) and the HR tables are built so exactly that identifier
+    matches. `extra_employees` adds unrelated HR rows (as a fraction of
+    `rows`) so lookups aren't 1:1.
+    """
+    rng = np.random.default_rng(seed)
+    kinds = ["smtp", *mix]
+    probs = [max(0.0, 1 - sum(mix.values())), *mix.values()]
+    kind = rng.choice(kinds, size=rows, p=np.array(probs) / sum(probs))
+
+    lic = make_license_rows(rows, seed)
+    idx = np.arange(rows)
+    user_name = np.char.add("u", idx.astype(str)).astype(object)
+    email = np.char.add(user_name.astype(str), "@samsung.com").astype(object)
+    email[kind == "partner_smtp"] = np.char.add(
+        user_name[kind == "partner_smtp"].astype(str), "@partner.samsung.com"
+    )
+    vendor = np.isin(kind, ["bname", "nt_id", "gad_id", "unresolved"])
+    email[vendor] = np.char.add(user_name[vendor].astype(str), "@vendor.example")
+    lic["USER_NAME"] = user_name
+    lic["USER_EMAIL"] = email
+
+    in_primary = kind != "unresolved"
+    n_extra = int(rows * extra_employees)
+    emp_ids = np.concatenate([idx[in_primary], rows + np.arange(n_extra)])
+    emp_kind = np.concatenate([kind[in_primary], np.full(n_extra, "extra")])
+    emp_name = np.char.add("u", emp_ids.astype(str)).astype(object)
+
+    def only(k: str, values: np.ndarray, prefix: str) -> np.ndarray:
+        # the resolving identifier for rows of kind `k`, a dead value otherwise
+        out = np.char.add(prefix, emp_ids.astype(str)).astype(object)
+        out[emp_kind == k] = values[emp_kind == k]
+        return out
+
+    smtp = np.char.add(emp_name.astype(str), "@samsung.com").astype(object)
+    moved = np.isin(emp_kind, ["fallback_smtp", "bname", "nt_id", "gad_id"])
+    smtp[moved] = np.char.add(emp_name[moved].astype(str), "@moved.example")
+
+    cost_centers = np.array([f"CC {i:04d}" for i in range(max(1, rows // 250))], dtype=object)
+    primary = pd.DataFrame(
+        {
+            "full_name": np.char.add("Employee ", emp_ids.astype(str)).astype(object),
+            "smtp": smtp,
+            "status_name": np.where(emp_ids % 23 == 0, "Leave", "Active").astype(object),
+            "bname": only("bname", emp_name, "b"),
+            "nt_id": only("nt_id", emp_name, "n"),
+            "gad_id": only("gad_id", emp_name, "g"),
+            "cost_center_name": cost_centers[emp_ids % len(cost_centers)],
+            "dept_name": np.char.add("Dept ", (emp_ids % 60).astype(str)).astype(object),
+            "title": np.char.add("Title ", (emp_ids % 35).astype(str)).astype(object),
+        }
+    )
+    fb_ids = idx[kind == "fallback_smtp"]
+    fallback = pd.DataFrame(
+        {
+            "full_name": np.char.add("Fallback ", fb_ids.astype(str)).astype(object),
+            "smtp": np.char.add(np.char.add("u", fb_ids.astype(str)), "@samsung.com").astype(object),
+            "status_name": "Active",
+            "cost_center_name": cost_centers[fb_ids % len(cost_centers)],
+            "dept_name": "Dept fallback",
+            "title": "Title fallback",
+        }
+    )
+    return {
+        "license": lic,
+        "primary": primary,
+        "fallback": fallback,
+        "expected": pd.Series(kind).value_counts().to_dict(),
+    }
+
+
+def _timed(stages: Dict[str, float], name: str, fn: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = fn()
+    stages[name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def bench_pipeline_once(rows: int, mix: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Run every stage of db._build_final_df() and the dataset/serialization
+    work behind get_license_reduction, with Postgres and getData stubbed out
+    by the synthetic inputs.
+    """
+    inputs = make_pipeline_inputs(rows, mix)
+    db.get_license_df = lambda loader=None: inputs["license"].copy()
+    db._get_employee_data = lambda: (inputs["primary"], inputs["fallback"])
+
+    stages: Dict[str, float] = {}
+    total = time.perf_counter()
+    raw = _timed(stages, "postgres_load", db.get_license_df)
+    df = _timed(stages, "prepare_license_rows", lambda: db._prepare_license_rows(raw))
+    primary, fallback = _timed(stages, "hr_fetch", db._get_employee_data)
+    index = _timed(stages, "identity_index", lambda: db.IdentityIndex(primary, fallback))
+    merged = _timed(stages, "identity_resolve", lambda: index.enrich(df))
+    final = _timed(stages, "unresolved_fallback", lambda: db._apply_unresolved_fallback(merged))
+    dataset = _timed(stages, "dataset_build_total", lambda: db.LicenseDataset(final.copy()))
+    stages["pipeline_total"] = round(time.perf_counter() - total, 4)
+
+    # breakdown of dataset_build_total (not part of pipeline_total)
+    compact, _ = _timed(stages, "dataset_build.compact_frame", lambda: db.compact_frame(final))
+    _timed(stages, "dataset_build.cost_center_index", lambda: db._build_cost_center_index(compact))
+    _timed(stages, "dataset_build.summaries", lambda: db.build_summary(compact, "cost_center_name"))
+
+    largest = max(dataset.cost_center_index, key=lambda cc: len(dataset.cost_center_index[cc]))
+    _timed(stages, "serialize_largest_cost_center", lambda: db.serialize_frame(dataset.rows_for(largest)))
+    _timed(stages, "serialize_all_rows", lambda: db.serialize_frame(dataset.df))
+    _timed(stages, "route_payload_lookup", lambda: dataset.payload_for(largest))
+
+    matched = final["MATCHED_KEY"].astype(object).fillna("unresolved").value_counts()
+    return {
+        "rows": rows,
+        "stages": stages,
+        "matchedBy": {k: int(v) for k, v in matched.items()},
+        "expected": {k: int(v) for k, v in inputs["expected"].items()},
+        "largestCostCenterRows": int(len(dataset.cost_center_index[largest])),
+        "frameBytes": dataset.memory_report["afterBytes"],
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(db.__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_comparison(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    before = {r["rows"]: r["stages"] for r in previous["results"]}
+    for result in current["results"]:
+        old = before.get(result["rows"])
+        if old is None:
+            continue
+        print(f"\n{result['rows']} rows vs {previous.get('gitRevision') or previous['timestamp']}:")
+        for stage, seconds in result["stages"].items():
+            if stage in old and old[stage]:
+                print(f"  {stage:<36} {old[stage]:>9.4f}s -> {seconds:>9.4f}s ({seconds / old[stage]:>5.2f}x)")
+
+
+def bench_pipeline(
+    sizes: List[int], mix: Dict[str, float], output: Optional[str], compare: Optional[str]
+) -> None:
+    results = []
+    for rows in sizes:
+        result = bench_pipeline_once(rows, mix)
+        results.append(result)
+        print(f"\n{rows} rows")
+        for stage, seconds in result["stages"].items():
+            print(f"  {stage:<36} {seconds:>9.4f}s")
+        print(f"  matched by: {result['matchedBy']}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "gitRevision": _git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "mix": mix,
+        "results": results,
+    }
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {output}")
+    if compare:
+        with open(compare) as f:
+            _print_comparison(report, json.load(f))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ser = sub.add_parser("serialize", help="per-row vs columnar /license-reduction encoding")
+    p_ser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    p_ser.add_argument("--repeat", type=int, default=3)
+
+    p_load = sub.add_parser("load", help="get_license_df loaders: time and peak memory")
+    p_load.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    p_load.add_argument("--loaders", nargs="+", default=["pandas", "stream"])
+    p_load.add_argument("--url", help="SQLAlchemy URL (default: temporary SQLite file)")
+    p_load.add_argument("--schema", default="public")
+
+    p_pipe = sub.add_parser("pipeline", help="per-stage timings of the enrichment build")
+    p_pipe.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    for key, share in DEFAULT_MIX.items():
+        p_pipe.add_argument(
+            f"--{key.replace('_', '-')}", type=float, default=share, dest=key,
+            help=f"share of rows resolved by {key} (default {share})",
+        )
+    p_pipe.add_argument("--output", help="write the results as JSON here")
+    p_pipe.add_argument("--compare", help="previous --output file to compare against")
+
+    args = parser.parse_args()
+    if args.command == "serialize":
+        bench_serialize(args.rows, args.repeat)
+    elif args.command == "load":
+        bench_load(args.rows, args.loaders, args.url, args.schema)
+    elif args.command == "pipeline":
+        mix = {key: getattr(args, key) for key in DEFAULT_MIX}
+        bench_pipeline(args.rows, mix, args.output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Make the modules under test importable from this tree.
+
+db.py and hr_snapshot.py sit at the repo root and the cache modules
+(services/util/*, api/v0/endpoints/cache_mgmt.py) are kept in
+cache_stuff.py, one "# <path>.py" section each. They are served under
+their package names here, along with minimal stand-ins for the services
+this tree doesn't include (PostgreSQL, bigdataloader2, settings, admins).
+Anything that is really installed takes precedence.
+"""
+
+import importlib.abc
+import importlib.util
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASTE_BIN = os.path.join(ROOT, "cache_stuff.py")
+SECTION_SEPARATOR = "\n---------------\n"
+SECTION_HEADER = re.compile(r"^# ((?:\w+/)*\w+)\.py$", re.MULTILINE)
+
+ROOT_MODULES = {"services.util.hr_snapshot": "hr_snapshot.py"}
+
+STAND_INS = {
+    "databases.psql": (
+        "from sqlalchemy import create_engine\n"
+        "engine = create_engine('sqlite://')\n"
+        "schema = 'main'\n"
+    ),
+    "bigdataloader2": (
+        "def getData(*args, **kwargs):\n"
+        "    raise RuntimeError('bigdataloader2 is not available in tests')\n"
+    ),
+    "core.config": "settings = None\n",
+    "services.v0.admins.atlassianadmins": "ADMIN_USERS = {'admin'}\n",
+}
+
+
+def _paste_bin_sections():
+    """
+    module name -> (source, first line number) for each section of cache_stuff.py.
+    """
+    with open(PASTE_BIN) as f:
+        text = f.read()
+    sections, line = {}, 1
+    for part in text.split(SECTION_SEPARATOR):
+        header = SECTION_HEADER.search(part)
+        if header:
+            start = line + part.count("\n", 0, header.start())
+            sections[header.group(1).replace("/", ".")] = (part[header.start():], start)
+        line += part.count("\n") + SECTION_SEPARATOR.count("\n")
+    return sections
+
+
+class _SourceLoader(importlib.abc.Loader):
+    def __init__(self, source: str, filename: str, first_line: int = 1):
+        self.source = source
+        self.filename = filename
+        self.first_line = first_line
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        # padded so tracebacks point at the right line of the real file
+        code = compile("\n" * (self.first_line - 1) + self.source, self.filename, "exec")
+        exec(code, module.__dict__)
+
+
+class _TreeFinder(importlib.abc.MetaPathFinder):
+    def __init__(self):
+        self.loaders = {}
+        for name, (source, first_line) in _paste_bin_sections().items():
+            self.loaders[name] = _SourceLoader(source, PASTE_BIN, first_line)
+        for name, filename in ROOT_MODULES.items():
+            path = os.path.join(ROOT, filename)
+            with open(path) as f:
+                self.loaders[name] = _SourceLoader(f.read(), path)
+        for name, source in STAND_INS.items():
+            self.loaders[name] = _SourceLoader(source, f"<stand-in {name}>")
+        self.packages = {
+            name.rsplit(".", depth)[0]
+            for name in self.loaders
+            for depth in range(1, name.count(".") + 1)
+        }
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname in self.loaders:
+            return importlib.util.spec_from_loader(fullname, self.loaders[fullname])
+        if fullname in self.packages:
+            return importlib.util.spec_from_loader(
+                fullname, _SourceLoader("", f"<package {fullname}>"), is_package=True
+            )
+        return None
+
+
+# after the regular finders, so installed modules win
+sys.meta_path.append(_TreeFinder())
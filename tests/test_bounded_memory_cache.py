@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from services.util.bounded_memory_cache import BoundedMemoryCache, parse_namespace_quotas
+
+QUOTAS = {"username": 300, "license": 400}
+
+
+def _bounded(**kwargs) -> BoundedMemoryCache:
+    # no serializer: stored values are the bytes we pass, so sizes are exact
+    kwargs.setdefault("max_bytes", 500)
+    kwargs.setdefault("namespace_quotas", QUOTAS)
+    return BoundedMemoryCache(**kwargs)
+
+
+def _value(n: int) -> bytes:
+    return b"x" * n
+
+
+def test_parse_namespace_quotas():
+    assert parse_namespace_quotas(" username=16, license=32 ,") == {"username": 16, "license": 32}
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedMemoryCache(policy="fifo")
+
+
+def test_quota_evicts_least_recently_used_of_own_namespace():
+    async def scenario():
+        cache = _bounded()
+        for key in ("a", "b", "c"):
+            await cache.set(f"username:{key}", _value(100))
+        await cache.get("username:a")
+        await cache.set("username:d", _value(100))
+        assert await cache.get("username:b") is None
+        for key in ("a", "c", "d"):
+            assert await cache.get(f"username:{key}") is not None
+        usage = cache.usage()["namespaces"]["username"]
+        assert (usage["bytes"], usage["keys"], usage["evictions"]) == (300, 3, 1)
+
+    asyncio.run(scenario())
+
+
+def test_lfu_evicts_least_frequently_used():
+    async def scenario():
+        cache = _bounded(policy="lfu")
+        for key in ("a", "b", "c"):
+            await cache.set(f"username:{key}", _value(100))
+        for key in ("a", "a", "c"):
+            await cache.get(f"username:{key}")
+        await cache.set("username:d", _value(100))
+        assert await cache.get("username:b") is None
+        assert await cache.get("username:a") is not None
+
+    asyncio.run(scenario())
+
+
+def test_budget_evicts_own_namespace_then_shared_entries():
+    async def scenario():
+        cache = _bounded()
+        await cache.set("username:a", _value(200))
+        await cache.set("misc", _value(100))
+        await cache.set("license:x", _value(300))
+        assert await cache.get("misc") is None
+        assert await cache.get("username:a") is not None
+        assert cache.usage()["bytes"] == 500
+
+    asyncio.run(scenario())
+
+
+def test_namespace_within_quota_is_never_evicted_for_another():
+    async def scenario():
+        cache = _bounded()
+        await cache.set("username:a", _value(200))
+        await cache.set("license:x", _value(300))
+        # fits the license quota, but only by evicting username entries
+        assert await cache.set("license:big", _value(350)) is False
+        assert await cache.get("license:big") is None
+        assert await cache.get("username:a") is not None
+        assert await cache.get("license:x") is not None
+        usage = cache.usage()
+        assert usage["rejected"] == 1
+        assert usage["evictions"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_oversized_entry_is_refused_and_drops_stale_value():
+    async def scenario():
+        cache = _bounded()
+        await cache.set("username:a", _value(100))
+        assert await cache.set("username:a", _value(301)) is False
+        assert await cache.get("username:a") is None
+        assert cache.usage()["namespaces"]["username"]["bytes"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_expiry_and_clear_release_accounting():
+    async def scenario():
+        cache = _bounded()
+        await cache.set("username:a", _value(100), ttl=0.05)
+        await cache.set("license:x", _value(100))
+        await asyncio.sleep(0.1)
+        assert cache.usage()["namespaces"]["username"]["bytes"] == 0
+        assert cache.usage()["bytes"] == 100
+        await cache.clear()
+        assert cache.usage()["bytes"] == 0
+        assert await cache.get("license:x") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+from aiocache import RedisCache, SimpleMemoryCache
+from aiocache.serializers import PickleSerializer
+
+from services.util.bounded_memory_cache import BoundedMemoryCache
+from services.util.cache_instrumentation import InstrumentationPlugin, instrument, list_keys
+
+
+def _instrumented(cache, name: str) -> InstrumentationPlugin:
+    plugin = instrument(cache, name)
+    assert plugin.cache is cache
+    return plugin
+
+
+def test_expired_miss_counts_as_expiry():
+    async def scenario():
+        plugin = _instrumented(SimpleMemoryCache(), "expiry")
+        await plugin.cache.set("username:alice", "Alice", ttl=0.05)
+        assert await plugin.cache.get("username:alice") == "Alice"
+        await asyncio.sleep(0.1)
+        assert await plugin.cache.get("username:alice") is None
+        assert (plugin.hits, plugin.misses) == (1, 1)
+        assert (plugin.expired, plugin.evictions) == (1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_dropped_before_ttl_counts_as_eviction():
+    async def scenario():
+        cache = BoundedMemoryCache(max_bytes=150, serializer=PickleSerializer())
+        plugin = _instrumented(cache, "eviction")
+        await cache.set("first", b"x" * 80, ttl=60)
+        await cache.set("second", b"y" * 80, ttl=60)
+        assert await cache.get("first") is None
+        assert (plugin.expired, plugin.evictions) == (0, 1)
+
+    asyncio.run(scenario())
+
+
+def test_sweep_counts_without_a_lookup():
+    async def scenario():
+        plugin = _instrumented(SimpleMemoryCache(), "sweep")
+        await plugin.cache.set("expires", 1, ttl=0.05)
+        await plugin.cache.set("dropped", 2, ttl=60)
+        await plugin.cache.set("deleted", 3, ttl=60)
+        await plugin.cache.delete("deleted")
+        plugin.cache._cache.pop("dropped")
+        await asyncio.sleep(0.1)
+        plugin.sweep()
+        assert (plugin.expired, plugin.evictions) == (1, 1)
+        plugin.sweep()
+        assert (plugin.expired, plugin.evictions) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_list_memory_keys():
+    async def scenario():
+        cache = SimpleMemoryCache()
+        await cache.set("username:alice", b"Alice", ttl=60)
+        await cache.set("username:bob", b"Bob")
+        await cache.set("license:dataset", b"rows")
+        rows = {row["key"]: row for row in await list_keys(cache, "username:")}
+        assert set(rows) == {"username:alice", "username:bob"}
+        assert rows["username:alice"]["size_bytes"] == 5
+        assert 59 < rows["username:alice"]["ttl_seconds"] <= 60
+        assert rows["username:bob"]["ttl_seconds"] is None
+        assert len(await list_keys(cache, limit=2)) == 2
+
+    asyncio.run(scenario())
+
+
+def test_list_redis_keys():
+    async def scenario():
+        cache = RedisCache()
+        cache.client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+        await cache.client.set("username:alice", b"Alice", ex=60)
+        await cache.client.set("username:bob", b"Bob")
+        await cache.client.set("license:dataset", b"rows")
+        rows = {row["key"]: row for row in await list_keys(cache, "username:")}
+        assert set(rows) == {"username:alice", "username:bob"}
+        assert rows["username:alice"]["size_bytes"] == 5
+        assert 59 < rows["username:alice"]["ttl_seconds"] <= 60
+        assert rows["username:bob"]["ttl_seconds"] is None
+
+    asyncio.run(scenario())
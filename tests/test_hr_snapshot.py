@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from services.util import hr_snapshot
+from services.util.cache_namespaces import invalidate_namespace
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(hr_snapshot, "HR_SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _snapshot() -> hr_snapshot.HRSnapshot:
+    primary = pd.DataFrame(
+        {
+            "mysingle_id": [" Alice ", "bob", "carol", None],
+            "nt_id": ["a.one", "b.two", "c.three", "d.four"],
+            "gad_id": ["A1", "B2", "A1", "D4"],
+            "status_name": ["Active", "Active", "Leave", "Active"],
+        }
+    )
+    fallback = pd.DataFrame({"smtp": ["alice@example.com"], "full_name": ["Alice"]})
+    return hr_snapshot.HRSnapshot(
+        hr_snapshot._hr_table(primary),
+        hr_snapshot._hr_table(fallback),
+        version="v1",
+        built_at=1.0,
+    )
+
+
+def test_loaded_snapshot_is_memory_mapped(snapshot_dir):
+    hr_snapshot.write_snapshot(_snapshot())
+    allocated = pa.total_allocated_bytes()
+    loaded = hr_snapshot.load_snapshot()
+    # zero-copy: the tables live in the mapped files, not the Arrow heap
+    assert pa.total_allocated_bytes() == allocated
+    assert loaded.version == "v1"
+    assert loaded.primary_table.num_rows == 4
+
+
+def test_lookup_matches_identifiers_case_insensitively(snapshot_dir):
+    hr_snapshot.write_snapshot(_snapshot())
+    loaded = hr_snapshot.load_snapshot()
+    rows = loaded.lookup("mysingle_id", ["ALICE", "carol", "nobody"], columns=["nt_id"])
+    assert rows["nt_id"].tolist() == ["a.one", "c.three"]
+    assert loaded.lookup("gad_id", "a1")["mysingle_id"].tolist() == ["Alice", "carol"]
+    assert loaded.lookup("status_name", ["Leave"])["nt_id"].tolist() == ["c.three"]
+
+
+def test_invalidating_hr_forces_a_fresh_pull(snapshot_dir, monkeypatch):
+    pulls = []
+
+    def fetch():
+        pulls.append(time.time())
+        snapshot = _snapshot()
+        snapshot.version, snapshot.built_at = f"v{len(pulls)}", pulls[-1]
+        return snapshot
+
+    monkeypatch.setattr(hr_snapshot, "_fetch_hr_frames", fetch)
+    monkeypatch.setattr(hr_snapshot, "_current", None)
+    monkeypatch.setattr(hr_snapshot, "_invalidated_at", 0.0)
+
+    assert hr_snapshot.get_hr_snapshot(allow_stale=False).version == "v1"
+    assert hr_snapshot.get_hr_snapshot(allow_stale=False).version == "v1"
+    asyncio.run(invalidate_namespace("hr", scope="local"))
+    # neither the copy in memory nor the file on disk may be reused
+    assert hr_snapshot.get_hr_snapshot(allow_stale=False).version == "v2"
+    assert len(pulls) == 2
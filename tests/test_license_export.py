@@ -0,0 +1,40 @@
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import db
+
+
+def _object_frame() -> pd.DataFrame:
+    # the first chunk of "title" is all-null, so an empty-slice schema would
+    # have typed it as null
+    return pd.DataFrame(
+        {
+            "full_name": pd.Series(["Ann", "Bob", "Cy", None, "Dee"], dtype=object),
+            "title": pd.Series([None, None, "Engineer", "Manager", None], dtype=object),
+            "analystUserFlag": [True, False, True, False, True],
+            "analystActionsPerDay": [1.5, 0.0, 2.25, 3.0, 0.5],
+        }
+    )
+
+
+def _assert_round_trip(table: pa.Table, df: pd.DataFrame) -> None:
+    assert table.num_rows == len(df)
+    for column in ("full_name", "title"):
+        column_type = table.schema.field(column).type
+        assert pa.types.is_string(column_type) or pa.types.is_large_string(column_type)
+    assert table.to_pylist() == df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def test_arrow_export_round_trips_object_columns():
+    df = _object_frame()
+    body = b"".join(db._export_arrow(df, chunk_rows=2))
+    _assert_round_trip(pa.ipc.open_stream(body).read_all(), df)
+
+
+def test_parquet_export_round_trips_object_columns():
+    df = _object_frame()
+    body = b"".join(db._export_parquet(df, chunk_rows=2))
+    _assert_round_trip(pq.read_table(io.BytesIO(body)), df)
@@ -0,0 +1,25 @@
+import pytest
+from fastapi import HTTPException
+
+import db
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", db._encode_cursor([1, 2])])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        db._decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("value", ["7", -1, 1.5, True, None])
+def test_tampered_cursor_numbers_are_a_400(value):
+    with pytest.raises(HTTPException) as e:
+        db._cursor_int({"o": value}, "o", 0)
+    assert e.value.status_code == 400
+
+
+def test_cursor_round_trip():
+    state = {"v": "abc", "cc": "CC 1", "s": None, "f": "name", "o": 20, "l": 10}
+    assert db._decode_cursor(db._encode_cursor(state)) == state
+    assert db._cursor_int(state, "o", 0) == 20
+    assert db._cursor_int({}, "l", db.MAX_PAGE_SIZE) == db.MAX_PAGE_SIZE
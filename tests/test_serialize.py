@@ -0,0 +1,20 @@
+import pandas as pd
+
+import db
+from license_bench import legacy_serialize, make_enriched_frame
+
+
+def test_sliced_frame_matches_legacy_serializer():
+    df = make_enriched_frame(50)
+    df.loc[7, "LAST_ACTIVITY"] = pd.NaT
+    # not a 0..n-1 index, like every cost-center / page / query subset
+    sliced = df.iloc[[5, 6, 7, 20, 41]]
+    assert db.serialize_frame(sliced) == legacy_serialize(sliced)
+
+
+def test_sliced_frame_keeps_its_datetimes():
+    df = make_enriched_frame(10)
+    records = db.frame_to_records(df.iloc[[5, 6]])
+    assert [r["lastActivity"] for r in records] == [
+        ts.to_pydatetime() for ts in df["LAST_ACTIVITY"].iloc[[5, 6]]
+    ]
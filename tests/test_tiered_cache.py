@@ -0,0 +1,120 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from aiocache import caches
+
+import db
+from services.util.cache_namespaces import invalidate_all, invalidate_namespace
+from services.util.tiered_cache import TieredCache, configure_default_cache
+
+# a key another service (Superset) keeps in the same Redis database
+FOREIGN_KEY = "superset_results:1234"
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _tiered(server: fakeredis.FakeServer) -> TieredCache:
+    cache = TieredCache(l1_max_bytes=100_000, l1_ttl=60)
+    cache.l2.client = fakeredis.aioredis.FakeRedis(server=server)
+    return cache
+
+
+@pytest.fixture
+def default_cache(server):
+    caches.set_config({"default": {"cache": "services.util.tiered_cache.TieredCache"}})
+    cache = caches.get("default")
+    cache.l2.client = fakeredis.aioredis.FakeRedis(server=server)
+    yield cache
+    caches.set_config({"default": {"cache": "aiocache.SimpleMemoryCache"}})
+
+
+async def _redis_keys(server: fakeredis.FakeServer) -> set:
+    client = fakeredis.aioredis.FakeRedis(server=server)
+    return {key.decode() for key in await client.keys("*")}
+
+
+def test_workers_share_l2(server):
+    async def scenario():
+        a, b = _tiered(server), _tiered(server)
+        await a.set("username:jira:alice", "Alice", ttl=60)
+        assert await b.get("username:jira:alice") == "Alice"
+        assert b.l2_hits == 1
+        assert await b.get("username:jira:alice") == "Alice"
+        assert b.l1_hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_clear_keeps_other_services_keys(server):
+    async def scenario():
+        cache = _tiered(server)
+        await cache.l2.client.set(FOREIGN_KEY, b"rows")
+        await cache.set("username:jira:alice", "Alice")
+        await cache.set("restricted_users:all", ["bob"])
+        await cache.clear()
+        assert await _redis_keys(server) == {FOREIGN_KEY}
+        assert await cache.get("username:jira:alice") is None
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_all_keeps_other_services_keys(server, default_cache):
+    async def scenario():
+        await default_cache.l2.client.set(FOREIGN_KEY, b"rows")
+        await default_cache.set("username:confluence:alice", "Alice")
+        await default_cache.set("license:dataset-meta", b"{}")
+        await invalidate_all(scope="shared")
+        assert await _redis_keys(server) == {FOREIGN_KEY}
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_all_keeps_held_build_lock(server, default_cache):
+    async def scenario():
+        await default_cache.l2.add(db._SHARED_LOCK_KEY, "other-worker", ttl=60)
+        await default_cache.set("license:dataset-meta", b"{}")
+        await invalidate_all(scope="shared")
+        assert await _redis_keys(server) == {db._SHARED_LOCK_KEY}
+        await default_cache.clear()
+        assert await _redis_keys(server) == {db._SHARED_LOCK_KEY}
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_namespace_is_scoped(server, default_cache):
+    async def scenario():
+        await default_cache.set("username:jira:alice", "Alice")
+        await default_cache.set("restricted_users:all", ["bob"])
+        assert await invalidate_namespace("username") == 1
+        assert await _redis_keys(server) == {"restricted_users:all"}
+
+    asyncio.run(scenario())
+
+
+def test_configure_default_cache_respects_app_config():
+    caches.set_config({"default": {"cache": "aiocache.RedisCache"}})
+    try:
+        configure_default_cache()
+        assert caches.get_alias_config("default")["cache"] == "aiocache.RedisCache"
+    finally:
+        caches.set_config({"default": {"cache": "aiocache.SimpleMemoryCache"}})
+    configure_default_cache()
+    assert caches.get_alias_config("default")["cache"] != "aiocache.SimpleMemoryCache"
+
+
+def test_build_lock_released_only_by_owner(server):
+    async def scenario():
+        shared = _tiered(server).l2
+        key = shared.build_key(db._SHARED_LOCK_KEY)
+        await shared.add(db._SHARED_LOCK_KEY, "mine", ttl=60)
+        await db._release_shared_lock(shared, "theirs")
+        assert await shared.client.get(key) == b"mine"
+        await db._release_shared_lock(shared, "mine")
+        assert await shared.client.get(key) is None
+
+    asyncio.run(scenario())
@@ -1,6 +1,8 @@
 from fastapi import HTTPException, Request
 from fastapi.responses import ORJSONResponse
 from bigdataloader2 import getData
+from starlette.concurrency import run_in_threadpool
+from services.util.hr_snapshot import aget_hr_snapshot
 
 class EmployeeService:
     @staticmethod
@@ -10,13 +12,19 @@ class EmployeeService:
             # critical: do NOT return 200 {}
             raise HTTPException(status_code=401, detail="Missing x-knox-id")
 
-        params = {
-            "data_type": "pageradm_employee_ghr",
-            "MLR": "L",
-            "mysingle_id": current_user,
-        }
         columns = ["ghr_id", "full_name", "cost_center_name", "title", "mysingle_id", "nt_id", "smtp"]
-        data = getData(params=params, convert_type=True, custom_columns=columns)
+        data = (await aget_hr_snapshot()).lookup("mysingle_id", current_user, columns=columns)
+
+        if data.empty:
+            # not in the snapshot yet (e.g. hired since it was taken): ask HR directly
+            params = {
+                "data_type": "pageradm_employee_ghr",
+                "MLR": "L",
+                "mysingle_id": current_user,
+            }
+            data = await run_in_threadpool(
+                getData, params=params, convert_type=True, custom_columns=columns
+            )
 
         if data.empty:
             # user header existed but no record
@@ -14,11 +14,14 @@ This handles the gradual migration period where:
 from fastapi import HTTPException
 from fastapi.responses import ORJSONResponse
 from typing import Optional, Dict, Tuple
-from aiocache import cached
-from aiocache.serializers import PickleSerializer
 from .external_api.jiraRequests import JiraAPIClient
 from .external_api.confRequests import ConfAPIClient
 from .user import EmployeeService
+from services.util.cache_namespaces import (
+    USERNAME_CONFLUENCE_NAMESPACE,
+    USERNAME_JIRA_NAMESPACE,
+    namespaced_cached,
+)
 import json
 
 
@@ -294,7 +297,7 @@ class UsernameLookupService:
         return None
 
     @staticmethod
-    @cached(ttl=3600, serializer=PickleSerializer())
+    @namespaced_cached(USERNAME_JIRA_NAMESPACE, ttl=3600)
     async def _get_cached_jira_username(mysingle_id: str) -> Optional[str]:
         """
         Get cached Jira username for a user.
@@ -309,7 +312,7 @@ class UsernameLookupService:
         return None
 
     @staticmethod
-    @cached(ttl=3600, serializer=PickleSerializer())
+    @namespaced_cached(USERNAME_JIRA_NAMESPACE, ttl=3600)
     async def _cache_jira_username(mysingle_id: str, username: str) -> None:
         """
         Cache Jira username for a user.
@@ -322,7 +325,7 @@ class UsernameLookupService:
         pass
 
     @staticmethod
-    @cached(ttl=3600, serializer=PickleSerializer())
+    @namespaced_cached(USERNAME_CONFLUENCE_NAMESPACE, ttl=3600)
     async def _get_cached_confluence_username(mysingle_id: str) -> Optional[str]:
         """
         Get cached Confluence username for a user.
@@ -337,7 +340,7 @@ class UsernameLookupService:
         return None
 
     @staticmethod
-    @cached(ttl=3600, serializer=PickleSerializer())
+    @namespaced_cached(USERNAME_CONFLUENCE_NAMESPACE, ttl=3600)
     async def _cache_confluence_username(mysingle_id: str, username: str) -> None:
         """
         Cache Confluence username for a user.